@@ -16,6 +16,8 @@ import sgtk
 from sgtk import TankError
 from sgtk.platform.qt import QtGui, QtCore
 from .action import Action
+from ..template_cache import g_template_cache
+from ..context_cache import g_context_cache
 
 class FileAction(Action):
     """
@@ -54,6 +56,9 @@ class FileAction(Action):
             # a hook.
             app.sgtk.create_filesystem_structure(ctx_entity.get("type"), ctx_entity.get("id"),
                                                        engine=app.engine.instance_name)
+            # contexts and the template fields resolved from them may have changed now that folders exist:
+            g_template_cache.clear()
+            g_context_cache.clear()
         finally:
             QtGui.QApplication.restoreOverrideCursor()
 
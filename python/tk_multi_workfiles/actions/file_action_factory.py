@@ -34,7 +34,6 @@ from .show_in_shotgun_action import ShowPublishInShotgunAction, ShowLatestPublis
 from .custom_file_action import CustomFileAction
 
 from ..work_area import WorkArea
-from ..file_item import FileItem
 from ..user_cache import g_user_cache
 
 
@@ -158,7 +157,7 @@ class FileActionFactory(object):
                 fields = template.get_fields(path)
                 ctx_fields = self._user_work_area.context.as_template_fields(template)
                 fields.update(ctx_fields)
-                file_key = FileItem.build_file_key(fields, template, self._user_work_area.version_compare_ignore_fields)
+                file_key = self._user_work_area.get_file_key_builder(template).build_key(fields)
                 current_user_file_versions = self._file_model.get_cached_file_versions(file_key, self._user_work_area) or {}
         else:
             # not using sandboxes so the two lists of versions are the same
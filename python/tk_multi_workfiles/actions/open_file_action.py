@@ -19,7 +19,6 @@ from sgtk import TankError
 from .file_action import FileAction
 from ..scene_operation import reset_current_scene, open_file, OPEN_FILE_ACTION
 from ..work_area import WorkArea
-from ..file_item import FileItem
 from ..file_finder import FileFinder
 from ..user_cache import g_user_cache
 
@@ -178,9 +177,7 @@ class CopyAndOpenInCurrentWorkAreaAction(OpenFileAction):
             src_version = fields["version"]
 
             # build a file key from the fields: 
-            file_key = FileItem.build_file_key(fields, 
-                                               dst_work_area.work_template, 
-                                               dst_work_area.version_compare_ignore_fields)
+            file_key = dst_work_area.get_file_key_builder().build_key(fields)
     
             # look for all files that match this key:
             finder = FileFinder()
@@ -0,0 +1,111 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Cache of contexts resolved from directories on disk.
+"""
+
+import sgtk
+
+from .util import Threaded, get_context_key
+
+
+class ContextCache(Threaded):
+    """
+    Cache of the contexts resolved for directories using sgtk.context_from_path().  Contexts are
+    resolved from the path cache which only contains folders, so all files in the same directory
+    will always resolve to the same context.  This allows a whole scan worth of files to be
+    resolved by looking up just their unique parent directories.  Note, the cache should be cleared
+    whenever the file system structure is created or synchronized.
+    """
+
+    # maximum number of contexts to keep in the cache before it's reset:
+    MAX_ENTRIES = 10000
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._contexts = {}
+
+    def resolve_directories(self, directories, previous_context=None):
+        """
+        Resolve the contexts for a list of directories.  Each unique directory that hasn't been resolved
+        before is looked up once.
+
+        :param directories:         The list of directories to resolve the contexts for
+        :param previous_context:    The context to pass to sgtk.context_from_path()
+        :returns:                   A dictionary {directory:context} containing an entry for every directory.
+                                    The context will be None if it couldn't be resolved.
+        """
+        previous_context_key = get_context_key(previous_context)
+        contexts, unresolved_dirs = self._find(set(directories), previous_context_key)
+        if not unresolved_dirs:
+            return contexts
+
+        app = sgtk.platform.current_bundle()
+        resolved_contexts = {}
+        for directory in unresolved_dirs:
+            try:
+                resolved_contexts[directory] = app.sgtk.context_from_path(directory, previous_context)
+            except sgtk.TankError, e:
+                app.log_debug("Failed to resolve a context from '%s': %s" % (directory, e))
+                resolved_contexts[directory] = None
+
+        self._add(resolved_contexts, previous_context_key)
+        contexts.update(resolved_contexts)
+        return contexts
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Clear the cache
+        """
+        self._contexts = {}
+
+    @Threaded.exclusive
+    def _find(self, directories, previous_context_key):
+        """
+        Find the cached contexts for a set of directories
+
+        :param directories:             The set of directories to find the contexts for
+        :param previous_context_key:    The key of the previous context the directories were
+                                        resolved with
+        :returns:                       Tuple containing ({directory:context} for all cached directories,
+                                        list of directories that aren't in the cache)
+        """
+        contexts = {}
+        unresolved_dirs = []
+        for directory in directories:
+            cache_key = (directory, previous_context_key)
+            if cache_key in self._contexts:
+                contexts[directory] = self._contexts[cache_key]
+            else:
+                unresolved_dirs.append(directory)
+        return (contexts, unresolved_dirs)
+
+    @Threaded.exclusive
+    def _add(self, contexts, previous_context_key):
+        """
+        Add resolved contexts to the cache
+
+        :param contexts:                A dictionary {directory:context} of the contexts to add
+        :param previous_context_key:    The key of the previous context the directories were
+                                        resolved with
+        """
+        if len(self._contexts) + len(contexts) > ContextCache.MAX_ENTRIES:
+            self._contexts = {}
+        for directory, context in contexts.iteritems():
+            self._contexts[(directory, previous_context_key)] = context
+
+
+# single global instance of the context cache
+g_context_cache = ContextCache()
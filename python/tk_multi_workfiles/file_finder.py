@@ -18,16 +18,22 @@ from sgtk.platform.qt import QtCore
 from tank_vendor.shotgun_api3 import sg_timezone
 from sgtk import TankError
 
-from .file_item import FileItem
+from .file_item import FileItem, FileKeyBuilder
 from .user_cache import g_user_cache
+from .template_cache import g_template_cache
+from .context_cache import g_context_cache
+from .template_patterns import VersionlessNameFormatter, TemplatePathMatcher
+from .publish_fetcher import g_publish_fetcher
 
-from .sg_published_files_model import SgPublishedFilesModel
+from .file_scanner import SandboxScanner, DirectoryWalker, DirectoryListingCache, filter_template_paths
+from .file_scanner import get_static_prefixes, SharedTemplateScan
+from .work_file_index import get_work_file_index, WorkFileIndex
+from .util import Threaded
 
 task_manager = sgtk.platform.import_framework("tk-framework-shotgunutils", "task_manager")
 BackgroundTaskManager = task_manager.BackgroundTaskManager
 
 from .work_area import WorkArea
-from .util import monitor_qobject_lifetime, Threaded
 
 class FileFinder(QtCore.QObject):
     """
@@ -36,92 +42,77 @@ class FileFinder(QtCore.QObject):
 
     class _FileNameMap(Threaded):
         """
+        Map of file keys to the unique name used for all versions of the file.  Lookups don't take
+        any lock - names are built outside of the lock and only adding a name is serialised.  If two
+        threads build a name for the same key at the same time then the first one added wins.
+
+        The map is bounded by keeping two generations of names: when the current generation is full
+        it replaces the previous one and a new generation is started.  Names found in the previous
+        generation are moved to the current one so the names of files that searches are still
+        processing are kept, giving an approximate least recently used eviction.
         """
+        # maximum number of names to keep in the map:
+        MAX_ENTRIES = 100000
+
         def __init__(self):
             """
+            Construction
             """
             Threaded.__init__(self)
-            self._name_map = {}
+            # readers look up names without locking so these are only ever updated with single,
+            # atomic operations and are replaced rather than cleared:
+            self._current = {}
+            self._previous = {}
 
-        @Threaded.exclusive
         def get_name(self, file_key, path, template, fields=None):
             """
             Thread safe method to get the unique name for the specified file key
+
+            :param file_key:    The unique key for the file
+            :param path:        The path of the file
+            :param template:    The template that matches the path
+            :param fields:      The fields extracted from the path using the template.  If None
+                                then they will be extracted from the path
+            :returns:           The name for the file
             """
-            name = None
-            if file_key in self._name_map:
-                name = self._name_map.get(file_key)
-            else:
-                # generate the name:
-                name = self._generate_name(path, template, fields)
-                # and add it to the map:
-                self._name_map[file_key] = name
-            return name
+            name = self._current.get(file_key)
+            if name is not None:
+                return name
+
+            name = self._previous.get(file_key)
+            if name is None:
+                if fields is None:
+                    fields = g_template_cache.get_fields(template, path)
+                name = VersionlessNameFormatter.get(template).get_name(path, fields)
+            # if another thread added a name first then all threads use that name:
+            return self._add(file_key, name)
 
-        def _generate_name(self, path, template, fields=None):
+        @Threaded.exclusive
+        def _add(self, file_key, name):
             """
-            Return the 'name' to be used for the file - if possible
-            this will return a 'versionless' name
+            Add the name for the specified file key to the current generation unless one has already
+            been added, starting a new generation if the current one is full
+
+            :param file_key:    The unique key for the file
+            :param name:        The name for the file
+            :returns:           The name in the map for the file key
             """
-            # first, extract the fields from the path using the template:
-            fields = fields.copy() if fields else template.get_fields(path)
-            if "name" in fields and fields["name"]:
-                # well, that was easy!
-                name = fields["name"]
-            else:
-                # find out if version is used in the file name:
-                template_name, _ = os.path.splitext(os.path.basename(template.definition))
-                version_in_name = "{version}" in template_name
-            
-                # extract the file name from the path:
-                name, _ = os.path.splitext(os.path.basename(path))
-                delims_str = "_-. "
-                if version_in_name:
-                    # looks like version is part of the file name so we        
-                    # need to isolate it so that we can remove it safely.  
-                    # First, find a dummy version whose string representation
-                    # doesn't exist in the name string
-                    version_key = template.keys["version"]
-                    dummy_version = 9876
-                    while True:
-                        test_str = version_key.str_from_value(dummy_version)
-                        if test_str not in name:
-                            break
-                        dummy_version += 1
-                    
-                    # now use this dummy version and rebuild the path
-                    fields["version"] = dummy_version
-                    path = template.apply_fields(fields)
-                    name, _ = os.path.splitext(os.path.basename(path))
-                    
-                    # we can now locate the version in the name and remove it
-                    dummy_version_str = version_key.str_from_value(dummy_version)
-                    
-                    v_pos = name.find(dummy_version_str)
-                    # remove any preceeding 'v'
-                    pre_v_str = name[:v_pos].rstrip("v")
-                    post_v_str = name[v_pos + len(dummy_version_str):]
-                    
-                    if (pre_v_str and post_v_str 
-                        and pre_v_str[-1] in delims_str 
-                        and post_v_str[0] in delims_str):
-                        # only want one delimiter - strip the second one:
-                        post_v_str = post_v_str.lstrip(delims_str)
-    
-                    versionless_name = pre_v_str + post_v_str
-                    versionless_name = versionless_name.strip(delims_str)
-                    
-                    if versionless_name:
-                        # great - lets use this!
-                        name = versionless_name
-                    else: 
-                        # likely that version is only thing in the name so 
-                        # instead, replace the dummy version with #'s:
-                        zero_version_str = version_key.str_from_value(0)        
-                        new_version_str = "#" * len(zero_version_str)
-                        name = name.replace(dummy_version_str, new_version_str)
-            
-            return name    
+            existing_name = self._current.get(file_key) or self._previous.get(file_key)
+            if existing_name is not None:
+                name = existing_name
+            if len(self._current) >= FileFinder._FileNameMap.MAX_ENTRIES / 2:
+                self._previous = self._current
+                self._current = {}
+            self._current[file_key] = name
+            return name
+
+    # directory listings shared by all finders - directories are only listed again
+    # when their modification time changes:
+    _listing_cache = DirectoryListingCache()
+
+    # file names shared by all finders so that all versions of a file keep the same name across
+    # searches and dialog invocations:
+    _shared_name_map = _FileNameMap()
 
     def __init__(self, parent=None):
         """
@@ -163,8 +154,14 @@ class FileFinder(QtCore.QObject):
         # get list of fields that should be ignored when comparing work files:
         version_compare_ignore_fields = self._app.get_setting("version_compare_ignore_fields", [])    
 
+        # when looking for a single file, restrict the search to just the paths for that file:
+        filter_fields = self._get_file_key_fields(filter_file_key, work_template)
+        publish_filters += self._get_publish_path_filters(context, publish_template, filter_fields,
+                                                          version_compare_ignore_fields)
+
         # find all work & publish files and filter out any that should be ignored:
-        work_files = self._find_work_files(context, work_template, version_compare_ignore_fields)
+        work_files = self._find_work_files(context, work_template, version_compare_ignore_fields,
+                                           filter_fields=filter_fields)
         filtered_work_files = self._filter_work_files(work_files, valid_file_extensions)
         
         published_files = self._find_publishes(publish_filters)
@@ -173,7 +170,7 @@ class FileFinder(QtCore.QObject):
                                                           valid_file_extensions)
         
         # turn these into FileItem instances:
-        name_map = FileFinder._FileNameMap()
+        name_map = FileFinder._shared_name_map
         work_file_item_details = self._process_work_files(filtered_work_files, 
                                                         work_template, 
                                                         context, 
@@ -204,25 +201,104 @@ class FileFinder(QtCore.QObject):
 
         return file_items
 
+    def _get_file_key_fields(self, file_key, template):
+        """
+        Get the fields from a file key that all paths for the file must contain.  Fields that match
+        the default value for their template key are omitted as the path may not contain them.
+
+        :param file_key:    The file key to get the fields from.  Can be None
+        :param template:    The template the file key was built with
+        :returns:           A dictionary of the fields
+        """
+        key_fields = {}
+        for name, value in (file_key or []):
+            template_key = template.keys.get(name)
+            if template_key is None or value is None or value == template_key.default:
+                continue
+            key_fields[name] = value
+        return key_fields
+
+    def _get_publish_path_filters(self, context, publish_template, filter_fields, version_compare_ignore_fields):
+        """
+        Build Shotgun filters that restrict the publishes found to just those whose path could match
+        the specified fields.
+
+        :param context:                         The context to find publishes for
+        :param publish_template:                The publish template that the publish paths match
+        :param filter_fields:                   A dictionary of fields that the publish paths must match
+        :param version_compare_ignore_fields:   List of fields to ignore when comparing files in order to find
+                                                different versions of the same file
+        :returns:                               A list of Shotgun filters.  This will be empty if the
+                                                paths can't be restricted
+        """
+        if not filter_fields or not publish_template:
+            return []
+
+        publish_fields = g_template_cache.context_fields(context, publish_template)
+        for name, value in filter_fields.iteritems():
+            if name in publish_template.keys:
+                publish_fields[name] = value
+        skip_fields = ["version"] + [name for name in version_compare_ignore_fields if name not in filter_fields]
+
+        # the path cache stored for each publish is relative to the storage root so compare the part of
+        # each path prefix below the project root:
+        root_path = os.path.normpath(publish_template.root_path)
+        path_filters = []
+        for prefix in get_static_prefixes(publish_template, publish_fields, skip_fields):
+            relative_prefix = prefix[len(root_path):]
+            if not prefix.startswith(root_path) or not relative_prefix.startswith(os.sep):
+                return []
+            relative_prefix = relative_prefix.replace(os.sep, "/")
+            if not relative_prefix.strip("/"):
+                # the prefix doesn't restrict anything!
+                return []
+            path_filters.append(["path_cache", "contains", relative_prefix])
+
+        if not path_filters:
+            return []
+        return [{"filter_operator":"any", "filters":path_filters}]
+
     def _process_work_files(self, work_files, work_template, context, name_map, version_compare_ignore_fields, 
-                          filter_file_key=None):
+                          filter_file_key=None, file_processed_cb=None, stat_results=None, indexed_details=None):
         """
         """
         files = {}
-        
+        key_builder = FileKeyBuilder.get(work_template, version_compare_ignore_fields)
+
+        # the details of any files that haven't changed since they were indexed don't need to be
+        # resolved again:
+        indexed_details = indexed_details or {}
+        work_files_to_resolve = [wf for wf in work_files if wf["path"] not in indexed_details]
+
+        # stat all files that need modification details in one go:
+        stat_results = dict(stat_results or {})
+        stat_results.update(DirectoryWalker().stat_paths([wf["path"] for wf in work_files_to_resolve
+                                                          if wf["path"] not in stat_results
+                                                          and (not wf["modified_at"] or not wf["modified_by"])]))
+        # and find the users that own them with a single Shotgun query:
+        g_user_cache.cache_file_owners([stat_results.get(wf["path"]) for wf in work_files_to_resolve
+                                        if not wf["modified_by"]])
+
+        # if the context doesn't have a task then resolve the contexts for all directories the files
+        # are in so that the task can be determined from the path:
+        dir_contexts = {}
+        if not context.task:
+            dir_contexts = g_context_cache.resolve_directories([os.path.dirname(wf["path"])
+                                                                for wf in work_files_to_resolve
+                                                                if not wf["task"]], context)
+
         for work_file in work_files:
             
             # always have the work path:
             work_path = work_file["path"]
             
             # get fields for work file:
-            wf_fields = work_template.get_fields(work_path)
+            wf_fields = g_template_cache.get_fields(work_template, work_path)
             
             # build the unique file key for the work path.  All files that share the same key are considered
             # to be different versions of the same file.
             #
-            file_key = FileItem.build_file_key(wf_fields, work_template, 
-                                               version_compare_ignore_fields)
+            file_key = key_builder.build_key(wf_fields)
             if filter_file_key and file_key != filter_file_key:
                 # we can ignore this file completely!
                 continue
@@ -230,6 +306,14 @@ class FileFinder(QtCore.QObject):
             # copy common fields from work_file:
             #
             file_details = dict([(k, v) for k, v in work_file.iteritems() if k != "path"])
+
+            # re-use the resolved details from the index for any that weren't provided by the
+            # filter_work_files hook:
+            file_indexed_details = indexed_details.get(work_path)
+            if file_indexed_details:
+                for field in ("task", "modified_at", "modified_by"):
+                    if not file_details[field]:
+                        file_details[field] = file_indexed_details.get(field)
             
             # get version from fields if not specified in work file:
             if not file_details["version"]:
@@ -241,7 +325,7 @@ class FileFinder(QtCore.QObject):
                     file_details["task"] = context.task
                 else:
                     # try to create a context from the path and see if that contains a task:
-                    wf_ctx = self._app.sgtk.context_from_path(work_path, context)
+                    wf_ctx = dir_contexts.get(os.path.dirname(work_path))
                     if wf_ctx and wf_ctx.task:
                         file_details["task"] = wf_ctx.task 
 
@@ -251,17 +335,14 @@ class FileFinder(QtCore.QObject):
             # entity:
             file_details["entity"] = context.entity
 
-            # file modified details:
-            if not file_details["modified_at"]:
-                try:
-                    modified_at = os.path.getmtime(work_path)
-                    file_details["modified_at"] = datetime.fromtimestamp(modified_at, tz=sg_timezone.local)
-                except OSError:
-                    # ignore OSErrors as it's probably a permissions thing!
-                    pass
+            # file modified details - ignore files that couldn't be stat'd as it's probably a
+            # permissions thing!
+            stat_result = stat_results.get(work_path)
+            if not file_details["modified_at"] and stat_result:
+                file_details["modified_at"] = datetime.fromtimestamp(stat_result.st_mtime, tz=sg_timezone.local)
 
-            if not file_details["modified_by"]:
-                file_details["modified_by"] = g_user_cache.get_file_last_modified_user(work_path)
+            if not file_details["modified_by"] and stat_result:
+                file_details["modified_by"] = g_user_cache.get_file_last_modified_user(work_path, stat_result)
 
             # make sure all files with the same key have the same name:
             file_details["name"] = name_map.get_name(file_key, work_path, work_template, wf_fields)
@@ -271,22 +352,30 @@ class FileFinder(QtCore.QObject):
             """
             
             # add to the list of files
-            files[(file_key, file_details["version"])] = {"key":file_key, 
-                                                          "is_work_file":True, 
-                                                          "work_path":work_path, 
-                                                          "work_details":file_details}
-                
+            item_args = {"key":file_key,
+                         "is_work_file":True,
+                         "work_path":work_path,
+                         "work_details":file_details}
+            files[(file_key, file_details["version"])] = item_args
+            if file_processed_cb:
+                file_processed_cb(item_args)
+
         return files
         
     def _process_publish_files(self, sg_publishes, publish_template, work_template, context, name_map, 
-                             version_compare_ignore_fields, filter_file_key=None):
+                             version_compare_ignore_fields, filter_file_key=None, file_processed_cb=None):
         """
         """
         files = {}
         
         # and add in publish details:
-        ctx_fields = context.as_template_fields(work_template)
-                    
+        ctx_fields = g_template_cache.context_fields(context, work_template)
+        key_builder = FileKeyBuilder.get(work_template, version_compare_ignore_fields)
+
+        # stat all local publish files in one go:
+        stat_results = DirectoryWalker().stat_paths([sg_publish["path"] for sg_publish in sg_publishes])
+        g_user_cache.cache_file_owners(stat_results.values())
+
         for sg_publish in sg_publishes:
             file_details = {}
     
@@ -297,7 +386,7 @@ class FileFinder(QtCore.QObject):
             # The order is important as it ensures that the user is correct if the 
             # publish file is in a user sandbox but we also need to be careful not
             # to overrwrite fields that are being ignored when comparing work files
-            publish_fields = publish_template.get_fields(publish_path)
+            publish_fields = g_template_cache.get_fields(publish_template, publish_path)
             wp_fields = publish_fields.copy()
             for k, v in ctx_fields.iteritems():
                 if k not in version_compare_ignore_fields:
@@ -305,8 +394,7 @@ class FileFinder(QtCore.QObject):
             
             # build the unique file key for the publish path.  All files that share the same key are considered
             # to be different versions of the same file.
-            file_key = FileItem.build_file_key(wp_fields, work_template, 
-                                               version_compare_ignore_fields)
+            file_key = key_builder.build_key(wp_fields)
             if filter_file_key and file_key != filter_file_key:
                 # we can ignore this file completely!
                 continue
@@ -314,7 +402,7 @@ class FileFinder(QtCore.QObject):
             # resolve the work path:
             work_path = ""
             try:
-                work_path = work_template.apply_fields(wp_fields)
+                work_path = g_template_cache.apply_fields(work_template, wp_fields)
             except TankError, e:
                 # unable to generate a work path - this means we are probably missing a field so it's going to
                 # be a problem matching this publish up with its corresponding work file!
@@ -332,14 +420,10 @@ class FileFinder(QtCore.QObject):
             file_details["entity"] = context.entity
         
             # local file modified details:
-            if os.path.exists(publish_path):
-                try:
-                    modified_at = os.path.getmtime(publish_path)
-                    file_details["modified_at"] = datetime.fromtimestamp(modified_at, tz=sg_timezone.local)
-                except OSError:
-                    # ignore OSErrors as it's probably a permissions thing!
-                    pass
-                file_details["modified_by"] = g_user_cache.get_file_last_modified_user(publish_path)
+            stat_result = stat_results.get(publish_path)
+            if stat_result:
+                file_details["modified_at"] = datetime.fromtimestamp(stat_result.st_mtime, tz=sg_timezone.local)
+                file_details["modified_by"] = g_user_cache.get_file_last_modified_user(publish_path, stat_result)
             else:
                 # just use the publish info
                 file_details["modified_at"] = sg_publish.get("published_at")
@@ -351,11 +435,14 @@ class FileFinder(QtCore.QObject):
             # add new file item for this publish.  Note that we also keep track of the
             # work path even though we don't know if this publish has a corresponding
             # work file.
-            files[(file_key, file_details["version"])] = {"key":file_key, 
-                                                          "work_path":work_path,
-                                                          "is_published":True,
-                                                          "publish_path":publish_path,
-                                                          "publish_details":file_details}
+            item_args = {"key":file_key,
+                         "work_path":work_path,
+                         "is_published":True,
+                         "publish_path":publish_path,
+                         "publish_details":file_details}
+            files[(file_key, file_details["version"])] = item_args
+            if file_processed_cb:
+                file_processed_cb(item_args)
         return files
 
     def _find_publishes(self, publish_filters):
@@ -365,16 +452,14 @@ class FileFinder(QtCore.QObject):
         :returns:                   List of dictionaries, each one containing the details
                                     of an individual published file
         """
-        fields = ["id", "description", "version_number", "image", "created_at", "created_by", "name", "path", "task"]
-        published_file_type = sgtk.util.get_published_file_entity_type(self._app.sgtk)
-        sg_publishes = self._app.shotgun.find(published_file_type, publish_filters, fields)
-        return sg_publishes
+        return g_publish_fetcher.find(publish_filters)
 
     def _filter_publishes(self, sg_publishes, publish_template, valid_file_extensions):
         """
         """
-        # build list of publishes to send to the filter_publishes hook:
-        hook_publishes = [{"sg_publish":sg_publish} for sg_publish in sg_publishes]
+        # build list of publishes to send to the filter_publishes hook.  The publish records are shared
+        # and read-only so the hook is given its own plain dictionaries that it's free to modify:
+        hook_publishes = [{"sg_publish":copy.deepcopy(dict(sg_publish))} for sg_publish in sg_publishes]
         
         # execute the hook - this will return a list of filtered publishes:
         hook_result = self._app.execute_hook("hook_filter_publishes", publishes = hook_publishes)
@@ -383,6 +468,10 @@ class FileFinder(QtCore.QObject):
                           % type(hook_result).__name__)
             hook_result = []
         
+        # paths are matched against the publish template with a matcher that quickly rejects paths
+        # outside of the template's directories:
+        path_matcher = TemplatePathMatcher.get(publish_template)
+
         # split back out publishes:
         published_files = []
         for item in hook_result:
@@ -395,15 +484,16 @@ class FileFinder(QtCore.QObject):
             # UI or with the Shotgun API, in which cases local_path might not be set and ["path"]
             # will contain None.
             path = (sg_publish["path"] or {}).get("local_path")
-            if not path:
+            if not path or not path_matcher.could_match(path):
                 continue
             
             # skip file if it doesn't contain a valid file extension:
             if valid_file_extensions and os.path.splitext(path)[1] not in valid_file_extensions:
                 continue
     
-            # make sure path matches the publish template:            
-            if not publish_template.validate(path):
+            # make sure path matches the publish template.  This also caches the fields for the
+            # path so they don't need to be extracted again when the publish is processed:
+            if path_matcher.get_fields(path) is None:
                 continue
     
             # build file details for this publish:
@@ -413,7 +503,10 @@ class FileFinder(QtCore.QObject):
             file_details["version"] = sg_publish.get("version_number")
             file_details["name"] = sg_publish.get("name")
             file_details["task"] = sg_publish.get("task")
-            file_details["publish_description"] = sg_publish.get("description")
+            if "description" in sg_publish:
+                # the description isn't usually requested when finding publishes and will be
+                # fetched when it's needed instead:
+                file_details["publish_description"] = sg_publish.get("description")
             file_details["thumbnail"] = sg_publish.get("image")
             
             file_details["published_at"] = sg_publish.get("created_at")
@@ -432,7 +525,8 @@ class FileFinder(QtCore.QObject):
         return published_files
     
         
-    def _find_work_files(self, context, work_template, version_compare_ignore_fields):
+    def _find_work_files(self, context, work_template, version_compare_ignore_fields, dir_mtimes=None,
+                         filter_fields=None, shared_scan=None):
         """
         Find all work files for the specified context and work template
         
@@ -440,13 +534,19 @@ class FileFinder(QtCore.QObject):
         :param work_template:                   The work template to match found files against
         :param version_compare_ignore_fields:   List of fields to ignore when comparing files in order to find 
                                                 different versions of the same file
+        :param dir_mtimes:                      Optional dictionary that will be populated with the modification
+                                                times of all directories looked at when finding the files
+        :param filter_fields:                   Optional dictionary of fields that all work files must match.
+                                                These are used to limit the directories & files searched
+        :param shared_scan:                     Optional SharedTemplateScan to find the paths with so that
+                                                the scan is shared with other searches
         :returns:                               List of dictionaries, each one containing the details
                                                 of an individual work file        
         """
         # find work files that match the current work template:
         work_fields = []
         try:
-            work_fields = context.as_template_fields(work_template, validate=True)
+            work_fields = g_template_cache.context_fields(context, work_template, validate=True)
         except TankError:
             # could not resolve fields from this context. This typically happens
             # when the context object does not have any corresponding objects on 
@@ -455,21 +555,16 @@ class FileFinder(QtCore.QObject):
             return []
 
         # build list of fields to ignore when looking for files:
-        skip_fields = list(version_compare_ignore_fields or [])
+        skip_fields = self._get_work_file_skip_fields(work_fields, work_template, version_compare_ignore_fields)
 
-        # Skip any keys from work_fields that are _only_ optional in the template.  This is to
-        # ensure we find as wide a range of files as possible considering all optional keys.
-        # Note, this may be better as a general change to the paths_from_template method...
-        skip_fields += [n for n in work_fields.keys() if work_template.is_optional(n)]
-        
-        # Find all versions so skip the 'version' key if it's present:
-        skip_fields += ["version"]
+        # add any fields the files must match so that they are used to build the glob patterns:
+        if filter_fields:
+            work_fields.update(filter_fields)
+            skip_fields = [name for name in skip_fields if name not in filter_fields]
 
         # find paths:
-        work_file_paths = self._app.sgtk.paths_from_template(work_template, 
-                                                              work_fields, 
-                                                              skip_fields, 
-                                                              skip_missing_optional_keys=True)
+        walker = shared_scan or DirectoryWalker(FileFinder._listing_cache)
+        work_file_paths = walker.paths_from_template(work_template, work_fields, skip_fields, dir_mtimes)
 
         return work_file_paths
 
@@ -496,6 +591,45 @@ class FileFinder(QtCore.QObject):
         
         return work_file_paths
         
+    def _match_work_file_paths(self, work_file_paths, context, work_template, version_compare_ignore_fields):
+        """
+        Filter a list of paths to just those that are work files for the specified context
+
+        :param work_file_paths:                 The list of paths to filter
+        :param context:                         The context the work files should be for
+        :param work_template:                   The work template the paths should match
+        :param version_compare_ignore_fields:   List of fields to ignore when comparing files in order to find
+                                                different versions of the same file
+        :returns:                               List of the paths that are valid work files for the context
+        """
+        try:
+            work_fields = g_template_cache.context_fields(context, work_template, validate=True)
+        except TankError:
+            return []
+        skip_fields = self._get_work_file_skip_fields(work_fields, work_template, version_compare_ignore_fields)
+        return filter_template_paths(work_template, work_file_paths, work_fields, skip_fields)
+
+    def _get_work_file_skip_fields(self, work_fields, work_template, version_compare_ignore_fields):
+        """
+        Build the list of fields to skip when searching for work files
+
+        :param work_fields:                     The fields resolved from the context for the work template
+        :param work_template:                   The work template that files are being searched for with
+        :param version_compare_ignore_fields:   List of fields to ignore when comparing files in order to find
+                                                different versions of the same file
+        :returns:                               List of field names to skip when searching for work files
+        """
+        skip_fields = list(version_compare_ignore_fields or [])
+
+        # Skip any keys from work_fields that are _only_ optional in the template.  This is to
+        # ensure we find as wide a range of files as possible considering all optional keys.
+        # Note, this may be better as a general change to the paths_from_template method...
+        skip_fields += [n for n in work_fields.keys() if work_template.is_optional(n)]
+
+        # Find all versions so skip the 'version' key if it's present:
+        skip_fields += ["version"]
+        return skip_fields
+
     def _filter_work_files(self, work_file_paths, valid_file_extensions):
         """
         """
@@ -548,34 +682,124 @@ class AsyncFileFinder(FileFinder):
     any files found via signals as they are found.
     """
     class _SearchData(object):
-        def __init__(self, search_id, entity, users, publish_model):
+        def __init__(self, search_id, entity, users):
             """
             """
             self.id = search_id
             self.entity = copy.deepcopy(entity)
             self.users = copy.deepcopy(users)
-            self.publish_model = publish_model
-            self.publish_model_refreshed = False
+            self.publishes_loaded = False
+            self.publishes_synced = False
             self.aborted = False
 
-            self.name_map = FileFinder._FileNameMap()
+            self.name_map = FileFinder._shared_name_map
 
             self.construct_work_area_task = None
             self.resolve_work_area_task = None
+            self.load_indexed_work_files_task = None
             self.find_work_files_tasks = set()
             self.load_cached_pubs_task = None
+            self.publish_filters = None
+            self.sync_publishes_task = None
             self.find_publishes_tasks = set()
+            # tasks processing the pages of publishes found whilst the publishes are synced:
+            self.publish_page_tasks = set()
+            # increases each time the full list of publishes is processed so that files from a pass
+            # that has been superseded can be ignored:
+            self.publish_pass = 0
             self.user_work_areas = {}
 
+            # the batch the search is part of (if any):
+            self.batch = None
+
+    class _SearchBatch(object):
+        """
+        A set of searches for sibling tasks whose publishes are found with a single query for each
+        parent entity and whose work files are found with a single scan of their shared work area.
+        """
+        def __init__(self, batch_id):
+            """
+            :param batch_id:    The unique id of the batch.  This is also the group id used for the
+                                background tasks that run for the whole batch
+            """
+            self.id = batch_id
+            self.search_ids = set()
+            # searches whose work area hasn't been constructed yet:
+            self.pending_ids = set()
+            # search id:(Task entity dictionary, parent entity dictionary)
+            self.tasks = {}
+            # list of Shotgun filters, one for each parent entity of the tasks:
+            self.publish_filters = []
+            self.load_cached_pubs_task = None
+            self.sync_publishes_task = None
+            self.publishes_distributed = False
+            self.shared_scan = SharedTemplateScan(FileFinder._listing_cache)
+
+    class _FileItemStream(object):
+        """
+        Builds FileItems for files as they are processed by a background task and emits them in
+        chunks so that they can be shown before the whole task has completed.
+        """
+        def __init__(self, emit_chunk_fn, chunk_size, chunk_interval):
+            """
+            :param emit_chunk_fn:   Function called with the list of FileItems in each chunk
+            :param chunk_size:      The maximum number of files in a chunk
+            :param chunk_interval:  The maximum time in seconds between chunks being emitted
+            """
+            self._emit_chunk_fn = emit_chunk_fn
+            self._chunk_size = chunk_size
+            self._chunk_interval = chunk_interval
+            self._files = []
+            self._last_emit_time = time.time()
+
+        def add(self, item_args):
+            """
+            Add a file to the stream, emitting the current chunk if it's full or if it's been
+            too long since the last chunk was emitted.
+
+            :param item_args:   The arguments to construct the FileItem with
+            """
+            self._files.append(FileItem(**item_args))
+            if (len(self._files) >= self._chunk_size
+                or time.time() - self._last_emit_time >= self._chunk_interval):
+                self._emit_chunk_fn(self._files)
+                self._files = []
+                self._last_emit_time = time.time()
+
+        def take_remaining(self):
+            """
+            :returns:   The list of FileItems that haven't been emitted yet
+            """
+            files = self._files
+            self._files = []
+            return files
+
     _FIND_PUBLISHES_PRIORITY, _FIND_FILES_PRIORITY = (20, 40)
 
+    # files are streamed from the background tasks in chunks of at most this many files...
+    CHUNK_SIZE = 200
+    # ...and at least this often (in seconds) whilst files are being processed:
+    CHUNK_INTERVAL = 0.05
+
     # Signals
     work_area_found = QtCore.Signal(object, object)
     work_area_resolved = QtCore.Signal(object, object) # search_id, WorkArea
-    files_found = QtCore.Signal(object, object, object) # search_id, file list, WorkArea
-    publishes_found = QtCore.Signal(object, object, object) # search_id, file list, WorkArea
+    files_found = QtCore.Signal(object, object, object, bool) # search_id, file list, WorkArea, is_final
+    # work files loaded from the index - these are always a partial result that may be out of date:
+    indexed_files_found = QtCore.Signal(object, object, object) # search_id, file list, WorkArea
+    publishes_found = QtCore.Signal(object, object, object, bool) # search_id, file list, WorkArea, is_final
+    # the publishes for a search are being processed again so any partial results already emitted for
+    # them have been superseded:
+    publishes_restarted = QtCore.Signal(object) # search_id
     search_failed = QtCore.Signal(object, object) # search_id, message
     search_completed = QtCore.Signal(object) # search_id
+    work_files_updated = QtCore.Signal(object, object, object) # update_id, file list, WorkArea
+
+    # internal signal used to send chunks of files from the background tasks to the main thread:
+    # search_id, file list, WorkArea, is_publish, publish pass:
+    _file_chunk_found = QtCore.Signal(object, object, object, bool, object)
+    # internal signal used to send each page of publishes found by a sync to the main thread:
+    _publish_page_found = QtCore.Signal(object, object) # search or batch id, list of PublishRecords
 
     def __init__(self, bg_task_manager, parent=None):
         """
@@ -583,25 +807,22 @@ class AsyncFileFinder(FileFinder):
         FileFinder.__init__(self, parent)
 
         self._searches = {}
-        self._available_publish_models = []
+        self._batches = {}
+        self._work_file_updates = set()
 
         self._bg_task_manager = bg_task_manager
         self._bg_task_manager.task_completed.connect(self._on_background_task_completed)
         self._bg_task_manager.task_failed.connect(self._on_background_task_failed)
         self._bg_task_manager.task_group_finished.connect(self._on_background_search_finished)
 
+        self._file_chunk_found.connect(self._on_file_chunk_found, QtCore.Qt.QueuedConnection)
+        self._publish_page_found.connect(self._on_publish_page_found, QtCore.Qt.QueuedConnection)
+
     def shut_down(self):
         """
         """
-        # clean up any publish models - not doing this will result in 
-        # severe instability!
-        for search in self._searches:
-            if search.publish_model:
-                self._available_publish_models.append(search.publish_model)
         self._searches = {}
-        for publish_model in self._available_publish_models:
-            publish_model.destroy()
-        self._available_publish_models = []
+        self._batches = {}
 
         # and shut down the task manager
         if self._bg_task_manager:
@@ -622,12 +843,12 @@ class AsyncFileFinder(FileFinder):
         Stage 2:
            - find work-files
                - process work files
-           - find cached publishes
+           - load cached publishes
                - process cached publishes
-           - refresh un-cached publishes
+           - sync publishes with Shotgun
 
         Stage 3:
-           - Process un-cached publishes
+           - Process changed publishes
 
         :param entity:  The entity to search for files for
         :param users:   A list of user sandboxes to search for files for.  If 'None' then only files for the current
@@ -638,22 +859,8 @@ class AsyncFileFinder(FileFinder):
         # get a new unique group id from the task manager - this will be used as the search id
         search_id = self._bg_task_manager.next_group_id()
 
-        # get a publish model - re-use if possible, otherwise create a new one.  Max number of publish
-        # models created will be the max number of searches at any one time.
-        publish_model = None
-        if self._available_publish_models:
-            # re-use an existing publish model:
-            publish_model = self._available_publish_models.pop(0)
-        else:
-            # create a new model:
-            publish_model = SgPublishedFilesModel(search_id, self._bg_task_manager, parent=self)
-            publish_model.data_refreshed.connect(self._on_publish_model_refreshed)
-            publish_model.data_refresh_fail.connect(self._on_publish_model_refresh_failed)
-            monitor_qobject_lifetime(publish_model, "Finder publish model")
-        publish_model.uid = search_id
-
         # construct the new search data:
-        search = AsyncFileFinder._SearchData(search_id, entity, users, publish_model)
+        search = AsyncFileFinder._SearchData(search_id, entity, users)
         self._searches[search.id] = search
 
         # begin the search stage 1:
@@ -662,6 +869,58 @@ class AsyncFileFinder(FileFinder):
         # and return the search id:
         return search.id
 
+    def begin_batch_search(self, entities, users = None):
+        """
+        Begin searches for several sibling Task entities as a single batch.  Each entity gets its own
+        search that emits its files in the same way as a search started with begin_search() but the
+        publishes for all tasks are found with a single query for each parent entity and the work
+        area shared by the tasks is only scanned once.
+
+        :param entities:    The list of Task entities to search for files for
+        :param users:       A list of user sandboxes to search for files for.  If 'None' then only files
+                            for the current users sandbox will be searched for.
+        :returns:           A list containing the search id for each entity in the same order as
+                            the entities
+        """
+        users = users or []
+
+        batch = AsyncFileFinder._SearchBatch(self._bg_task_manager.next_group_id())
+        self._batches[batch.id] = batch
+
+        search_ids = []
+        for entity in entities:
+            search_id = self._bg_task_manager.next_group_id()
+            search = AsyncFileFinder._SearchData(search_id, entity, users)
+            search.batch = batch
+            self._searches[search.id] = search
+            batch.search_ids.add(search.id)
+            batch.pending_ids.add(search.id)
+            search_ids.append(search.id)
+
+        for search_id in search_ids:
+            self._begin_search_stage_1(self._searches[search_id])
+
+        return search_ids
+
+    def begin_work_file_update(self, work_area, work_file_paths):
+        """
+        Find any work files for the work area in the specified list of paths and emit them through the
+        work_files_updated signal.  This allows new files to be added without searching the whole work
+        area again.
+
+        :param work_area:       The WorkArea to find the work files for
+        :param work_file_paths: A list of paths that may be work files for the work area
+        :returns:               A unique id for the update
+        """
+        update_id = self._bg_task_manager.next_group_id()
+        self._bg_task_manager.add_task(self._task_process_work_file_paths,
+                                       group=update_id,
+                                       priority=AsyncFileFinder._FIND_FILES_PRIORITY,
+                                       task_kwargs = {"environment":work_area,
+                                                      "work_file_paths":list(work_file_paths)})
+        self._work_file_updates.add(update_id)
+        return update_id
+
     def _begin_search_stage_1(self, search):
         """
         """
@@ -681,91 +940,278 @@ class AsyncFileFinder(FileFinder):
         """
         """
 
-        # 2a. Add tasks to find and filter work files:
+        # create a copy of the work area for each user:
         for user in search.users:
             user_id = user["id"] if user else None
+            search.user_work_areas[user_id] = work_area.create_copy_for_user(user) if user else work_area
 
-            # create a copy of the work area for this user:
-            user_work_area = work_area.create_copy_for_user(user) if user else work_area
-            search.user_work_areas[user_id] = user_work_area
-
-            # find work files:
-            find_work_files_task = self._bg_task_manager.add_task(self._task_find_work_files, 
-                                                                  group=search.id,
-                                                                  priority=AsyncFileFinder._FIND_FILES_PRIORITY,
-                                                                  task_kwargs = {"environment":user_work_area})
-
-            # filter work files:
-            filter_work_files_task = self._bg_task_manager.add_task(self._task_filter_work_files,
-                                                                    group=search.id,
-                                                                    priority=AsyncFileFinder._FIND_FILES_PRIORITY,
-                                                                    upstream_task_ids = [find_work_files_task],
-                                                                    task_kwargs = {"environment":user_work_area})
-
-            # build work items:
-            process_work_items_task = self._bg_task_manager.add_task(self._task_process_work_items,
-                                                                     group=search.id, 
-                                                                     priority=AsyncFileFinder._FIND_FILES_PRIORITY,
-                                                                     upstream_task_ids = [filter_work_files_task],
-                                                                     task_kwargs = {"environment":user_work_area,
-                                                                                    "name_map":search.name_map})
-            search.find_work_files_tasks.add(process_work_items_task)
+        # load any work files stored in the index for these users so that they can be shown
+        # straight away whilst the files on disk are revalidated:
+        search.load_indexed_work_files_task = self._bg_task_manager.add_task(self._task_load_indexed_work_files,
+                                                                   group=search.id,
+                                                                   priority=AsyncFileFinder._FIND_FILES_PRIORITY,
+                                                                   task_kwargs = {"user_work_areas":
+                                                                                  dict(search.user_work_areas)})
+
+        # when the work files live in user sandboxes, all sandboxes share the same parent
+        # directory so find the files for all users with a single scan:
+        scan_sandboxes_task = None
+        if work_area.work_area_contains_user_sandboxes and len(search.user_work_areas) > 1:
+            scan_sandboxes_task = self._bg_task_manager.add_task(self._task_scan_sandbox_work_files,
+                                                                 group=search.id,
+                                                                 priority=AsyncFileFinder._FIND_FILES_PRIORITY,
+                                                                 upstream_task_ids = [search.load_indexed_work_files_task],
+                                                                 task_kwargs = {"user_work_areas":
+                                                                                dict(search.user_work_areas)})
+
+        # 2a. Add a task for each user to find, filter and process their work files.  If the work files
+        # are found by the sandbox scan then the task just filters and processes them.  Searches in
+        # a batch share a single scan of the work area:
+        upstream_task = scan_sandboxes_task or search.load_indexed_work_files_task
+        shared_scan = search.batch.shared_scan if search.batch else None
+        for user in search.users:
+            user_id = user["id"] if user else None
+            user_work_area = search.user_work_areas[user_id]
 
-    def _begin_search_process_publishes(self, search, sg_publishes):
+            work_files_task = self._bg_task_manager.add_task(self._task_find_and_process_work_files,
+                                                             group=search.id,
+                                                             priority=AsyncFileFinder._FIND_FILES_PRIORITY,
+                                                             upstream_task_ids = [upstream_task],
+                                                             task_kwargs = {"environment":user_work_area,
+                                                                            "name_map":search.name_map,
+                                                                            "user_id":user_id,
+                                                                            "search_id":search.id,
+                                                                            "shared_scan":shared_scan})
+            search.find_work_files_tasks.add(work_files_task)
+
+    def _begin_search_process_publishes(self, search, sg_publishes, is_page=False):
         """
+        :param search:          The search to process the publishes for
+        :param sg_publishes:    The list of PublishRecords to process
+        :param is_page:         True if the publishes are a single page found whilst the publishes are being
+                                synced.  The files for a page are emitted as a partial result
         """
-        # 3a. Process publishes
+        if not is_page:
+            # the full list of publishes supersedes any pages and any earlier list (e.g. the cached
+            # publishes) that are still being processed.  Results from those tasks are ignored from
+            # now on and any partial results they've already emitted are discarded:
+            for task_id in search.publish_page_tasks | search.find_publishes_tasks:
+                self._bg_task_manager.stop_task(task_id)
+            search.publish_page_tasks = set()
+            search.find_publishes_tasks = set()
+            search.publish_pass += 1
+            self.publishes_restarted.emit(search.id)
+
+        if not search.users:
+            return
+
+        # 3a. Filter the publishes.  The publish template and valid file extensions are the same for all
+        # users so the publishes are run through the filter_publishes hook once for the whole search:
+        work_area = search.user_work_areas.values()[0]
+        filter_task = self._bg_task_manager.add_task(self._task_filter_publishes,
+                                                     group=search.id,
+                                                     priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
+                                                     task_kwargs = {"environment":work_area,
+                                                                    "sg_publishes":sg_publishes})
+
+        # 3b. Build the publish items for each user.  The filtered publishes are never modified so
+        # the same list is shared by all users:
         for user in search.users:
             user_id = user["id"] if user else None
             user_work_area = search.user_work_areas[user_id]
 
-            users_publishes = copy.deepcopy(sg_publishes)
+            publishes_task = self._bg_task_manager.add_task(self._task_process_publish_items,
+                                                            group=search.id,
+                                                            priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
+                                                            upstream_task_ids = [filter_task],
+                                                            task_kwargs = {"environment":user_work_area,
+                                                                           "name_map":search.name_map,
+                                                                           "search_id":search.id,
+                                                                           "stream_files":not is_page,
+                                                                           "publish_pass":search.publish_pass})
+            if is_page:
+                search.publish_page_tasks.add(publishes_task)
+            else:
+                search.find_publishes_tasks.add(publishes_task)
 
-            # filter publishes:
-            filter_publishes_task = self._bg_task_manager.add_task(self._task_filter_publishes,
-                                                                   group=search.id,
-                                                                   priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
-                                                                   task_kwargs = {"environment":user_work_area,
-                                                                                  "sg_publishes":users_publishes})
-            # build publish items:
-            process_publish_items_task = self._bg_task_manager.add_task(self._task_process_publish_items,
-                                                                        group=search.id,
-                                                                        priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
-                                                                        upstream_task_ids = [filter_publishes_task],
-                                                                        task_kwargs = {"environment":user_work_area,
-                                                                                       "name_map":search.name_map})
+    def _add_search_to_batch(self, search, work_area):
+        """
+        Add a search whose work area has been constructed to its batch.  Once the work areas for all
+        searches in the batch have been constructed, the publishes for the whole batch are found.
+        Runs in main thread.
+
+        :param search:      The search to add
+        :param work_area:   The work area constructed for the search or None if the search was aborted
+        """
+        batch = search.batch
+        batch.pending_ids.discard(search.id)
+        if work_area and work_area.context and work_area.context.task:
+            parent = work_area.context.entity or work_area.context.project
+            batch.tasks[search.id] = (work_area.context.task, parent)
+        elif work_area:
+            # publishes can only be found for the batch by task so find the publishes for
+            # this search on its own:
+            batch.search_ids.discard(search.id)
+            search.batch = None
+            self._begin_search_for_publishes(search, work_area)
+        else:
+            batch.search_ids.discard(search.id)
+            search.batch = None
+        self._check_batch_ready(batch)
 
-            search.find_publishes_tasks.add(process_publish_items_task)
+    def _check_batch_ready(self, batch):
+        """
+        Begin finding the publishes for a batch if the work areas for all of its searches have been
+        constructed.  Runs in main thread.
 
-    def _on_publish_model_refreshed(self, data_changed):
+        :param batch:   The _SearchBatch to check
         """
+        if batch.pending_ids or batch.publish_filters:
+            # still waiting for work areas or the publishes are already being found!
+            return
+        if not batch.tasks:
+            # nothing left to find publishes for:
+            self._stop_batch(batch)
+            return
+
+        # build a single filter for each parent entity that finds the publishes for all of its tasks:
+        tasks_by_parent = {}
+        for task, parent in batch.tasks.values():
+            parent_key = (parent.get("type"), parent.get("id"))
+            parent_tasks = tasks_by_parent.setdefault(parent_key, (parent, {}))[1]
+            parent_tasks[task["id"]] = {"type":task["type"], "id":task["id"]}
+        for parent, tasks in tasks_by_parent.values():
+            # sort the tasks so that the filters are the same for the same set of tasks:
+            sorted_tasks = [tasks[task_id] for task_id in sorted(tasks)]
+            batch.publish_filters.append([["entity", "is", {"type":parent["type"], "id":parent["id"]}],
+                                          ["task", "in", sorted_tasks]])
+
+        # load any cached publishes and then bring them up-to-date:
+        batch.load_cached_pubs_task, batch.sync_publishes_task = self._add_publish_tasks(batch.id,
+                                                                                         batch.publish_filters)
+
+    def _distribute_batch_publishes(self, batch, synced_publishes):
         """
-        model = self.sender()
-        if model.uid not in self._searches:
+        Split the publishes found for a batch out by task and process them for each search in the
+        batch.  Runs in main thread.
+
+        :param batch:               The _SearchBatch the publishes were found for
+        :param synced_publishes:    A list of tuples (list of PublishRecord instances, True if the
+                                    publishes changed), one for each of the batch publish filters
+        """
+        changed = not batch.publishes_distributed
+        all_publishes = []
+        for publishes, publishes_changed in synced_publishes:
+            changed = changed or publishes_changed
+            all_publishes.extend(publishes)
+        batch.publishes_distributed = True
+        if not changed:
+            # the publishes have already been processed for all searches!
             return
-        search = self._searches[model.uid]
-        search.publish_model_refreshed = True
 
-        # get any publishes from the publish model:
-        sg_publishes = copy.deepcopy(search.publish_model.get_sg_data())
+        publishes_by_task = self._split_publishes_by_task(all_publishes)
+        for search_id, (task, _) in batch.tasks.iteritems():
+            search = self._searches.get(search_id)
+            if search:
+                self._begin_search_process_publishes(search, publishes_by_task.get(task["id"], []))
 
-        # and begin processing:
-        self._begin_search_process_publishes(search, sg_publishes)
+    def _split_publishes_by_task(self, sg_publishes):
+        """
+        :param sg_publishes:    A list of PublishRecords
+        :returns:               A dictionary {task id:list of PublishRecords for the task}
+        """
+        publishes_by_task = {}
+        for sg_publish in sg_publishes:
+            task_id = (sg_publish.get("task") or {}).get("id")
+            publishes_by_task.setdefault(task_id, []).append(sg_publish)
+        return publishes_by_task
+
+    def _stop_batch(self, batch):
+        """
+        Stop any background tasks running for a batch and forget about it.  Runs in main thread.
 
-    def _on_publish_model_refresh_failed(self, msg):
+        :param batch:   The _SearchBatch to stop
         """
+        self._bg_task_manager.stop_task_group(batch.id)
+        if batch.id in self._batches:
+            del self._batches[batch.id]
+
+    def _on_batch_task_completed(self, task_id, batch, result):
         """
-        model = self.sender()
-        search_id = model.search_id
-        if search_id not in self._searches:
+        Called when a background task that was run for a whole batch has completed.  Runs in main thread.
+
+        :param task_id: The id of the task that completed
+        :param batch:   The _SearchBatch the task was run for
+        :param result:  The result of the task
+        """
+        if task_id == batch.load_cached_pubs_task:
+            batch.load_cached_pubs_task = None
+            # if the publishes have all been found before then process them straight away whilst any
+            # changes since then are found in the background:
+            cached_publishes = result.get("cached_publishes", [])
+            if cached_publishes and all(publishes is not None for publishes in cached_publishes):
+                self._distribute_batch_publishes(batch, [(publishes, True) for publishes in cached_publishes])
             return
-        self.stop_search(search_id)
-        self.search_failed.emit(search_id, msg)
+        if task_id != batch.sync_publishes_task:
+            return
+        batch.sync_publishes_task = None
+        self._distribute_batch_publishes(batch, result.get("synced_publishes", []))
+
+        # the publishes for all searches in the batch have now been found:
+        for search_id in list(batch.search_ids):
+            search = self._searches.get(search_id)
+            if not search:
+                continue
+            search.publishes_synced = True
+            # the search may have been waiting on the publishes to finish:
+            self._on_background_search_finished(search_id)
+        self._stop_batch(batch)
+
+    def _begin_search_for_publishes(self, search, work_area):
+        """
+        Add the tasks to load the cached publishes for a search and then bring them up-to-date.
+
+        :param search:      The search to find the publishes for
+        :param work_area:   The work area constructed for the search
+        """
+        search.publish_filters = self._get_publish_filters(work_area)
+        search.load_cached_pubs_task, search.sync_publishes_task = self._add_publish_tasks(search.id,
+                                                                                           [search.publish_filters])
+
+    def _add_publish_tasks(self, group_id, publish_filters):
+        """
+        Add the background tasks to load the cached publishes for a list of filters and then sync them
+        with Shotgun.  Neither task runs in the main thread.
+
+        :param group_id:        The task group to add the tasks to
+        :param publish_filters: A list containing the Shotgun filters for each set of publishes to find
+        :returns:               Tuple containing (load cached publishes task id, sync publishes task id)
+        """
+        load_cached_task = self._bg_task_manager.add_task(self._task_load_cached_publishes,
+                                                          group=group_id,
+                                                          priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
+                                                          task_kwargs = {"publish_filters":list(publish_filters)})
+        sync_task = self._bg_task_manager.add_task(self._task_sync_publishes,
+                                                   group=group_id,
+                                                   priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
+                                                   upstream_task_ids = [load_cached_task],
+                                                   task_kwargs = {"publish_filters":list(publish_filters),
+                                                                  "group_id":group_id})
+        return (load_cached_task, sync_task)
 
     def _on_background_task_completed(self, task_id, search_id, result):
         """
         Runs in main thread
         """
+        if search_id in self._work_file_updates:
+            self._work_file_updates.remove(search_id)
+            self.work_files_updated.emit(search_id, result.get("files", []), result.get("environment"))
+            return
+
+        if search_id in self._batches:
+            self._on_batch_task_completed(task_id, self._batches[search_id], result)
+            return
+
         if search_id not in self._searches:
             return
         search = self._searches[search_id]
@@ -780,18 +1226,22 @@ class AsyncFileFinder(FileFinder):
             missing_templates = work_area.get_missing_templates()
             if missing_templates:
                 # Notify that no files were found so the UI can update
-                self.publishes_found.emit(search_id, [], work_area)
-                self.files_found.emit(search_id, [], work_area)
+                self.publishes_found.emit(search_id, [], work_area, True)
+                self.files_found.emit(search_id, [], work_area, True)
                 search.aborted = True
+                if search.batch:
+                    self._add_search_to_batch(search, None)
                 return
 
             # we have successfully constructed a work area that we can 
             # use for the next stage so begin searching for work files:
             self._begin_search_for_work_files(search, work_area)
-            # and also add a task to process cached publishes:
-            search.load_cached_pubs_task = self._bg_task_manager.add_pass_through_task(group = search.id,
-                                                                    priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
-                                                                    task_kwargs = {"environment":work_area})
+            if search.batch:
+                # the publishes are found for the whole batch:
+                self._add_search_to_batch(search, work_area)
+            else:
+                # and also find the publishes:
+                self._begin_search_for_publishes(search, work_area)
         elif task_id == search.resolve_work_area_task:
             search.resolve_work_area_task = None
             # found a work area so emit it:
@@ -799,40 +1249,122 @@ class AsyncFileFinder(FileFinder):
 
         elif task_id == search.load_cached_pubs_task:
             search.load_cached_pubs_task = None
-            # ok so now it's time to load the cached publishes:
-            sg_publishes = self._load_cached_publishes(search, work_area)
-            # begin stage 3 for the un-cached publishes:
-            self._begin_search_process_publishes(search, sg_publishes)
-            # we can also start the background refresh of the publishes model:
-            search.publish_model.refresh()
+            sg_publishes = (result.get("cached_publishes") or [None])[0]
+            if sg_publishes is not None:
+                # the publishes have been found before so process them straight away whilst
+                # any changes since then are found in the background:
+                search.publishes_loaded = True
+                self._begin_search_process_publishes(search, sg_publishes)
+
+        elif task_id == search.sync_publishes_task:
+            search.sync_publishes_task = None
+            search.publishes_synced = True
+            sg_publishes, publishes_changed = (result.get("synced_publishes") or [([], False)])[0]
+            if publishes_changed or not search.publishes_loaded:
+                # process the updated publishes:
+                self._begin_search_process_publishes(search, sg_publishes)
 
         elif task_id in search.find_publishes_tasks:
             search.find_publishes_tasks.remove(task_id)
-            # found publishes:
-            publish_item_args = result.get("publish_items", {}).values()
-            files = [FileItem(**kwargs) for kwargs in publish_item_args]
-            self.publishes_found.emit(search_id, files, work_area)
+            # found the last of the publishes:
+            self.publishes_found.emit(search_id, result.get("files", []), work_area, True)
+
+        elif task_id in search.publish_page_tasks:
+            search.publish_page_tasks.remove(task_id)
+            # show the publishes in this page whilst the rest are found:
+            self.publishes_found.emit(search_id, result.get("files", []), work_area, False)
+
+        elif task_id == search.load_indexed_work_files_task:
+            search.load_indexed_work_files_task = None
+            # show the work files from the index whilst the search continues.  These may be out of date
+            # so the final result only comes from the work files found on disk:
+            for user_id, files in result.get("indexed_files", {}).iteritems():
+                user_work_area = search.user_work_areas.get(user_id)
+                if not user_work_area:
+                    continue
+                self.indexed_files_found.emit(search_id, files, user_work_area)
 
         elif task_id in search.find_work_files_tasks:
             search.find_work_files_tasks.remove(task_id)
-            # found work files:
-            work_item_args = result.get("work_items", {}).values()
-            files = [FileItem(**kwargs) for kwargs in work_item_args]
-            self.files_found.emit(search_id, files, work_area)
+            # found the last of the work files:
+            self.files_found.emit(search_id, result.get("files", []), work_area, True)
+
+    def _on_file_chunk_found(self, search_id, files, work_area, is_publish, publish_pass):
+        """
+        Slot triggered when a background task has found a chunk of files for a search.  Runs in main thread.
+
+        :param search_id:       The id of the search the files were found for
+        :param files:           The list of FileItems that were found
+        :param work_area:       The work area the files were found in
+        :param is_publish:      True if the files are publishes, False if they are work files
+        :param publish_pass:    The publish pass the files were found in or None for work files
+        """
+        search = self._searches.get(search_id)
+        if not search:
+            # search has been stopped so ignore
+            return
+        if is_publish and publish_pass != search.publish_pass:
+            # the publishes have been processed again since these were found so ignore
+            return
+        if is_publish:
+            self.publishes_found.emit(search_id, files, work_area, False)
+        else:
+            self.files_found.emit(search_id, files, work_area, False)
+
+    def _on_publish_page_found(self, group_id, sg_publishes):
+        """
+        Slot triggered when a page of publishes has been found whilst finding all publishes for a search
+        or batch.  The page is processed straight away so that the files can be shown before all of the
+        publishes have been found.  Runs in main thread.
+
+        :param group_id:        The id of the search or batch the publishes were found for
+        :param sg_publishes:    The list of PublishRecords in the page
+        """
+        if group_id in self._batches:
+            batch = self._batches[group_id]
+            if batch.publishes_distributed:
+                # the publishes have already been processed from the cache:
+                return
+            publishes_by_task = self._split_publishes_by_task(sg_publishes)
+            for search_id, (task, _) in batch.tasks.iteritems():
+                search = self._searches.get(search_id)
+                task_publishes = publishes_by_task.get(task["id"])
+                if search and task_publishes:
+                    self._begin_search_process_publishes(search, task_publishes, is_page=True)
+            return
+
+        search = self._searches.get(group_id)
+        if search and not search.publishes_loaded and not search.publishes_synced:
+            self._begin_search_process_publishes(search, sg_publishes, is_page=True)
 
     def _on_background_task_failed(self, task_id, search_id, msg, stack_trace):
         """
         """
-        if search_id not in self._searches:
+        if search_id in self._work_file_updates:
+            # the work files will be found by the next full search instead:
+            self._work_file_updates.remove(search_id)
+            self._app.log_debug("Failed to update work files: %s" % msg)
             return
-        self.stop_search(search_id)
+
+        # if a task run for a whole batch failed then all searches in the batch have failed:
+        search_ids = [search_id]
+        if search_id in self._batches:
+            search_ids = list(self._batches[search_id].search_ids)
+            self._stop_batch(self._batches[search_id])
+
+        search_ids = [s_id for s_id in search_ids if s_id in self._searches]
+        if not search_ids:
+            return
+        for s_id in search_ids:
+            self.stop_search(s_id)
 
         app = sgtk.platform.current_bundle()
         app.log_error(msg)
         app.log_debug(stack_trace)
 
         # emit signal:
-        self.search_failed.emit(search_id, msg)
+        for s_id in search_ids:
+            self.search_failed.emit(s_id, msg)
 
     def _on_background_search_finished(self, search_id):
         """
@@ -846,13 +1378,16 @@ class AsyncFileFinder(FileFinder):
         # that the search has actually finished!
         if search.users and not search.aborted:
             if (search.find_publishes_tasks or search.find_work_files_tasks 
-                or search.load_cached_pubs_task or not search.publish_model_refreshed
+                or search.load_cached_pubs_task or search.sync_publishes_task
+                or not search.publishes_synced
                 ):
                 # we still have work outstanding!
                 return
 
         # ok, looks like the search is actually complete!
         self.stop_search(search_id)
+        self._app.log_debug("Template cache usage after search %s - %s"
+                            % (search_id, g_template_cache.format_stats()))
 
         # emit search completed signal:
         self.search_completed.emit(search_id)
@@ -865,19 +1400,31 @@ class AsyncFileFinder(FileFinder):
             return
 
         self._bg_task_manager.stop_task_group(search_id)
-        if search.publish_model:
-            search.publish_model.clear()
-            self._available_publish_models.append(search.publish_model)
         del self._searches[search_id]
 
+        batch = search.batch
+        if batch and batch.id in self._batches:
+            batch.search_ids.discard(search_id)
+            batch.pending_ids.discard(search_id)
+            batch.tasks.pop(search_id, None)
+            if not batch.search_ids:
+                self._stop_batch(batch)
+            else:
+                # the batch may have been waiting on this search:
+                self._check_batch_ready(batch)
+
     def stop_all_searches(self):
         """
         """
         for search in self._searches.values():
             self._bg_task_manager.stop_task_group(search.id)
-            if search.publish_model:
-                self._available_publish_models.append(search.publish_model)
         self._searches = {}
+        for batch_id in self._batches:
+            self._bg_task_manager.stop_task_group(batch_id)
+        self._batches = {}
+        for update_id in self._work_file_updates:
+            self._bg_task_manager.stop_task_group(update_id)
+        self._work_file_updates = set()
 
     ################################################################################################
     ################################################################################################
@@ -903,9 +1450,10 @@ class AsyncFileFinder(FileFinder):
             environment.resolve_user_sandboxes()
         return {"environment":environment}
 
-    def _load_cached_publishes(self, search, work_area):
+    def _get_publish_filters(self, work_area):
         """
-        Runs in main thread.
+        :param work_area:   The work area to find publishes for
+        :returns:           The Shotgun filters to find the publishes for the work area with
         """
         publish_filters = []
         # If there is no entity in the context then we are trying to load the publishes from the project.
@@ -914,11 +1462,52 @@ class AsyncFileFinder(FileFinder):
             publish_filters.append(["task", "is", work_area.context.task])
         elif work_area.context.step:
             publish_filters.append(["task.Task.step", "is", work_area.context.step])
-        fields = ["id", "description", "version_number", "image", "created_at", "created_by", "name", "path", "task"]
+        return publish_filters
+
+    def _task_load_cached_publishes(self, publish_filters, **kwargs):
+        """
+        Load the publishes from the last time each of the publish filters were synced.
+        """
+        return {"cached_publishes":[g_publish_fetcher.load_cached(filters) for filters in publish_filters]}
 
-        # load the data into the publish model:
-        search.publish_model.load_data(filters=publish_filters, fields=fields)
-        return copy.deepcopy(search.publish_model.get_sg_data())
+    def _task_sync_publishes(self, publish_filters, group_id=None, **kwargs):
+        """
+        Sync the publishes for each of the publish filters with Shotgun.  If all publishes have to be
+        found then each page is sent to the main thread as it's found.
+        """
+        page_found_cb = lambda sg_publishes: self._publish_page_found.emit(group_id, sg_publishes)
+        return {"synced_publishes":[g_publish_fetcher.sync(filters, page_found_cb) for filters in publish_filters]}
+
+    def _run_task_stages(self, stages, **kwargs):
+        """
+        Run a sequence of task stages within a single background task.  Each stage is passed the
+        results of the previous stages in the same way that the background task manager passes the
+        results of upstream tasks to a task.  Runs in a background thread.
+
+        :param stages:      The list of stage functions to run
+        :param **kwargs:    The arguments to pass to the first stage
+        :returns:           The result of the last stage or an empty dictionary if the search was
+                            stopped before all stages were run
+        """
+        search_id = kwargs.get("search_id")
+        result = {}
+        for stage in stages:
+            if search_id is not None and search_id not in self._searches:
+                # the search has been stopped so there's no point in continuing!
+                return {}
+            result = stage(**kwargs)
+            kwargs.update(result)
+        return result
+
+    def _task_find_and_process_work_files(self, **kwargs):
+        """
+        Find, filter and build the work items for a single user.  If the work files were already found
+        for all users by a sandbox scan then only the filter and build stages are run.
+        """
+        stages = [self._task_filter_work_files, self._task_process_work_items]
+        if "work_files_by_user" not in kwargs:
+            stages.insert(0, self._task_find_work_files)
+        return self._run_task_stages(stages, **kwargs)
 
     def _task_filter_publishes(self, sg_publishes, environment, **kwargs):
         """
@@ -927,22 +1516,32 @@ class AsyncFileFinder(FileFinder):
         filtered_publishes = []
         if sg_publishes and environment and environment.publish_template and environment.context:
 
-            # convert created_at unix time stamp to shotgun std time stamp for all publishes
+            # convert created_at unix time stamp to shotgun std time stamp for all publishes.  The
+            # publish records are shared so the converted time is set on a new record:
+            local_timezone = sg_timezone.LocalTimezone()
+            converted_publishes = []
             for sg_publish in sg_publishes:
                 created_at = sg_publish.get("created_at")
-                if created_at:
-                    created_at = datetime.fromtimestamp(created_at, sg_timezone.LocalTimezone())
-                    sg_publish["created_at"] = created_at
+                if isinstance(created_at, (int, float)):
+                    created_at = datetime.fromtimestamp(created_at, local_timezone)
+                    sg_publish = sg_publish.replace(created_at=created_at)
+                converted_publishes.append(sg_publish)
+            sg_publishes = converted_publishes
 
             filtered_publishes = self._filter_publishes(sg_publishes, 
                                                         environment.publish_template, 
                                                         environment.valid_file_extensions)
         return {"sg_publishes":filtered_publishes}    
 
-    def _task_process_publish_items(self, sg_publishes, environment, name_map, **kwargs):
+    def _task_process_publish_items(self, sg_publishes, environment, name_map, search_id=None, stream_files=True,
+                                    publish_pass=None, **kwargs):
         """
         """
         publish_items = {}
+        # pages of publishes are small enough that their files are just returned with the result:
+        stream = None
+        if stream_files:
+            stream = self._create_file_item_stream(search_id, environment, is_publish=True, publish_pass=publish_pass)
         if (sg_publishes and environment and environment.publish_template 
             and environment.work_template and environment.context and name_map):
             publish_items = self._process_publish_files(sg_publishes, 
@@ -950,46 +1549,180 @@ class AsyncFileFinder(FileFinder):
                                                       environment.work_template, 
                                                       environment.context,
                                                       name_map,
-                                                      environment.version_compare_ignore_fields)
-        return {"publish_items":publish_items, "environment":environment}
+                                                      environment.version_compare_ignore_fields,
+                                                      file_processed_cb=stream.add if stream else None)
+        if stream:
+            files = stream.take_remaining()
+        else:
+            files = [FileItem(**item_args) for item_args in publish_items.values()]
+        return {"publish_items":publish_items, "files":files, "environment":environment}
 
-    def _task_find_work_files(self, environment, **kwargs):
+    def _task_load_indexed_work_files(self, user_work_areas, **kwargs):
+        """
+        """
+        indexed_entries = {}
+        for user_id, work_area in user_work_areas.iteritems():
+            index_key = self._get_work_file_index_key(work_area)
+            if not index_key:
+                continue
+            entry = get_work_file_index().load(index_key)
+            if entry:
+                indexed_entries[user_id] = entry
+        # build the file items here rather than in the main thread:
+        indexed_files = dict((user_id, [FileItem(**item_args) for item_args in work_items.values()])
+                             for user_id, (work_items, _, _) in indexed_entries.iteritems())
+        return {"indexed_entries":indexed_entries, "indexed_files":indexed_files}
+
+    def _task_find_work_files(self, environment, user_id=None, indexed_entries=None, shared_scan=None, **kwargs):
         """
         """
         #time.sleep(5)
+        indexed_entry = (indexed_entries or {}).get(user_id)
+        if indexed_entry and not DirectoryWalker().has_changed(indexed_entry[1]):
+            # no files have been added or removed since the work files were indexed so the
+            # directories don't need to be walked again:
+            return {"work_files":indexed_entry[2].keys(), "dir_mtimes":indexed_entry[1]}
+
         work_files = []
+        dir_mtimes = {}
         if (environment and environment.context and environment.work_template):
             work_files = self._find_work_files(environment.context, 
                                                environment.work_template, 
-                                               environment.version_compare_ignore_fields)
-        return {"work_files":work_files}
+                                               environment.version_compare_ignore_fields,
+                                               dir_mtimes,
+                                               shared_scan=shared_scan)
+        return {"work_files":work_files, "dir_mtimes":dir_mtimes}
 
-
-    def _task_filter_work_files(self, work_files, environment, **kwargs):
+    def _task_scan_sandbox_work_files(self, user_work_areas, indexed_entries=None, **kwargs):
+        """
+        """
+        # if all users have work files in the index and none of the directories scanned to find
+        # them have changed then we can skip the scan completely:
+        indexed_entries = indexed_entries or {}
+        if all(user_id in indexed_entries for user_id in user_work_areas):
+            indexed_dirs = {}
+            for _, dir_mtimes, _ in indexed_entries.values():
+                indexed_dirs.update(dir_mtimes)
+            if not DirectoryWalker().has_changed(indexed_dirs):
+                work_files_by_user = dict((user_id, indexed_entries[user_id][2].keys()) for user_id in user_work_areas)
+                return {"work_files_by_user":work_files_by_user, "dir_mtimes":indexed_dirs}
+
+        scanner = SandboxScanner(FileFinder._listing_cache)
+        dir_mtimes = {}
+        work_files_by_user = scanner.find_work_files(user_work_areas, self._get_work_file_skip_fields, dir_mtimes)
+        return {"work_files_by_user":work_files_by_user, "dir_mtimes":dir_mtimes}
+
+    def _task_filter_work_files(self, environment, work_files=None, work_files_by_user=None, user_id=None, 
+                                dir_mtimes=None, **kwargs):
         """
         """
+        if work_files is None and work_files_by_user is not None:
+            # files were found for all users by a single sandbox scan:
+            work_files = work_files_by_user.get(user_id)
+
+        # note, the work files are always run through the filter_work_files hook, even when they
+        # came from the index, as the hook may return different results for the same files:
         filtered_work_files = []
         if work_files:
             filtered_work_files = self._filter_work_files(work_files, environment.valid_file_extensions)
-        return {"work_files":filtered_work_files}
+        return {"work_files":filtered_work_files, "work_file_paths":work_files or [], "dir_mtimes":dir_mtimes}
 
-    def _task_process_work_items(self, work_files, environment, name_map, **kwargs):
+    def _task_process_work_items(self, environment, name_map, work_files=None, work_file_paths=None, user_id=None,
+                                 dir_mtimes=None, indexed_entries=None, search_id=None, **kwargs):
         """
         """
+        # stat all of the files that were found so that the details of any that haven't changed since
+        # they were indexed can be re-used and so that their modification times can be indexed:
+        stat_results = DirectoryWalker().stat_paths(work_file_paths or [])
+        file_mtimes = dict((path, stat_result.st_mtime) for path, stat_result in stat_results.iteritems()
+                           if stat_result)
+        indexed_details = self._get_unchanged_indexed_details((indexed_entries or {}).get(user_id), file_mtimes)
+
         work_items = {}
+        stream = self._create_file_item_stream(search_id, environment, is_publish=False)
         if (work_files and environment and environment.work_template 
             and environment.context and name_map):
             work_items = self._process_work_files(work_files, 
                                                   environment.work_template, 
                                                   environment.context,
                                                   name_map,
-                                                  environment.version_compare_ignore_fields)
-        return {"work_items":work_items, "environment":environment}
-
+                                                  environment.version_compare_ignore_fields,
+                                                  file_processed_cb=stream.add,
+                                                  stat_results=stat_results,
+                                                  indexed_details=indexed_details)
 
+        # update the index so these files can be shown straight away next time:
+        if dir_mtimes is not None:
+            index_key = self._get_work_file_index_key(environment)
+            if index_key:
+                get_work_file_index().store(index_key, work_items, dir_mtimes, file_mtimes)
 
+        return {"work_items":work_items, "files":stream.take_remaining(), "environment":environment,
+                "user_id":user_id}
 
+    def _task_process_work_file_paths(self, environment, work_file_paths, **kwargs):
+        """
+        """
+        work_items = {}
+        if environment and environment.context and environment.work_template:
+            work_file_paths = self._match_work_file_paths(work_file_paths,
+                                                          environment.context,
+                                                          environment.work_template,
+                                                          environment.version_compare_ignore_fields)
+            if work_file_paths:
+                work_files = self._filter_work_files(work_file_paths, environment.valid_file_extensions)
+                work_items = self._process_work_files(work_files,
+                                                      environment.work_template,
+                                                      environment.context,
+                                                      FileFinder._shared_name_map,
+                                                      environment.version_compare_ignore_fields)
+        files = [FileItem(**item_args) for item_args in work_items.values()]
+        return {"work_items":work_items, "files":files, "environment":environment}
 
+    def _create_file_item_stream(self, search_id, work_area, is_publish, publish_pass=None):
+        """
+        Create a stream that emits the files processed by a background task back to the main
+        thread in chunks.
+
+        :param search_id:       The id of the search the files are being found for
+        :param work_area:       The work area the files are being found in
+        :param is_publish:      True if the files are publishes, False if they are work files
+        :param publish_pass:    The publish pass the publishes are being processed in
+        :returns:               An _FileItemStream instance
+        """
+        emit_chunk_fn = lambda files: self._file_chunk_found.emit(search_id, files, work_area, is_publish,
+                                                                  publish_pass)
+        return AsyncFileFinder._FileItemStream(emit_chunk_fn,
+                                               AsyncFileFinder.CHUNK_SIZE,
+                                               AsyncFileFinder.CHUNK_INTERVAL)
 
+    def _get_work_file_index_key(self, work_area):
+        """
+        """
+        if not work_area or not work_area.context or not work_area.work_template:
+            return None
+        try:
+            context_fields = g_template_cache.context_fields(work_area.context, work_area.work_template)
+        except TankError:
+            return None
+        return WorkFileIndex.make_key(work_area.work_template, context_fields, work_area.context.user,
+                                      work_area.valid_file_extensions, work_area.version_compare_ignore_fields)
 
+    def _get_unchanged_indexed_details(self, indexed_entry, file_mtimes):
+        """
+        Find the indexed details of all work files that haven't been modified since they were indexed.
 
+        :param indexed_entry:   The entry loaded from the work file index or None
+        :param file_mtimes:     A dictionary {path:mtime} of the current modification times of the files
+        :returns:               A dictionary {path:work details} for all files that haven't been modified
+        """
+        if not indexed_entry:
+            return {}
+        work_items, _, indexed_mtimes = indexed_entry
+        indexed_details = {}
+        for item_args in work_items.itervalues():
+            path = item_args["work_path"]
+            mtime = file_mtimes.get(path)
+            if mtime is not None and indexed_mtimes.get(path) == mtime:
+                indexed_details[path] = item_args["work_details"]
+        return indexed_details
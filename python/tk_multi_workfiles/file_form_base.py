@@ -33,6 +33,9 @@ from .file_item import FileItem
 from .work_area import WorkArea
 from .actions.new_task_action import NewTaskAction
 from .user_cache import g_user_cache
+from .template_cache import g_template_cache
+from .context_cache import g_context_cache
+from .publish_fetcher import g_publish_fetcher
 from .util import monitor_qobject_lifetime
 
 
@@ -247,6 +250,11 @@ class FileFormBase(QtGui.QWidget):
         app.log_debug("Synchronizing remote path cache...")
         app.sgtk.synchronize_filesystem_structure()
         app.log_debug("Path cache up to date!")
+        # contexts and the template fields resolved from them may have changed:
+        g_template_cache.clear()
+        g_context_cache.clear()
+        # as may the publish descriptions:
+        g_publish_fetcher.clear()
         self._refresh_all_async()
 
     def _refresh_all_async(self):
@@ -297,23 +305,22 @@ class FileFormBase(QtGui.QWidget):
 
         # figure out if it's a publish or a work file:
         is_publish = False
-        if work_area.work_template and work_area.work_template.validate(path):
+        if work_area.work_template and g_template_cache.validate(work_area.work_template, path):
             is_publish = False
-        elif work_area.publish_template and work_area.publish_template.validate(path):
+        elif work_area.publish_template and g_template_cache.validate(work_area.publish_template, path):
             is_publish = True
         else:
             # it's neither or we don't have a template that validates against it:
             return None
 
         # build fields dictionary and construct key:
-        fields = work_area.context.as_template_fields(work_area.work_template)
+        fields = g_template_cache.context_fields(work_area.context, work_area.work_template)
 
         base_template = work_area.publish_template if is_publish else work_area.work_template
-        template_fields = base_template.get_fields(path)
+        template_fields = g_template_cache.get_fields(base_template, path)
         fields = dict(chain(template_fields.iteritems(), fields.iteritems()))
 
-        file_key = FileItem.build_file_key(fields, work_area.work_template,
-                                           work_area.version_compare_ignore_fields)
+        file_key = work_area.get_file_key_builder().build_key(fields)
 
         # extract details from the fields:
         details = {}
@@ -13,13 +13,165 @@ import sgtk
 import os
 from datetime import datetime, timedelta
 import copy
+import threading
+import weakref
+
+from .publish_fetcher import g_publish_fetcher
+
+
+class FileKeyBuilder(object):
+    """
+    Builds the unique file keys used to determine if multiple files are just different versions of the
+    same file (see FileItem.build_file_key()).  The template keys to use, their defaults and the fields
+    to ignore are all resolved once when the builder is constructed rather than every time a key is built.
+    """
+
+    # fields that are always ignored when building a file key:
+    ALWAYS_IGNORED_FIELDS = frozenset(["version", "extension"])
+
+    # template:{ignore fields:FileKeyBuilder} - weakly keyed so builders are released along with
+    # the templates they were built for:
+    _builders = weakref.WeakKeyDictionary()
+    _builders_lock = threading.Lock()
+
+    @staticmethod
+    def get(template, ignore_fields=None):
+        """
+        Get the key builder for the specified template and ignore fields.  Builders are shared so this
+        is the preferred way to get a builder.
+
+        :param template:        The template that represents the files the keys will be used to compare
+        :param ignore_fields:   A list of fields to ignore when constructing the key
+        :returns:               A FileKeyBuilder instance
+        """
+        ignore_fields = FileKeyBuilder.ALWAYS_IGNORED_FIELDS.union(ignore_fields or [])
+        # note, WeakKeyDictionary isn't thread-safe so all access is done with the lock acquired:
+        with FileKeyBuilder._builders_lock:
+            template_builders = FileKeyBuilder._builders.get(template)
+            if template_builders is None:
+                template_builders = {}
+                FileKeyBuilder._builders[template] = template_builders
+            builder = template_builders.get(ignore_fields)
+            if not builder:
+                builder = FileKeyBuilder(template, ignore_fields)
+                template_builders[ignore_fields] = builder
+        return builder
+
+    def __init__(self, template, ignore_fields=None):
+        """
+        Construction
+
+        :param template:        The template that represents the files the keys will be used to compare
+        :param ignore_fields:   A list of fields to ignore when constructing the key.  'version' and
+                                'extension' are always ignored.
+        """
+        self._ignore_fields = FileKeyBuilder.ALWAYS_IGNORED_FIELDS.union(ignore_fields or [])
+
+        # the keys that contribute to the file key, in the order they appear in the key:
+        template_keys = template.keys
+        self._key_names = tuple(sorted([name for name in template_keys if name not in self._ignore_fields]))
+
+        # the default values for any keys that aren't specified in the fields:
+        self._defaults = dict([(key.name, key.default) for key in template_keys.values()
+                               if key.name not in self._ignore_fields and key.default != None])
+
+    @property
+    def ignore_fields(self):
+        """
+        :returns:   A frozenset of the fields ignored when building keys
+        """
+        return self._ignore_fields
+
+    def build_key(self, fields):
+        """
+        Build a unique file key from the specified fields.
+
+        :param fields:  A dictionary of fields extracted from a file path
+        :returns:       An immutable 'key' that can be used for comparison and as the key in a
+                        dictionary.  See FileItem.build_file_key() for details.
+        """
+        file_key = []
+        defaults = self._defaults
+        for name in self._key_names:
+            if name in fields:
+                file_key.append((name, fields[name]))
+            elif name in defaults:
+                file_key.append((name, defaults[name]))
+        return tuple(file_key)
+
+
+class FileKeyId(object):
+    """
+    Interned id for a unique file key.  Ids are compared and hashed by identity so they are much
+    cheaper to use than the keys they represent.
+    """
+    __slots__ = ("__weakref__",)
+
+
+class FileKeyTable(object):
+    """
+    Interns the unique file keys built by the FileKeyBuilder to FileKeyId instances.  Keys are hashed
+    once when a FileItem is constructed and from then on the id can be used instead of the key
+    wherever files are compared or looked up in a dictionary.  Equal keys always have the same id
+    so comparing ids gives the same result as comparing the keys.
+
+    The table only holds the ids weakly so entries are released once there are no longer any file
+    items (e.g. in the search cache or a file model) using them.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        # key:FileKeyId
+        self._ids = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def get_id(self, key):
+        """
+        Get the id for the specified key, adding the key to the table if needed.
+
+        :param key: The file key to get the id for
+        :returns:   The FileKeyId for the key
+        """
+        # note, WeakValueDictionary isn't thread-safe so all access is done with the lock acquired:
+        with self._lock:
+            key_id = self._ids.get(key)
+            if key_id is None:
+                key_id = FileKeyId()
+                self._ids[key] = key_id
+        return key_id
+
+    def find_id(self, key):
+        """
+        Find the id for the specified key without adding it to the table.
+
+        :param key: The file key to find the id for
+        :returns:   The FileKeyId for the key or None if there are no files with the key
+        """
+        with self._lock:
+            return self._ids.get(key)
+
+# single global instance of the file key table
+g_file_key_table = FileKeyTable()
+
 
 class FileItem(object):
     """
     Encapsulate details about a single version of a work file/publish.  Each instance represents
     a single 'version' but will contain details about both the work/local file and the publish
     for that file if available.
+
+    Many thousands of these can be alive at once so the class uses __slots__ and the fields that are
+    accessed most often (name, version, entity & task) are resolved once from the work and publish
+    details whenever they change rather than every time they are accessed.
     """
+    __slots__ = ("_key", "_key_id", "_is_local", "_path", "_details", "_is_published", "_publish_path",
+                 "_publish_details", "_name", "_version", "_entity", "_task", "_thumbnail_path",
+                 "_thumbnail_image", "_versions")
+
+    # shared empty dictionary used for missing details and versions - this must never be modified!
+    _EMPTY = {}
 
     @staticmethod
     def build_file_key(fields, template, ignore_fields = None):
@@ -52,41 +204,11 @@ class FileItem(object):
         :param ignore_fields:   A list of fields to ignore when constructing the key.
                                 Typically this will contain at least 'version' but it 
                                 may also contain other fields (e.g. user initials in
-                                the file name).
+                                the file name).  This list is not modified.
         :returns:               An immutable 'key' that can be used for comparison and
                                 as the key in a dictionary (e.g. a string).
         """
-        ignore_fields = ignore_fields or []
-        # always want to ignore 'version' and 'extension' if they are present in the fields
-        # dictionary
-        ignore_fields += ["version", "extension"]
-
-        # populate the file key from the fields passed in that are included in
-        # the template, skipping the ignore fields:
-        file_key = {}
-        template_keys = template.keys
-        for name, value in fields.iteritems():
-            if name in ignore_fields:
-                # skip fields that are explicitly ignored
-                continue
-
-            if name not in template_keys:
-                # skip fields that aren't included in the template
-                continue
-
-            file_key[name] = value
-
-        # add in any 'default' values from the template that aren't explicitely ignored
-        # or weren't specified in the input fields:
-        for key in template_keys.values():
-            if (key.name not in ignore_fields
-                and key.default != None
-                and key.name not in file_key):
-                file_key[key.name] = key.default 
-
-        # return an immutable representation of the sorted dictionary:
-        # e.g. (('sequence', 'Sequence01'), ('shot', 'shot_010'), ('name', 'foo'))
-        return tuple(sorted(file_key.iteritems()))
+        return FileKeyBuilder.get(template, ignore_fields).build_key(fields)
 
     def __init__(self, key, is_work_file=False, work_path=None, work_details=None, 
                  is_published=False, publish_path=None, publish_details=None):
@@ -102,19 +224,23 @@ class FileItem(object):
         :param publish_details: Dictionary containing additional information about this publish
         """
         self._key = key
+        self._key_id = g_file_key_table.get_id(key)
 
         self._is_local = is_work_file
         self._path = work_path
-        self._details = work_details or {}
+        self._details = work_details or FileItem._EMPTY
 
         self._is_published = is_published
         self._publish_path = publish_path
-        self._publish_details = publish_details or {}
+        # publish details are never modified so they are held by reference:
+        self._publish_details = publish_details or FileItem._EMPTY
 
         self._thumbnail_path = None
         self._thumbnail_image = None
 
-        self._versions = {}
+        self._versions = FileItem._EMPTY
+
+        self._resolve_fields()
 
     # ------------------------------------------------------------------------------------------
     # General properties
@@ -126,37 +252,43 @@ class FileItem(object):
         """
         return self._key
 
+    @property
+    def key_id(self):
+        """
+        :returns:   A FileKeyId that uniquely identifies the key of this file.  This is cheaper to
+                    compare and hash than the key itself so should be preferred when comparing files
+                    or using them in dictionaries.
+        """
+        return self._key_id
+
     @property
     def name(self):
         """
         :returns:   The name that identifies this file.  This is either the name specified in
                     the details dictionary or if not specified then the file base name
         """
-        n = self._details.get("name") or self._publish_details.get("name")
-        if not n and self._path:
-            n = os.path.basename(self._path)
-        return n
+        return self._name
 
     @property
     def version(self):
         """
         :returns:   The version number of this file
         """
-        return self._details.get("version") or self._publish_details.get("version", 0)
+        return self._version
 
     @property
     def entity(self):
         """
         :returns:   The Shotgun entity dictionary that this file is associated with
         """
-        return self._details.get("entity") or self._publish_details.get("entity")
+        return self._entity
 
     @property
     def task(self):
         """
         :returns:   The Shotgun task entity dictionary that this file is associated with
         """
-        return self._details.get("task") or self._publish_details.get("task")
+        return self._task
 
     #@property
     def _get_thumbnail_path(self):
@@ -203,7 +335,7 @@ class FileItem(object):
         :param value:   A dictionary of {version:FileItem} pairs that represent all other
                         versions of this file
         """
-        self._versions = value
+        self._versions = value if value is not None else FileItem._EMPTY
     versions=property(_get_versions, _set_versions)
 
     # ------------------------------------------------------------------------------------------
@@ -282,7 +414,36 @@ class FileItem(object):
         """
         :returns:   The Shotgun description of this published file
         """
-        return self._publish_details.get("publish_description")
+        if "publish_description" in self._publish_details:
+            return self._publish_details["publish_description"]
+        if not self.published_file_id:
+            return None
+
+        # the description wasn't found with the publish - this never queries Shotgun so the
+        # description will be None until it's been fetched by the publish fetcher:
+        return g_publish_fetcher.get_cached_description(self.published_file_id)[1]
+
+    @property
+    def publish_description_loaded(self):
+        """
+        :returns:   True if the description for this published file is available without
+                    having to query Shotgun, otherwise False
+        """
+        if "publish_description" in self._publish_details or not self.published_file_id:
+            return True
+        return g_publish_fetcher.get_cached_description(self.published_file_id)[0]
+
+    def get_unloaded_publish_description_ids(self):
+        """
+        Get the ids of the publishes for this file and all of its versions whose descriptions
+        haven't been loaded yet.  Descriptions for all versions of a file are loaded together as
+        they are typically needed together.
+
+        :returns:   A list of published file ids
+        """
+        file_items = [self] + (self.versions or {}).values()
+        return list(set([f.published_file_id for f in file_items
+                         if f.is_published and not f.publish_description_loaded]))
 
     @property
     def published_at(self):
@@ -301,6 +462,18 @@ class FileItem(object):
     # ------------------------------------------------------------------------------------------
     # Public methods
 
+    def copy(self):
+        """
+        Create a copy of this file item.  The details are replaced rather than modified whenever an
+        item is updated so they are shared with the copy.
+
+        :returns:   A new FileItem instance
+        """
+        file_item = FileItem.__new__(FileItem)
+        for attr in FileItem.__slots__:
+            setattr(file_item, attr, getattr(self, attr))
+        return file_item
+
     def update_from_publish(self, publish):
         """
         Update this instance with details from the specified publish FileItem
@@ -310,7 +483,9 @@ class FileItem(object):
         """
         self._is_published = publish._is_published
         self._publish_path = publish._publish_path
-        self._publish_details = copy.deepcopy(publish._publish_details or {})
+        # publish details are never modified once the item has been constructed so they can be shared:
+        self._publish_details = publish._publish_details or FileItem._EMPTY
+        self._resolve_fields()
 
     def update_from_work_file(self, work_file):
         """
@@ -321,7 +496,8 @@ class FileItem(object):
         """
         self._is_local = work_file._is_local
         self._path = work_file._path
-        self._details = copy.deepcopy(work_file._details or {})
+        self._details = copy.deepcopy(work_file._details) if work_file._details else FileItem._EMPTY
+        self._resolve_fields()
 
     def set_not_work_file(self):
         """
@@ -396,6 +572,8 @@ class FileItem(object):
         """
         if self.publish_description:
             return ("%s" % self.publish_description)
+        elif not self.publish_description_loaded:
+            return "<i>Loading description...</i>"
         else:
             return "<i>No description was entered for this publish</i>"
 
@@ -495,7 +673,7 @@ class FileItem(object):
                 return self.compare_with_publish(other)
 
         # see if the files are the same key:
-        if self.key == other.key:
+        if self._key_id == other._key_id:
             # see if we can get away with just comparing versions:
             if self.version > other.version:
                 return 1
@@ -542,7 +720,7 @@ class FileItem(object):
             return -1
 
         # if the two files have identical keys then start by comparing versions:
-        if self.key == published_file.key:
+        if self._key_id == published_file._key_id:
             if self.path == published_file.publish_path:
                 # they are the same file!
                 return 0
@@ -577,6 +755,22 @@ class FileItem(object):
     # ------------------------------------------------------------------------------------------
     # Protected methods
 
+    def _resolve_fields(self):
+        """
+        Resolve the fields that can come from either the work or the publish details, favouring
+        the work details.  This must be called whenever either set of details changes.
+        """
+        details = self._details
+        publish_details = self._publish_details
+
+        name = details.get("name") or publish_details.get("name")
+        if not name and self._path:
+            name = os.path.basename(self._path)
+        self._name = name
+        self._version = details.get("version") or publish_details.get("version", 0)
+        self._entity = details.get("entity") or publish_details.get("entity")
+        self._task = details.get("task") or publish_details.get("task")
+
     def __repr__(self):
         """
         :returns:   A string representation of this instance - useful for debugging
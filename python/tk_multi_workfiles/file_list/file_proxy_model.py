@@ -182,7 +182,7 @@ class FileProxyModel(HierarchicalFilteringProxyModel):
         elif not right_item:
             return True
 
-        if left_item.key != right_item.key:
+        if left_item.key_id != right_item.key_id:
             # items represent different files but we want to group all file versions together. 
             # Therefore, we find the maximum version for each file and compare those instead.
             if left_item.versions and right_item.versions:
@@ -8,6 +8,7 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import os
 import weakref
 
 import sgtk
@@ -15,7 +16,11 @@ from sgtk.platform.qt import QtGui, QtCore
 
 from .file_finder import AsyncFileFinder
 from .user_cache import g_user_cache
-from .file_search_cache import FileSearchCache
+from .file_search_cache import get_file_search_cache
+from .file_item import g_file_key_table
+from .publish_fetcher import g_publish_fetcher
+from .file_watcher import FileWatcher
+from .file_scanner import get_static_directories
 
 shotgun_data = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_data")
 ShotgunDataRetriever = shotgun_data.ShotgunDataRetriever
@@ -153,6 +158,16 @@ class FileModel(QtGui.QStandardItemModel):
                 return self._file_item
             elif role == FileModel.WORK_AREA_ROLE:
                 return self._work_area
+            elif role == QtCore.Qt.ToolTipRole:
+                # the tooltip is only built when it's needed.  Any publish descriptions that
+                # haven't been loaded yet are fetched in the background and the item is updated
+                # once they arrive:
+                if not self._file_item:
+                    return ""
+                model = self.model()
+                if model:
+                    model._load_publish_descriptions(self._file_item)
+                return self._file_item.format_tooltip()
             else:
                 # just return the default implementation:
                 return FileModel._BaseModelItem.data(self, role)
@@ -216,6 +231,7 @@ class FileModel(QtGui.QStandardItemModel):
             self._search_msg = ""
             self._key = key
             self._work_area = work_area
+            self._watch_directories = None
 
         @property
         def key(self):
@@ -238,11 +254,35 @@ class FileModel(QtGui.QStandardItemModel):
 
             :param work_area:   The WorkArea to associate with this item
             """
+            if work_area is not self._work_area:
+                self._watch_directories = None
             self._work_area = work_area
             self.emitDataChanged()
 
         work_area = property(_get_work_area, _set_work_area)
 
+        @property
+        def watch_directories(self):
+            """
+            :returns:   A set of the root directories of the work and publish areas for the work area
+                        associated with this item.
+            """
+            if self._watch_directories is None:
+                self._watch_directories = set()
+                work_area = self._work_area
+                if work_area and work_area.context:
+                    ignore_fields = list(work_area.version_compare_ignore_fields or []) + ["version"]
+                    for template in [work_area.work_template, work_area.publish_template]:
+                        if not template:
+                            continue
+                        try:
+                            fields = work_area.context.as_template_fields(template)
+                            self._watch_directories.update(get_static_directories(template, fields,
+                                                                                  ignore_fields))
+                        except sgtk.TankError:
+                            pass
+            return self._watch_directories
+
         def set_search_status(self, status, msg=None):
             """
             Set the search status for this item and emit a dataChanged signal to indicate it's changed.
@@ -285,8 +325,7 @@ class FileModel(QtGui.QStandardItemModel):
                 self._search_msg = value
                 self.emitDataChanged()
             elif role == FileModel.WORK_AREA_ROLE:
-                self._work_area = value
-                self.emitDataChanged()
+                self.work_area = value
             else:
                 # call the base implementation:
                 FileModel._BaseModelItem.setData(self, value, role)
@@ -307,7 +346,7 @@ class FileModel(QtGui.QStandardItemModel):
         self._app = sgtk.platform.current_bundle()
         self._published_file_type = sgtk.util.get_published_file_entity_type(self._app.sgtk)
 
-        # sg data retriever is used to download thumbnails in the background
+        # sg data retriever is used to download thumbnails and fetch publish descriptions in the background
         self._sg_data_retriever = ShotgunDataRetriever(bg_task_manager=bg_task_manager)
         self._sg_data_retriever.work_completed.connect(self._on_data_retriever_work_completed)
         self._sg_data_retriever.work_failure.connect(self._on_data_retriever_work_failed)
@@ -318,21 +357,49 @@ class FileModel(QtGui.QStandardItemModel):
         self._current_users = [g_user_cache.current_user]
 
         self._in_progress_searches = {}
-        self._search_cache = FileSearchCache()
+        # the search cache is shared by all file models so that the files found the last time
+        # can be shown straight away whilst they are searched for again:
+        self._search_cache = get_file_search_cache()
 
-        # self._current_item_map[search_id][file.key][file.version] = model._FileModelItem
+        # self._current_item_map[search_id][file.key_id][file.version] = model._FileModelItem
         self._current_item_map = {}
-        # self._pending_thumbnail_requests[request_id] = (group_key, file_key, file_version)
+        # self._pending_thumbnail_requests[request_id] = (group_key, file_key_id, file_version)
         self._pending_thumbnail_requests = {}
+        # self._pending_description_requests[request_id] = (publish_ids, file_key_id)
+        self._pending_description_requests = {}
+        # self._pending_description_ids = set(publish ids being fetched)
+        self._pending_description_ids = set()
+        # self._pending_file_updates[update_id] = group_key
+        self._pending_file_updates = {}
+        # self._streamed_file_versions[(search_id, group_key, have_local)] = set((file_key_id, file_version))
+        self._streamed_file_versions = {}
 
         # we'll need a file finder to be able to find files:
         self._finder = AsyncFileFinder(bg_task_manager, self)
         self._finder.files_found.connect(self._on_finder_files_found)
+        self._finder.indexed_files_found.connect(self._on_finder_indexed_files_found)
         self._finder.publishes_found.connect(self._on_finder_publishes_found)
+        self._finder.publishes_restarted.connect(self._on_finder_publishes_restarted)
         self._finder.search_completed.connect(self._on_finder_search_completed)
         self._finder.search_failed.connect(self._on_finder_search_failed)
         self._finder.work_area_resolved.connect(self._on_finder_work_area_resolved)
         self._finder.work_area_found.connect(self._on_finder_work_area_found)
+        self._finder.work_files_updated.connect(self._on_finder_work_files_updated)
+
+        # watch the files on disk so that the model can be kept up-to-date without
+        # having to search again:
+        self._watcher = None
+        if self._app.get_setting("watch_file_system", True):
+            watcher = FileWatcher(self._app.get_setting("poll_file_system", False), self)
+            if watcher.is_watching:
+                self._watcher = watcher
+            else:
+                self._app.log_debug("File system changes won't be watched as inotify isn't available "
+                                    "and polling is disabled")
+                watcher.shut_down()
+        if self._watcher:
+            self._watcher.files_changed.connect(self._on_watched_files_changed)
+            self._watcher.changes_lost.connect(self.async_refresh)
 
     def destroy(self):
         """
@@ -342,24 +409,34 @@ class FileModel(QtGui.QStandardItemModel):
         # clear the model:
         self.clear()
 
+        # stop watching files:
+        if self._watcher:
+            self._watcher.files_changed.disconnect(self._on_watched_files_changed)
+            self._watcher.changes_lost.disconnect(self.async_refresh)
+            self._watcher.shut_down()
+            self._watcher = None
+
         # stop the data retriever:
         if self._sg_data_retriever:
             self._sg_data_retriever.stop()
             self._sg_data_retriever.deleteLater()
             self._sg_data_retriever = None
 
-        # clean up the cache:
+        # release the cache - the cached files are kept for the next model:
         if self._search_cache:
-            self._search_cache.clear()
+            self._search_cache.set_pinned(self, [])
             self._search_cache = None
 
         # disconnect and clean up the file finder:
         if self._finder:
             self._finder.files_found.disconnect(self._on_finder_files_found)
+            self._finder.indexed_files_found.disconnect(self._on_finder_indexed_files_found)
             self._finder.publishes_found.disconnect(self._on_finder_publishes_found)
+            self._finder.publishes_restarted.disconnect(self._on_finder_publishes_restarted)
             self._finder.search_completed.disconnect(self._on_finder_search_completed)
             self._finder.search_failed.disconnect(self._on_finder_search_failed)
             self._finder.work_area_resolved.disconnect(self._on_finder_work_area_resolved)
+            self._finder.work_files_updated.disconnect(self._on_finder_work_files_updated)
             self._finder.shut_down()
             self._finder = None
 
@@ -374,9 +451,13 @@ class FileModel(QtGui.QStandardItemModel):
         :param clean_only:  If true then the cached file versions will only be returned if the cache is
                             up-to-date.  If false then file versions will be returned even if the model is still
                             searching for files.
-        :returns:           A dictionary {version:FileItem} of all file versions found.
+        :returns:           A dictionary {version:FileItem} of all file versions found.  The dictionary
+                            and file items are shared by the search cache so must not be modified.
         """
-        return self._search_cache.find_file_versions(work_area, key, clean_only)
+        # note, if there are no files with this key then the key id will be None and no
+        # file versions will be found:
+        key_id = g_file_key_table.find_id(key)
+        return self._search_cache.find_file_versions(work_area, key_id, clean_only)
 
     def items_from_file(self, file_item, ignore_version=False):
         """
@@ -389,7 +470,7 @@ class FileModel(QtGui.QStandardItemModel):
         """
         if not file_item:
             return []
-        return self._find_current_items(None, file_item.key, file_item.version if not ignore_version else None)
+        return self._find_current_items(None, file_item.key_id, file_item.version if not ignore_version else None)
 
     # Interface for modifying the entities in the model:
     def set_entity_searches(self, searches):
@@ -568,27 +649,64 @@ class FileModel(QtGui.QStandardItemModel):
         for group_item in self._group_items():
             group_map[group_item.key] = group_item
 
+        # searches for sibling tasks (e.g. all the tasks of a selected Asset) are started as a single
+        # batch so that their publishes can be found with a single query:
+        task_searches = [search for search in self._current_searches
+                         if search.entity and search.entity.get("type") == "Task"]
+        if len(task_searches) < 2:
+            task_searches = []
+
         for search in self._current_searches:
-            if not search.entity:
-                continue
+            if search not in task_searches:
+                self._start_search(search, group_map)
 
-            # update all existing group items for this entity and all users to indicate
-            # that we are searching for files
-            entity_key = self._gen_entity_key(search.entity)
-            for user in self._current_users:
-                user_key = self._gen_entity_key(user)
-                group_key = (entity_key, user_key)
-                group_item = group_map.get(group_key)
-                if group_item:
-                    group_item.set_search_status(FileModel.SEARCHING)
+        if task_searches:
+            for search in task_searches:
+                self._prepare_search(search, group_map)
+            search_ids = self._finder.begin_batch_search([search.entity for search in task_searches],
+                                                         self._current_users)
+            for search_id, search in zip(search_ids, task_searches):
+                self._in_progress_searches[search_id] = search
+            self._app.log_debug("File Model: Started batch of %d searches %s..." % (len(search_ids), search_ids))
 
-                # and dirty the search cache:
-                self._search_cache.set_dirty(search.entity, user)
+    def _start_search(self, search, group_map):
+        """
+        Start a search for all users that should be presented in the model for a single entity.
 
-            # actually start the search:
-            search_id = self._finder.begin_search(search.entity, self._current_users)
-            self._in_progress_searches[search_id] = search
-            self._app.log_debug("File Model: Started search %d..." % search_id)
+        :param search:      The SearchDetails instance to start the search for
+        :param group_map:   A dictionary {group key:_GroupModelItem} of the current groups in the model
+        """
+        if not search.entity:
+            return
+
+        self._prepare_search(search, group_map)
+
+        # actually start the search:
+        search_id = self._finder.begin_search(search.entity, self._current_users)
+        self._in_progress_searches[search_id] = search
+        self._app.log_debug("File Model: Started search %d..." % search_id)
+
+    def _prepare_search(self, search, group_map):
+        """
+        Update the model for a search that is about to start for all users that should be presented
+        in the model for a single entity.
+
+        :param search:      The SearchDetails instance that is about to start
+        :param group_map:   A dictionary {group key:_GroupModelItem} of the current groups in the model
+        """
+
+        # update all existing group items for this entity and all users to indicate
+        # that we are searching for files
+        entity_key = self._gen_entity_key(search.entity)
+        for user in self._current_users:
+            user_key = self._gen_entity_key(user)
+            group_key = (entity_key, user_key)
+            group_item = group_map.get(group_key)
+            if group_item:
+                group_item.set_search_status(FileModel.SEARCHING)
+
+            # and dirty the search cache:
+            self._search_cache.set_dirty(search.entity, user)
 
     def _stop_in_progress_searches(self):
         """
@@ -604,6 +722,10 @@ class FileModel(QtGui.QStandardItemModel):
             self._sg_data_retriever.stop_work(request_id)
         self._pending_thumbnail_requests = {}
 
+        # as can any incremental file updates as the files will be found by the new search:
+        self._pending_file_updates = {}
+        self._streamed_file_versions = {}
+
     def _update_groups(self):
         """
         Update groups in the model.  Remove any that are no longer needed and insert any that are
@@ -660,9 +782,10 @@ class FileModel(QtGui.QStandardItemModel):
                             self.insertRow(previous_valid_row + 1, group_item)
 
                             if cached_result:
-                                # we have a cached result so populate the group:
+                                # we have a cached result so populate the group.  The cached files are
+                                # shared so the model works with its own copies of them:
                                 files, work_area = cached_result
-                                self._process_files(files, work_area, group_item)
+                                self._process_files([f.copy() for f in files], work_area, group_item)
                                 group_item.work_area = work_area
 
                     if group_item:
@@ -680,9 +803,16 @@ class FileModel(QtGui.QStandardItemModel):
             if group_key not in valid_group_keys:
                 self._safe_remove_row(group_item.row())
 
+        # make sure the cached files for the current searches aren't evicted from the search cache:
+        self._search_cache.set_pinned(self, [(search.entity, user) for search in self._current_searches
+                                             if search.entity for user in self._current_users])
+
         # and clean up the file-to-item map:
         self._cleanup_current_item_map()
 
+        # only watch the directories for the groups that are still in the model:
+        self._update_watched_directories()
+
     def _update_group_child_entity_items(self, parent_item, child_details):
         """
         Update the non-file child entity items for a group item.  This adds/removes rows accordingly
@@ -733,7 +863,8 @@ class FileModel(QtGui.QStandardItemModel):
                 new_rows.append(folder_item)
             parent_item.appendRows(new_rows)
 
-    def _process_files(self, files, work_area, group_item, have_local=True, have_publishes=True):
+    def _process_files(self, files, work_area, group_item, have_local=True, have_publishes=True, prune=True,
+                       found_file_versions=None):
         """
         Update the file items under the specified parent.  This adds/removes/updates file model items
         as needed effectively performing an in-place refresh.  This avoids having to do a complete
@@ -751,6 +882,10 @@ class FileModel(QtGui.QStandardItemModel):
         :param group_item:      The _GroupModelItem the files should be updated for
         :param have_local:      True if the files list contains details about work files, false otherwise
         :param have_publishes:  True if the files list contains details about publishes, false otherwise
+        :param prune:           If False then the files are only a partial result and no existing items will
+                                be removed or updated to indicate they are no longer local/published
+        :param found_file_versions: A set of (file key, version) for files that were processed earlier as partial
+                                results and should be kept along with the files in the files list
         """
         if not have_local and not have_publishes:
             # nothing to do then!
@@ -763,7 +898,7 @@ class FileModel(QtGui.QStandardItemModel):
 
         for model_item in self._file_items(group_item):
             file_item = model_item.file_item
-            file_version_key = (file_item.key, file_item.version)
+            file_version_key = (file_item.key_id, file_item.version)
             existing_file_item_map[file_version_key] = (file_item, model_item)
             if file_item.is_local:
                 prev_local_file_versions.add(file_version_key)
@@ -772,20 +907,28 @@ class FileModel(QtGui.QStandardItemModel):
 
         # build a list of existing files that we should keep in the model:
         file_versions_to_keep = set()
-        if have_local and not have_publishes:
+        if not prune:
+            # keep everything that's already in the model:
+            file_versions_to_keep = set(existing_file_item_map.keys())
+        elif have_local and not have_publishes:
             # keep all publishes that aren't local
             file_versions_to_keep = prev_publish_file_versions
         elif not have_local and have_publishes:
             # keep all local that aren't publishes
             file_versions_to_keep = prev_local_file_versions
+        if found_file_versions:
+            file_versions_to_keep = file_versions_to_keep | found_file_versions
         valid_files = dict([(k, v[0]) for k, v in existing_file_item_map.iteritems() if k in file_versions_to_keep])
 
         # match files against existing items:
         files_to_add = []
         for file_item in files:
-            file_version_key = (file_item.key, file_item.version)
+            file_version_key = (file_item.key_id, file_item.version)
             current_file, model_item = existing_file_item_map.get(file_version_key, (None, None))
-            if current_file and model_item:
+            if current_file is file_item:
+                # file is already in the model and doesn't need updating
+                pass
+            elif current_file and model_item:
                 # update the existing file:
                 if file_item.is_published:
                     current_file.update_from_publish(file_item)
@@ -801,14 +944,7 @@ class FileModel(QtGui.QStandardItemModel):
 
             # if this is from a published file then we want to retrieve the thumbnail
             # if one is available:
-            if file_item.is_published and file_item.thumbnail_path and not file_item.thumbnail:
-                # request the thumbnail using the data retriever:
-                request_id = self._sg_data_retriever.request_thumbnail(file_item.thumbnail_path,
-                                                                       self._published_file_type,
-                                                                       file_item.published_file_id,
-                                                                       "image",
-                                                                       load_image=True)
-                self._pending_thumbnail_requests[request_id] = (group_item.key, file_item.key, file_item.version)
+            self._request_thumbnail(file_item, group_item)
 
         # figure out if any existing items are no longer needed:
         valid_file_versions = set(valid_files.keys())
@@ -853,6 +989,60 @@ class FileModel(QtGui.QStandardItemModel):
         # and clean up the file-to-item map:
         self._cleanup_current_item_map()
 
+    def _process_partial_files(self, files, work_area, group_item):
+        """
+        Add or update the file items for a partial result found before the final results of a search.  Unlike
+        _process_files() this only touches the items for the files in the list so the cost doesn't grow with
+        the number of files already in the group.  Nothing is removed and neither the search cache nor the
+        versions of the files in the group are updated - that is done once the final results are processed.
+
+        :param files:       A list of FileItem instances representing the files to process
+        :param work_area:   A WorkArea instance representing the work area the files were found in
+        :param group_item:  The _GroupModelItem the files should be updated for
+        """
+        new_items = []
+        for file_item in files:
+            model_items = self._find_current_items(group_item.key, file_item.key_id, file_item.version)
+            model_item = model_items[0] if model_items else None
+            current_file = model_item.file_item if model_item else None
+            if current_file is file_item:
+                # file is already in the model and doesn't need updating
+                pass
+            elif current_file:
+                # update the existing file:
+                if file_item.is_published:
+                    current_file.update_from_publish(file_item)
+                if file_item.is_local:
+                    current_file.update_from_work_file(file_item)
+                file_item = current_file
+                model_item.emitDataChanged()
+            else:
+                # file not in model yet so add it:
+                model_item = FileModel._FileModelItem(file_item, work_area)
+                new_items.append(model_item)
+                self._track_current_file_item(model_item, group_item)
+
+            self._request_thumbnail(file_item, group_item)
+
+        if new_items:
+            group_item.appendRows(new_items)
+
+    def _request_thumbnail(self, file_item, group_item):
+        """
+        Request the thumbnail for a published file using the data retriever if it has one that
+        hasn't been loaded yet.
+
+        :param file_item:   The FileItem to request the thumbnail for
+        :param group_item:  The _GroupModelItem the file is in
+        """
+        if file_item.is_published and file_item.thumbnail_path and not file_item.thumbnail:
+            request_id = self._sg_data_retriever.request_thumbnail(file_item.thumbnail_path,
+                                                                   self._published_file_type,
+                                                                   file_item.published_file_id,
+                                                                   "image",
+                                                                   load_image=True)
+            self._pending_thumbnail_requests[request_id] = (group_item.key, file_item.key_id, file_item.version)
+
     def _track_current_file_item(self, file_model_item, group_model_item):
         """
         Track a current _FileModelItem so that it can be found easily later
@@ -863,9 +1053,9 @@ class FileModel(QtGui.QStandardItemModel):
         """
         file_item = file_model_item.file_item
 
-        # self._current_item_map[group_key][file_key][file_version] = weakref.ref(_FileModelItem)
+        # self._current_item_map[group_key][file_key_id][file_version] = weakref.ref(_FileModelItem)
         file_map = self._current_item_map.setdefault(group_model_item.key, {})
-        version_map = file_map.setdefault(file_item.key, {})
+        version_map = file_map.setdefault(file_item.key_id, {})
         version_map[file_item.version] = weakref.ref(file_model_item)
 
     def _find_version_items(self, version_map, file_version):
@@ -891,20 +1081,20 @@ class FileModel(QtGui.QStandardItemModel):
                     found_items.append(item)
         return found_items
 
-    def _find_file_items(self, file_map, file_key, file_version):
+    def _find_file_items(self, file_map, file_key_id, file_version):
         """
-        Find current model items for the specified file key and version in the specified map.  If file key
-        is None then all items that match the version are returned.
+        Find current model items for the specified file key id and version in the specified map.  If file key
+        id is None then all items that match the version are returned.
 
-        :param file_map:        A dictionary mapping file key to a dictionary of {file version:_FileModelItem}s
-        :param file_key:        The file key to find all matching items for
+        :param file_map:        A dictionary mapping file key id to a dictionary of {file version:_FileModelItem}s
+        :param file_key_id:     The file key id to find all matching items for
         :param file_version:    The file version to find all matching items for
         :returns:               A list of _FileModelItems that were found that match the specified file key and
                                 version
         """
         found_items = []
-        if file_key is not None:
-            version_map = file_map.get(file_key)
+        if file_key_id is not None:
+            version_map = file_map.get(file_key_id)
             if version_map:
                 found_items.extend(self._find_version_items(version_map, file_version))
         else:
@@ -912,13 +1102,13 @@ class FileModel(QtGui.QStandardItemModel):
                 found_items.extend(self._find_version_items(version_map, file_version))
         return found_items
 
-    def _find_current_items(self, group_key, file_key, file_version):
+    def _find_current_items(self, group_key, file_key_id, file_version):
         """
-        Find current model items for the specified group key, file key and file version.  If group key
-        is None then all items that match the file key and version are returned.
+        Find current model items for the specified group key, file key id and file version.  If group key
+        is None then all items that match the file key id and version are returned.
 
         :param group_key:       The group key to find all matching items for
-        :param file_key:        The file key to find all matching items for
+        :param file_key_id:     The file key id to find all matching items for
         :param file_version:    The file version to find all matching items for
         :returns:               A list of _FileModelItems that were found that match the specified group key,
                                 file key and file version
@@ -927,10 +1117,10 @@ class FileModel(QtGui.QStandardItemModel):
         if group_key is not None:
             file_map = self._current_item_map.get(group_key)
             if file_map:
-                found_items.extend(self._find_file_items(file_map, file_key, file_version))
+                found_items.extend(self._find_file_items(file_map, file_key_id, file_version))
         else:
             for file_map in self._current_item_map.values():
-                found_items.extend(self._find_file_items(file_map, file_key, file_version))
+                found_items.extend(self._find_file_items(file_map, file_key_id, file_version))
         return found_items
 
     def _cleanup_current_item_map(self):
@@ -941,13 +1131,13 @@ class FileModel(QtGui.QStandardItemModel):
         new_item_map = {}
         for group_key, file_map in self._current_item_map.iteritems():
             new_file_map = {}
-            for file_key, version_map in file_map.iteritems():
+            for file_key_id, version_map in file_map.iteritems():
                 new_version_map = {}
                 for version, item_ref in version_map.iteritems():
                     if item_ref and item_ref():
                         new_version_map[version] = item_ref
                 if new_version_map:
-                    new_file_map[file_key] = new_version_map
+                    new_file_map[file_key_id] = new_version_map
             if new_file_map:
                 new_item_map[group_key] = new_file_map
         self._current_item_map = new_item_map
@@ -987,42 +1177,83 @@ class FileModel(QtGui.QStandardItemModel):
         if users:
             self.sandbox_users_found.emit(users)
 
-    def _on_finder_files_found(self, search_id, file_list, work_area):
+    def _on_finder_files_found(self, search_id, file_list, work_area, is_final):
         """
         Slot triggered when the finder has found some work files for a search.
 
         :param search_id:    The id of the search that the work files were found for
         :param file_list:    The list of FileItems that were found
         :param work_area:    The work area that the files were found in
+        :param is_final:     True if these are the last of the work files found, False if more will follow
         """
-        self._app.log_debug("File Model: Found %d files for search %s, user '%s'"
+        self._app.log_debug("File Model: Found %d files for search %s, user '%s'%s"
+                            % (len(file_list), search_id,
+                               work_area.context.user["name"] if work_area.context.user else "Unknown",
+                               "" if is_final else " (partial)"))
+        self._process_found_files(search_id, file_list, work_area, have_local=True, have_publishes=False,
+                                  is_final=is_final)
+
+    def _on_finder_indexed_files_found(self, search_id, file_list, work_area):
+        """
+        Slot triggered when the finder has loaded the work files stored in the index for a search.  These
+        are shown as a partial result but, as they may be out of date, they aren't kept when the final
+        work files are processed unless they were found again.
+
+        :param search_id:    The id of the search that the work files were found for
+        :param file_list:    The list of FileItems that were loaded from the index
+        :param work_area:    The work area that the files were found in
+        """
+        self._app.log_debug("File Model: Loaded %d indexed files for search %s, user '%s'"
                             % (len(file_list), search_id,
                                work_area.context.user["name"] if work_area.context.user else "Unknown"))
-        self._process_found_files(search_id, file_list, work_area, have_local=True, have_publishes=False)
+        self._process_found_files(search_id, file_list, work_area, have_local=True, have_publishes=False,
+                                  is_final=False, keep_found=False)
 
-    def _on_finder_publishes_found(self, search_id, file_list, work_area):
+    def _on_finder_publishes_found(self, search_id, file_list, work_area, is_final):
         """
         Slot triggered when the finder has found some publishes for a search
 
         :param search_id:    The id of the search that the publishes were found for
         :param file_list:    The list of FileItems that were found
         :param work_area:    The work area that the publishes were found in
+        :param is_final:     True if these are the last of the publishes found, False if more will follow
         """
-        self._app.log_debug("File Model: Found %d publishes for search %s, user '%s'"
+        self._app.log_debug("File Model: Found %d publishes for search %s, user '%s'%s"
                             % (len(file_list), search_id,
-                               work_area.context.user["name"] if work_area.context.user else "Unknown"))
-        self._process_found_files(search_id, file_list, work_area, have_local=False, have_publishes=True)
+                               work_area.context.user["name"] if work_area.context.user else "Unknown",
+                               "" if is_final else " (partial)"))
+        self._process_found_files(search_id, file_list, work_area, have_local=False, have_publishes=True,
+                                  is_final=is_final)
 
-    def _process_found_files(self, search_id, file_list, work_area, have_local, have_publishes):
+    def _on_finder_publishes_restarted(self, search_id):
+        """
+        Slot triggered when the finder starts processing the publishes for a search again, e.g. because
+        they changed since the cached publishes were processed.  Any publishes streamed from the earlier
+        pass are forgotten so that they aren't kept when the final publishes are processed.
+
+        :param search_id:    The id of the search whose publishes are being processed again
+        """
+        for stream_key in self._streamed_file_versions.keys():
+            # publishes are streamed with have_local set to False:
+            if stream_key[0] == search_id and not stream_key[2]:
+                del self._streamed_file_versions[stream_key]
+
+    def _process_found_files(self, search_id, file_list, work_area, have_local, have_publishes, is_final=True,
+                             keep_found=True):
         """
         Process files/publishes found by the finder.  This ensures that the parent _GroupModelItem for the
-        search entity+user exists and then updates the group with files that were found.
+        search entity+user exists and then updates the group with files that were found.  Files found before
+        the final results are only added to the group - any files that no longer exist are removed once the
+        final results have been found.
 
         :param search_id:       The id of the search that the files were found for
         :param file_list:       The list of FileItems that were found
         :param work_area:       The work area that the files were found in
         :param have_local:      True if work files were found, otherwise false
         :param have_publishes:  True if publishes were found, otherwise false
+        :param is_final:        True if these are the last files to be found, False if more will follow
+        :param keep_found:      If False then files in a partial result aren't kept when the final results are
+                                processed unless they are found again
         """
         if search_id not in self._in_progress_searches:
             # ignore result
@@ -1055,7 +1286,17 @@ class FileModel(QtGui.QStandardItemModel):
             self._update_group_child_entity_items(group_item, search.child_entities or [])
 
         # process files:
-        self._process_files(file_list, work_area, group_item, have_local, have_publishes)
+        stream_key = (search_id, group_key, have_local)
+        if is_final:
+            found_file_versions = self._streamed_file_versions.pop(stream_key, None)
+            self._process_files(file_list, work_area, group_item, have_local, have_publishes,
+                                found_file_versions=found_file_versions)
+        else:
+            if keep_found:
+                found_file_versions = self._streamed_file_versions.setdefault(stream_key, set())
+                found_file_versions.update([(file_item.key_id, file_item.version) for file_item in file_list])
+            # only the files in this chunk are touched - the whole group is updated with the final results:
+            self._process_partial_files(file_list, work_area, group_item)
 
     def _on_finder_search_completed(self, search_id):
         """
@@ -1093,6 +1334,8 @@ class FileModel(QtGui.QStandardItemModel):
 
         search = self._in_progress_searches[search_id]
         del(self._in_progress_searches[search_id])
+        for stream_key in [k for k in self._streamed_file_versions if k[0] == search_id]:
+            del self._streamed_file_versions[stream_key]
 
         group_map = {}
         for group_item in self._group_items():
@@ -1110,6 +1353,112 @@ class FileModel(QtGui.QStandardItemModel):
             if status == FileModel.SEARCH_COMPLETED:
                 self._search_cache.set_dirty(search.entity, user, is_dirty=False)
 
+        # watch any directories that files were found in:
+        self._update_watched_directories()
+
+        self._app.log_debug("File Model: Search cache usage after search %d - %s"
+                            % (search_id, self._search_cache.format_stats()))
+
+    def _update_watched_directories(self):
+        """
+        Update the directories being watched for changes to include the work and publish areas for
+        all groups in the model as well as all directories that files in the model were found in.
+        """
+        if not self._watcher:
+            return
+
+        directories = set()
+        for group_item in self._group_items():
+            directories.update(group_item.watch_directories)
+            for model_item in self._file_items(group_item):
+                file_item = model_item.file_item
+                if file_item.is_local and file_item.path:
+                    directories.add(os.path.dirname(file_item.path))
+                if file_item.is_published and file_item.publish_path:
+                    directories.add(os.path.dirname(file_item.publish_path))
+        self._watcher.set_directories(directories)
+
+    def _on_watched_files_changed(self, created_paths, deleted_paths):
+        """
+        Slot triggered when files have been created or deleted in any of the watched directories.  Deleted
+        work files are removed from the model straight away whilst created files are processed by the finder
+        in the background.  If a publish has changed then the search for the entity is restarted so that the
+        publish details are retrieved from Shotgun.
+
+        :param created_paths:   A list of the paths for all files that were created
+        :param deleted_paths:   A list of the paths for all files that were deleted
+        """
+        deleted_paths = set(deleted_paths)
+        changed_paths = list(created_paths) + list(deleted_paths)
+        entities_to_search = set()
+
+        for group_item in list(self._group_items()):
+            work_area = group_item.work_area
+            if not work_area:
+                continue
+
+            if (work_area.publish_template
+                and any(work_area.publish_template.validate(path) for path in changed_paths)):
+                # publishes have changed:
+                entities_to_search.add(group_item.key[0])
+
+            if deleted_paths:
+                # remove any work files that no longer exist:
+                local_files = [model_item.file_item for model_item in self._file_items(group_item)
+                               if model_item.file_item.is_local]
+                remaining_files = [file_item for file_item in local_files if file_item.path not in deleted_paths]
+                if len(remaining_files) != len(local_files):
+                    self._app.log_debug("File Model: Removing %d deleted work files from group %s"
+                                        % (len(local_files) - len(remaining_files), group_item.text()))
+                    self._process_files(remaining_files, work_area, group_item, have_local=True,
+                                        have_publishes=False)
+
+            if created_paths and work_area.work_template:
+                # find any new work files in the background:
+                update_id = self._finder.begin_work_file_update(work_area, created_paths)
+                self._pending_file_updates[update_id] = group_item.key
+
+        # restart the searches for any entities where the publishes have changed:
+        in_progress_entity_keys = set(self._gen_entity_key(search.entity)
+                                      for search in self._in_progress_searches.values())
+        if entities_to_search:
+            group_map = dict((group_item.key, group_item) for group_item in self._group_items())
+            for search in self._current_searches:
+                entity_key = self._gen_entity_key(search.entity)
+                if entity_key in entities_to_search and entity_key not in in_progress_entity_keys:
+                    self._start_search(search, group_map)
+
+        if deleted_paths:
+            self._update_watched_directories()
+
+    def _on_finder_work_files_updated(self, update_id, file_list, work_area):
+        """
+        Slot triggered when the finder has finished processing paths for an incremental update.
+
+        :param update_id:   The id of the update
+        :param file_list:   The list of FileItems for all new work files that were found
+        :param work_area:   The work area that the files were found in
+        """
+        group_key = self._pending_file_updates.pop(update_id, None)
+        if group_key is None or not file_list:
+            return
+
+        group_item = None
+        for item in self._group_items():
+            if item.key == group_key:
+                group_item = item
+                break
+        if not group_item or not group_item.work_area:
+            return
+
+        self._app.log_debug("File Model: Adding %d new work files to group %s"
+                            % (len(file_list), group_item.text()))
+
+        # add the new files to the existing work files for the group:
+        self._process_files(file_list, group_item.work_area, group_item, have_local=True, have_publishes=False,
+                            prune=False)
+        self._update_watched_directories()
+
     def _on_data_retriever_work_completed(self, uid, request_type, data):
         """
         Slot triggered when the data-retriever has finished doing some work.  The data retriever is currently
@@ -1120,10 +1469,26 @@ class FileModel(QtGui.QStandardItemModel):
         :param request_type:    A string representing the type of request that has been completed
         :param data:            The result from completing the work
         """
+        if uid in self._pending_description_requests:
+            (publish_ids, file_key_id) = self._pending_description_requests[uid]
+            del(self._pending_description_requests[uid])
+            self._pending_description_ids.difference_update(publish_ids)
+            # check that the descriptions actually arrived - any that didn't will be requested
+            # again the next time they're needed:
+            descriptions = (data or {}).get("return_value") or {}
+            missing_ids = set(publish_ids) - set(descriptions.keys())
+            if missing_ids:
+                self._app.log_debug("File Model: Descriptions weren't fetched for publishes %s"
+                                    % sorted(missing_ids))
+            # update all items for the file so that their tooltips pick up the descriptions:
+            for model_item in self._find_current_items(None, file_key_id, None):
+                model_item.emitDataChanged()
+            return
+
         if uid not in self._pending_thumbnail_requests:
             # the completed work is of no interest to us!
             return
-        (group_key, file_key, file_version) = self._pending_thumbnail_requests[uid]
+        (group_key, file_key_id, file_version) = self._pending_thumbnail_requests[uid]
         del(self._pending_thumbnail_requests[uid])
 
         # extract the thumbnail path and QImage from the data/result
@@ -1133,7 +1498,7 @@ class FileModel(QtGui.QStandardItemModel):
             return
 
         # find all file items for this file:
-        model_items = self._find_current_items(group_key, file_key, file_version)
+        model_items = self._find_current_items(group_key, file_key_id, file_version)
         if not model_items:
             return
 
@@ -1157,7 +1522,7 @@ class FileModel(QtGui.QStandardItemModel):
 
             if work_area:
                 # update thumbnails on all file versions:
-                self._update_version_thumbnails(file_item.key, group_key, work_area)
+                self._update_version_thumbnails(file_item.key_id, group_key, work_area)
 
     def _on_data_retriever_work_failed(self, uid, error_msg):
         """
@@ -1166,10 +1531,37 @@ class FileModel(QtGui.QStandardItemModel):
         :param uid:         The unique id representing the task that the data retriever failed on
         :param error_msg:   The error message for the failed task
         """
+        if uid in self._pending_description_requests:
+            (publish_ids, _) = self._pending_description_requests[uid]
+            del(self._pending_description_requests[uid])
+            self._pending_description_ids.difference_update(publish_ids)
+            self._app.log_debug("File Model: Failed to fetch publish descriptions for request %s: %s"
+                                % (uid, error_msg))
+            return
+
         if uid in self._pending_thumbnail_requests:
             del(self._pending_thumbnail_requests[uid])
         self._app.log_debug("File Model: Failed to find thumbnail for id %s: %s" % (uid, error_msg))
 
+    def _load_publish_descriptions(self, file_item):
+        """
+        Start loading the descriptions for a file and all of its versions in the background if they
+        haven't already been loaded.  Failures are cached by the publish fetcher so they won't be
+        requested again straight away.
+
+        :param file_item:   The FileItem to load publish descriptions for
+        """
+        if not self._sg_data_retriever:
+            return
+        publish_ids = [publish_id for publish_id in file_item.get_unloaded_publish_description_ids()
+                       if publish_id not in self._pending_description_ids]
+        if not publish_ids:
+            return
+
+        request_id = self._sg_data_retriever.execute_method(g_publish_fetcher.get_descriptions, publish_ids)
+        self._pending_description_requests[request_id] = (publish_ids, file_item.key_id)
+        self._pending_description_ids.update(publish_ids)
+
     def _update_group_file_items(self, group_item):
         """
         Update all file model items within the specified group model item.  This updates each file's
@@ -1182,40 +1574,33 @@ class FileModel(QtGui.QStandardItemModel):
         if not work_area:
             return
 
-        # get a unique list of all file keys under the group:
-        unique_file_keys = set()
+        # get a unique list of all file key ids under the group:
+        unique_file_key_ids = set()
         for item in self._file_items(group_item):
             file_item = item.file_item
-            unique_file_keys.add(file_item.key)
+            unique_file_key_ids.add(file_item.key_id)
 
-        if not unique_file_keys:
+        if not unique_file_key_ids:
             return
 
         # process files for each key:
-        for file_key in unique_file_keys:
+        for file_key_id in unique_file_key_ids:
             # get all file versions for this key:
-            file_versions = self._search_cache.find_file_versions(work_area, file_key) or {}
+            file_versions, model_files = self._get_file_versions(file_key_id, group_item.key, work_area)
 
-            # update thumbnail and versions for each version:
+            # update thumbnail and versions for each version in the model:
             thumb = None
-            for _, version in sorted(file_versions.iteritems(), reverse=False):
+            for version_num, version in sorted(file_versions.iteritems(), reverse=False):
                 if version.thumbnail_path:
                     # this file version should have a thumbnail!
                     thumb = version.thumbnail
-                else:
+                elif version_num in model_files:
                     # lets use the current thumbnail for this version:
                     version.thumbnail = thumb
 
-                # store the file versions on the file as well:
-                version.versions = file_versions
-
-        # update tooltips on all file items:
-        for file_model_item in self._file_items(group_item):
-            file_item = file_model_item.file_item
-            tooltip = ""
-            if file_item:
-                tooltip = file_item.format_tooltip()
-            file_model_item.setToolTip(tooltip)
+            # store the file versions on the files as well:
+            for file_item in model_files.itervalues():
+                file_item.versions = file_versions
 
         # emit data changed signal for all items in the group:
         row_count = group_item.rowCount()
@@ -1223,31 +1608,49 @@ class FileModel(QtGui.QStandardItemModel):
         br_idx = self.index(row_count - 1, 0, group_item.index())
         self.dataChanged.emit(tl_idx, br_idx)
 
-    def _update_version_thumbnails(self, file_key, group_key, work_area):
+    def _update_version_thumbnails(self, file_key_id, group_key, work_area):
         """
         Update the thumbnail for all versions of a file.  If a file version doesn't have a thumnail set and
         a previous version did then it will re-use the file from the previous version instead.
 
-        :param file_key:    A unique key that identifies all versions of the same file
+        :param file_key_id: The id of the unique key that identifies all versions of the same file
         :param group_key:   A unique key that represents a single file group
         :param work_area:   A WorkArea instance that all files in this group belong to
         """
-        file_versions = self._search_cache.find_file_versions(work_area, file_key) or {}
+        file_versions, model_files = self._get_file_versions(file_key_id, group_key, work_area)
         thumb = None
-        for _, version in sorted(file_versions.iteritems(), reverse=False):
+        for version_num, version in sorted(file_versions.iteritems(), reverse=False):
             if version.thumbnail_path:
                 # this file version should have a thumbnail!
                 thumb = version.thumbnail
-            else:
+            elif version_num in model_files:
                 if version.thumbnail != thumb:
                     # lets use the current thumbnail for this version:
                     version.thumbnail = thumb
 
                     # emit a data changed signal for any model items that are affected:
-                    version_items = self._find_current_items(group_key, version.key, version.version)
+                    version_items = self._find_current_items(group_key, version.key_id, version.version)
                     for item in version_items:
                         item.emitDataChanged()
 
+    def _get_file_versions(self, file_key_id, group_key, work_area):
+        """
+        Get all versions of a file in a group.  The versions are the model's own file items where the model
+        has them, otherwise the file items from the search cache.  The cached file items are shared so only
+        the model's own file items should ever be updated.
+
+        :param file_key_id: The id of the unique key that identifies all versions of the same file
+        :param group_key:   A unique key that represents a single file group
+        :param work_area:   A WorkArea instance that all files in this group belong to
+        :returns:           Tuple containing (dictionary {version:FileItem} of all versions of the file,
+                            dictionary {version:FileItem} of just the model's own file items)
+        """
+        model_files = dict([(item.file_item.version, item.file_item)
+                            for item in self._find_current_items(group_key, file_key_id, None)])
+        file_versions = dict(self._search_cache.find_file_versions(work_area, file_key_id) or {})
+        file_versions.update(model_files)
+        return (file_versions, model_files)
+
     def _build_thumbnail(self, thumb_path_or_image):
         """
         Build a thumbnail from the specified path or QImage with uniform dimensions.
@@ -28,6 +28,7 @@ from .work_area import WorkArea
 from .file_item import FileItem
 from .file_finder import FileFinder
 from .util import value_to_str
+from .template_cache import g_template_cache
 from .errors import MissingTemplatesError
 
 from .actions.save_as_file_action import SaveAsFileAction
@@ -348,7 +349,7 @@ class FileSaveForm(FileFormBase):
         # query the context fields:
         ctx_fields = {}
         try:
-            ctx_fields = env.context.as_template_fields(env.work_template, validate=True)
+            ctx_fields = g_template_cache.context_fields(env.context, env.work_template, validate=True)
             fields = dict(chain(fields.iteritems(), ctx_fields.iteritems()))
         except TankError, e:
             app.log_debug("Unable to generate preview path: %s" % e)
@@ -369,8 +370,7 @@ class FileSaveForm(FileFormBase):
             # version is used so we need to find the latest version - this means 
             # searching for files...
             # need a file key to find all versions so lets build it:
-            file_key = FileItem.build_file_key(fields, env.work_template, 
-                                               env.version_compare_ignore_fields)
+            file_key = env.get_file_key_builder().build_key(fields)
             file_versions = None
             if self._file_model:
                 file_versions = self._file_model.get_cached_file_versions(file_key, env, clean_only=True)
@@ -399,7 +399,7 @@ class FileSaveForm(FileFormBase):
         # see if we can build a valid path from the fields:
         path = None
         try:
-            path = env.work_template.apply_fields(fields)
+            path = g_template_cache.apply_fields(env.work_template, fields)
         except TankError, e:
             if require_path:
                 # we need a path so re-raise the exception!
@@ -525,10 +525,10 @@ class FileSaveForm(FileFormBase):
         try:
             if not file.is_local and file.is_published:
                 if self._current_env.publish_template:
-                    fields = self._current_env.publish_template.get_fields(file.publish_path)
+                    fields = g_template_cache.get_fields(self._current_env.publish_template, file.publish_path)
             else:
                 if self._current_env.work_template:
-                    fields = self._current_env.work_template.get_fields(file.path)
+                    fields = g_template_cache.get_fields(self._current_env.work_template, file.path)
         except:
             pass
 
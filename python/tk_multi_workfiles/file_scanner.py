@@ -0,0 +1,768 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Parallel directory scanning used to find work files on disk.
+"""
+
+import os
+import sys
+import fnmatch
+import threading
+import Queue
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # the scandir package provides the same functionality for older versions of Python:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+from sgtk import TankError
+
+from .util import Threaded, get_template_user_keys, get_template_key
+from .template_cache import g_template_cache
+
+
+def _has_magic(s):
+    """
+    :param s:   A path component
+    :returns:   True if the component contains glob wildcard characters
+    """
+    return "*" in s or "?" in s or "[" in s
+
+
+def build_glob_patterns(template, fields, skip_keys=None, skip_missing_optional_keys=False):
+    """
+    Build the set of glob patterns that would be searched by sgtk.paths_from_template() for
+    the specified template and fields.  One pattern is generated for each combination of
+    optional keys in the template.
+
+    :param template:                    The template to build the glob patterns for
+    :param fields:                      A dictionary of fields to use when building the patterns
+    :param skip_keys:                   A list of key names that should be replaced by a wildcard
+    :param skip_missing_optional_keys:  If True then any optional keys that are missing from the
+                                        fields will also be replaced by a wildcard
+    :returns:                           A set of glob pattern strings
+    """
+    skip_keys = set(skip_keys or [])
+    if skip_missing_optional_keys:
+        for key_name in template.keys:
+            if key_name not in fields and template.is_optional(key_name):
+                skip_keys.add(key_name)
+
+    # note, this mirrors the way sgtk.paths_from_template() builds its glob patterns and has to use the
+    # same private template API: there is no public access to the key set for each combination of
+    # optional keys (template._keys) and the public apply_fields() validates every value so it can't
+    # be used to insert the "*" wildcards for keys such as integer keys (template._apply_fields()
+    # with ignore_types):
+    patterns = set()
+    for keys in template._keys:
+        # only include fields that are relevant to this key set so that the matching
+        # definition is used when the fields are applied:
+        current_fields = {}
+        current_skip_keys = []
+        for key_name in keys:
+            if key_name in skip_keys or key_name not in fields:
+                current_fields[key_name] = "*"
+                current_skip_keys.append(key_name)
+            else:
+                current_fields[key_name] = fields[key_name]
+        try:
+            patterns.add(template._apply_fields(current_fields, ignore_types=current_skip_keys))
+        except TankError:
+            # this key set can't be resolved with the fields we have!
+            continue
+    return patterns
+
+
+def _fields_match(path_fields, fields, skip_keys):
+    """
+    :param path_fields: The fields extracted from a path
+    :param fields:      The fields the path is expected to match
+    :param skip_keys:   Keys that shouldn't be compared
+    :returns:           True if all fields that aren't skipped match the path fields
+    """
+    for name, value in fields.iteritems():
+        if name not in skip_keys and name in path_fields and path_fields[name] != value:
+            return False
+    return True
+
+
+def _split_pattern(pattern):
+    """
+    Split a glob pattern into its static root and the list of components below it.
+
+    :param pattern: The glob pattern to split
+    :returns:       Tuple containing (root path, list of components)
+    """
+    pattern = os.path.normpath(pattern)
+    drive, tail = os.path.splitdrive(pattern)
+    parts = tail.split(os.sep)
+
+    root_parts = []
+    while parts and not _has_magic(parts[0]):
+        root_parts.append(parts.pop(0))
+    if not parts:
+        return (pattern, [])
+    root = drive + (os.sep.join(root_parts) or os.sep)
+    return (root, parts)
+
+
+def get_static_directories(template, fields, skip_keys=None):
+    """
+    Find the deepest directories that every path matching the template and fields must be
+    contained in.  These are the directories above the first wildcard of each glob pattern.
+
+    :param template:    The template to find the directories for
+    :param fields:      A dictionary of fields to use when building the glob patterns
+    :param skip_keys:   A list of key names that should be treated as wildcards
+    :returns:           A set of directory paths
+    """
+    directories = set()
+    for pattern in build_glob_patterns(template, fields, skip_keys, skip_missing_optional_keys=True):
+        root, components = _split_pattern(pattern)
+        directories.add(root if components else os.path.dirname(root))
+    return directories
+
+
+def get_static_prefixes(template, fields, skip_keys=None):
+    """
+    Find the literal text that every path matching the template and fields must start with.
+    These are the parts of each glob pattern before the first wildcard.
+
+    :param template:    The template to find the prefixes for
+    :param fields:      A dictionary of fields to use when building the glob patterns
+    :param skip_keys:   A list of key names that should be treated as wildcards
+    :returns:           A set of path prefixes
+    """
+    prefixes = set()
+    for pattern in build_glob_patterns(template, fields, skip_keys, skip_missing_optional_keys=True):
+        pattern = os.path.normpath(pattern)
+        magic_positions = [pos for pos in [pattern.find(c) for c in "*?["] if pos != -1]
+        prefixes.add(pattern[:min(magic_positions)] if magic_positions else pattern)
+    return prefixes
+
+
+def filter_template_paths(template, paths, fields, skip_keys=None):
+    """
+    Filter a list of paths to just those that match the template and fields.
+
+    :param template:    The template the paths should match
+    :param paths:       The list of paths to filter
+    :param fields:      A dictionary of fields that the paths should match
+    :param skip_keys:   A list of key names that shouldn't be compared
+    :returns:           A list of the paths that match the template and fields
+    """
+    skip_keys = set(skip_keys or [])
+    valid_paths = []
+    for path in paths:
+        try:
+            path_fields = g_template_cache.get_fields(template, path)
+        except TankError:
+            continue
+        if _fields_match(path_fields, fields, skip_keys):
+            valid_paths.append(path)
+    return valid_paths
+
+
+class _WorkerPool(object):
+    """
+    A small, bounded pool of daemon threads used to fan blocking file system calls out
+    so that they are executed in parallel.  This is especially useful on network file
+    systems where each call is a round trip to the server.
+    """
+
+    def __init__(self, max_workers):
+        """
+        Construction
+
+        :param max_workers: The maximum number of worker threads to create
+        """
+        self._max_workers = max(1, max_workers)
+        self._tasks = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def map(self, func, items):
+        """
+        Call func for each of the items, using the worker threads, and wait for all of the calls
+        to complete.
+
+        :param func:    The function to call.  This must take a single item as its only argument
+        :param items:   The items to call the function for
+        :returns:       A list containing the results of the function call for each item, in the
+                        same order as the items.
+        """
+        items = list(items)
+        if len(items) < 2 or self._max_workers < 2:
+            return [func(item) for item in items]
+
+        self._start_threads()
+
+        results = [None] * len(items)
+        errors = []
+        remaining = [len(items)]
+        remaining_lock = threading.Lock()
+        all_done = threading.Event()
+
+        def run_item(index):
+            try:
+                results[index] = func(items[index])
+            except Exception:
+                errors.append(sys.exc_info())
+            finally:
+                with remaining_lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        all_done.set()
+
+        for index in range(len(items)):
+            self._tasks.put((run_item, index))
+        all_done.wait()
+
+        if errors:
+            exc_type, exc_value, exc_tb = errors[0]
+            raise exc_type, exc_value, exc_tb
+        return results
+
+    def _start_threads(self):
+        """
+        Start the worker threads if they haven't been started already.
+        """
+        with self._lock:
+            while len(self._threads) < self._max_workers:
+                thread = threading.Thread(target=self._worker, name="tk-multi-workfiles scanner")
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        """
+        Worker thread loop - runs tasks from the queue forever.
+        """
+        while True:
+            func, arg = self._tasks.get()
+            try:
+                func(arg)
+            except Exception:
+                # errors are reported through the map call!
+                pass
+
+
+class DirectoryListingCache(Threaded):
+    """
+    Cache of directory listings.  Each listing is stored with the modification time of the directory
+    when it was listed so that it can be reused for as long as the directory hasn't changed.
+    """
+
+    class _Listing(object):
+        """
+        The names found in a single directory together with a lazily populated record of which
+        of those names are directories.
+        """
+        def __init__(self, names):
+            """
+            Construction
+
+            :param names:   The list of entry names in the directory
+            """
+            self.names = names
+            self._is_dir = {}
+
+        def is_dir(self, parent, name):
+            """
+            :param parent:  The path of the directory this listing is for
+            :param name:    The name of the entry to check
+            :returns:       True if the entry is a directory
+            """
+            is_dir = self._is_dir.get(name)
+            if is_dir is None:
+                is_dir = os.path.isdir(os.path.join(parent, name))
+                self._is_dir[name] = is_dir
+            return is_dir
+
+    # maximum number of listings to keep in the cache before it's reset:
+    MAX_LISTINGS = 20000
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._listings = {}
+
+    @Threaded.exclusive
+    def get(self, path, mtime):
+        """
+        :param path:    The directory to get the cached listing for
+        :param mtime:   The current modification time of the directory
+        :returns:       The cached _Listing for the directory or None if it isn't in the cache or
+                        the directory has changed since it was listed
+        """
+        entry = self._listings.get(path)
+        if entry and entry[0] == mtime:
+            return entry[1]
+        return None
+
+    @Threaded.exclusive
+    def add(self, path, mtime, listing):
+        """
+        :param path:    The directory the listing is for
+        :param mtime:   The modification time of the directory when it was listed
+        :param listing: The _Listing to cache
+        """
+        if len(self._listings) >= DirectoryListingCache.MAX_LISTINGS:
+            self._listings = {}
+        self._listings[path] = (mtime, listing)
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Clear the cache
+        """
+        self._listings = {}
+
+
+class DirectoryWalker(object):
+    """
+    Expands glob patterns by walking the directory tree level by level, listing all directories
+    at the same level in parallel.  Directories that are shared by several patterns are only
+    listed once.
+    """
+
+    # maximum number of directory listings that will run at the same time:
+    MAX_WORKERS = 8
+    # number of paths stat'd by a worker in one go:
+    STAT_BATCH_SIZE = 64
+    # minimum number of paths in a single directory for scandir to be used to stat them:
+    SCANDIR_MIN_PATHS = 16
+
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    def __init__(self, listing_cache=None):
+        """
+        Construction
+
+        :param listing_cache:   An optional DirectoryListingCache.  If specified then directories that
+                                haven't changed since they were last listed will not be listed again.
+        """
+        self._listing_cache = listing_cache
+        with DirectoryWalker._pool_lock:
+            if DirectoryWalker._pool is None:
+                DirectoryWalker._pool = _WorkerPool(DirectoryWalker.MAX_WORKERS)
+
+    def walk(self, patterns, dir_mtimes=None):
+        """
+        Find all paths that match any of the specified glob patterns.
+
+        :param patterns:    A list of glob patterns to expand
+        :param dir_mtimes:  An optional dictionary that will be populated with the modification time
+                            of every directory that was looked at during the walk.  Directories that
+                            didn't exist are recorded with a modification time of None.  This can be
+                            passed to has_changed() to determine if the walk would find different paths.
+        :returns:           A set of all paths that were found
+        """
+        # split the patterns into a static root and a list of components to match:
+        pending = {}
+        for pattern in patterns:
+            root, components = _split_pattern(pattern)
+            if components:
+                pending.setdefault((root, tuple(components)), None)
+            elif os.path.lexists(root):
+                # no wildcards so the path either exists or it doesn't!
+                pending.setdefault((root, ()), None)
+            elif dir_mtimes is not None:
+                dir_mtimes[root] = None
+
+        found_paths = set()
+        while pending:
+            # collect the unique directories that need listing for this level:
+            dirs_to_list = set()
+            for (parent, components) in pending:
+                if components and _has_magic(components[0]):
+                    dirs_to_list.add(parent)
+
+            dirs_to_list = list(dirs_to_list)
+            listings = dict(zip(dirs_to_list, DirectoryWalker._pool.map(self._list_dir, dirs_to_list)))
+            if dir_mtimes is not None:
+                for dir_path, (mtime, _) in listings.iteritems():
+                    dir_mtimes[dir_path] = mtime
+
+            # and expand each entry by one level:
+            next_pending = {}
+            for (parent, components) in pending:
+                if not components:
+                    found_paths.add(parent)
+                    continue
+
+                component = components[0]
+                is_leaf = len(components) == 1
+                if _has_magic(component):
+                    # match against the directory listing - all matches are known to exist:
+                    _, listing = listings.get(parent) or (None, None)
+                    if not listing:
+                        continue
+                    names = listing.names
+                    if not component.startswith("."):
+                        names = [n for n in names if not n.startswith(".")]
+                    for name in fnmatch.filter(names, component):
+                        path = os.path.join(parent, name)
+                        if is_leaf:
+                            found_paths.add(path)
+                        elif listing.is_dir(parent, name):
+                            next_pending.setdefault((path, components[1:]), None)
+                    continue
+
+                path = os.path.join(parent, component)
+                if is_leaf:
+                    if os.path.lexists(path):
+                        found_paths.add(path)
+                    elif dir_mtimes is not None:
+                        dir_mtimes[path] = None
+                elif os.path.isdir(path):
+                    next_pending.setdefault((path, components[1:]), None)
+                elif dir_mtimes is not None:
+                    # remember that the directory doesn't exist so that we know to
+                    # look again if it gets created:
+                    dir_mtimes[path] = None
+            pending = next_pending
+
+        return found_paths
+
+    def paths_from_template(self, template, fields, skip_keys=None, dir_mtimes=None):
+        """
+        Equivalent of sgtk.paths_from_template() (with skip_missing_optional_keys=True) that uses
+        this walker to find the paths.
+
+        :param template:    The template to find paths for
+        :param fields:      A dictionary of fields to use when finding the paths
+        :param skip_keys:   A list of key names that should be ignored when finding the paths
+        :param dir_mtimes:  An optional dictionary that will be populated with the modification times
+                            of all directories looked at.  See walk()
+        :returns:           A list of all paths found that match the template and fields
+        """
+        skip_keys = set(skip_keys or [])
+        patterns = build_glob_patterns(template, fields, skip_keys, skip_missing_optional_keys=True)
+        return filter_template_paths(template, self.walk(patterns, dir_mtimes), fields, skip_keys)
+
+    def has_changed(self, dir_mtimes):
+        """
+        Determine if any of the directories recorded during a previous walk have changed.
+
+        :param dir_mtimes:  A dictionary {path:mtime} of directory modification times as populated
+                            by walk()
+        :returns:           True if any of the directories have been modified, created or removed
+                            since they were recorded, otherwise False
+        """
+        if not dir_mtimes:
+            return True
+        paths = list(dir_mtimes.keys())
+        mtimes = DirectoryWalker._pool.map(self._get_mtime, paths)
+        for path, mtime in zip(paths, mtimes):
+            if mtime != dir_mtimes[path]:
+                return True
+        return False
+
+    def stat_paths(self, paths):
+        """
+        Stat a list of paths in parallel.  Each path is only stat'd once and the paths are handed to the
+        worker threads in batches grouped by directory.  Where scandir is available, directories that contain
+        a lot of the paths are scanned instead so that the stat information can be returned directly from the
+        directory listing on platforms that support it.
+
+        :param paths:   The list of paths to stat
+        :returns:       A dictionary {path:stat result} containing an entry for every path.  The stat result
+                        will be None if the path doesn't exist or can't be accessed.
+        """
+        paths_by_dir = {}
+        for path in set(paths):
+            paths_by_dir.setdefault(os.path.dirname(path), []).append(path)
+
+        batches = []
+        for dir_path, dir_paths in paths_by_dir.iteritems():
+            if scandir and len(dir_paths) >= DirectoryWalker.SCANDIR_MIN_PATHS:
+                batches.append((dir_path, dir_paths))
+                continue
+            for i in range(0, len(dir_paths), DirectoryWalker.STAT_BATCH_SIZE):
+                batches.append((None, dir_paths[i:i+DirectoryWalker.STAT_BATCH_SIZE]))
+
+        stat_results = {}
+        for batch_results in DirectoryWalker._pool.map(self._stat_batch, batches):
+            stat_results.update(batch_results)
+        return stat_results
+
+    def _stat_batch(self, batch):
+        """
+        Stat a batch of paths.
+
+        :param batch:   Tuple containing (directory, list of paths).  If the directory is not None then
+                        all paths are in that directory and it will be scanned to find the stat results.
+        :returns:       A dictionary {path:stat result} for all paths in the batch
+        """
+        dir_path, paths = batch
+        stat_results = {}
+        if dir_path is not None:
+            paths_by_name = dict((os.path.basename(path), path) for path in paths)
+            try:
+                for entry in scandir(dir_path):
+                    path = paths_by_name.get(entry.name)
+                    if path is not None:
+                        try:
+                            stat_results[path] = entry.stat()
+                        except OSError:
+                            stat_results[path] = None
+            except OSError:
+                pass
+            # anything not found in the directory listing doesn't exist:
+            for path in paths:
+                stat_results.setdefault(path, None)
+            return stat_results
+
+        for path in paths:
+            try:
+                stat_results[path] = os.stat(path)
+            except OSError:
+                stat_results[path] = None
+        return stat_results
+
+    def _get_mtime(self, path):
+        """
+        :param path:    The path to get the modification time for
+        :returns:       The modification time of the path or None if it doesn't exist
+        """
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _list_dir(self, path):
+        """
+        List the contents of a directory.
+
+        :param path:    The directory to list
+        :returns:       Tuple containing (modification time, DirectoryListingCache._Listing).  The
+                        modification time and listing will be None if the directory can't be listed.
+        """
+        # note, the directory is stat'd before listing it so that a change during the listing
+        # will be picked up the next time it's checked.
+        mtime = self._get_mtime(path)
+        if mtime is None:
+            return (None, None)
+
+        if self._listing_cache:
+            listing = self._listing_cache.get(path, mtime)
+            if listing:
+                # directory hasn't changed since it was last listed:
+                return (mtime, listing)
+
+        try:
+            listing = DirectoryListingCache._Listing(os.listdir(path))
+        except OSError:
+            return (None, None)
+
+        if self._listing_cache:
+            self._listing_cache.add(path, mtime, listing)
+        return (mtime, listing)
+
+
+class SandboxScanner(object):
+    """
+    Finds the work files for several user sandboxes of the same work area with a single walk of
+    the directory tree.  The files found are then split back out by the sandbox user they belong
+    to.
+    """
+
+    def __init__(self, listing_cache=None):
+        """
+        Construction
+
+        :param listing_cache:   An optional DirectoryListingCache to use when walking the sandboxes
+        """
+        self._walker = DirectoryWalker(listing_cache)
+
+    def find_work_files(self, user_work_areas, skip_fields_fn, dir_mtimes=None):
+        """
+        Find work files for all of the specified user work areas.
+
+        :param user_work_areas: A dictionary {user_id:WorkArea} of work areas to find files for
+        :param skip_fields_fn:  A function that takes (work_fields, work_template, version_compare_ignore_fields)
+                                and returns the list of fields to skip when searching for work files
+        :param dir_mtimes:      An optional dictionary that will be populated with the modification times of
+                                all directories looked at during the scan.  See DirectoryWalker.walk()
+        :returns:               A dictionary {user_id:[path]} containing the list of work file paths found
+                                for each user
+        """
+        files_by_user = dict((user_id, []) for user_id in user_work_areas)
+
+        # group the users by the fields that are common to all of them.  Typically there will only
+        # be a single group as all sandboxes share the same parent directory:
+        scan_groups = {}
+        for user_id, work_area in user_work_areas.iteritems():
+            if not work_area or not work_area.context or not work_area.work_template:
+                continue
+            template = work_area.work_template
+            try:
+                work_fields = g_template_cache.context_fields(work_area.context, template, validate=True)
+            except TankError:
+                # no folders for this user so there won't be any files to find!
+                continue
+
+            user_keys = get_template_user_keys(template)
+            skip_fields = set(skip_fields_fn(work_fields, template, work_area.version_compare_ignore_fields))
+            shared_fields = dict((k, v) for k, v in work_fields.iteritems() if k not in user_keys)
+            user_values = tuple(work_fields.get(k) for k in sorted(user_keys))
+
+            group_key = (get_template_key(template),
+                         tuple(sorted(shared_fields.iteritems())),
+                         tuple(sorted(skip_fields)))
+            group = scan_groups.setdefault(group_key, {"template":template,
+                                                       "fields":shared_fields,
+                                                       "skip_fields":skip_fields,
+                                                       "user_keys":sorted(user_keys),
+                                                       "users":{}})
+            group["users"].setdefault(user_values, []).append(user_id)
+
+        # scan once for each group and split the results out by user:
+        for group in scan_groups.values():
+            template = group["template"]
+            skip_fields = group["skip_fields"] | set(group["user_keys"])
+            patterns = build_glob_patterns(template, group["fields"], skip_fields,
+                                           skip_missing_optional_keys=True)
+            for path in self._walker.walk(patterns, dir_mtimes):
+                try:
+                    path_fields = g_template_cache.get_fields(template, path)
+                except TankError:
+                    continue
+
+                # make sure the path matches the fields that aren't being skipped:
+                if not _fields_match(path_fields, group["fields"], skip_fields):
+                    continue
+
+                user_values = tuple(path_fields.get(k) for k in group["user_keys"])
+                for user_id in group["users"].get(user_values, []):
+                    files_by_user[user_id].append(path)
+
+        return files_by_user
+
+
+class SharedTemplateScan(Threaded):
+    """
+    Finds paths for several searches whose fields only differ by the keys that identify their Task
+    or Step, e.g. the searches for all tasks of a single Asset.  The directory tree is walked once
+    with these keys treated as wildcards and the paths found are then filtered for each search.
+    """
+
+    # the entity types of the template keys that are treated as wildcards in the shared walk:
+    SHARED_ENTITY_TYPES = ("Task", "Step")
+
+    class _Scan(object):
+        """
+        The results of a single shared walk
+        """
+        def __init__(self):
+            """
+            Construction
+            """
+            self.done = threading.Event()
+            self.paths = []
+            self.dir_mtimes = {}
+            # the exception info (type, value, traceback) for the walk if it failed:
+            self.exc_info = None
+
+    def __init__(self, listing_cache=None):
+        """
+        Construction
+
+        :param listing_cache:   An optional DirectoryListingCache to use when walking the directories
+        """
+        Threaded.__init__(self)
+        self._walker = DirectoryWalker(listing_cache)
+        self._scans = {}
+
+    def paths_from_template(self, template, fields, skip_keys=None, dir_mtimes=None):
+        """
+        Equivalent of DirectoryWalker.paths_from_template() that shares the walk with any other
+        searches for the same template and fields, ignoring the Task and Step keys.
+
+        :param template:    The template to find paths for
+        :param fields:      A dictionary of fields to use when finding the paths
+        :param skip_keys:   A list of key names that should be ignored when finding the paths
+        :param dir_mtimes:  An optional dictionary that will be populated with the modification times
+                            of all directories looked at.  See DirectoryWalker.walk()
+        :returns:           A list of all paths found that match the template and fields
+        :raises:            Any exception raised whilst walking the directories, including for searches that
+                            were waiting on a walk shared with another search
+        """
+        skip_keys = set(skip_keys or [])
+        shared_skip_keys = set(skip_keys)
+        for key_name in fields:
+            key = template.keys.get(key_name)
+            if key and getattr(key, "shotgun_entity_type", None) in SharedTemplateScan.SHARED_ENTITY_TYPES:
+                shared_skip_keys.add(key_name)
+        shared_fields = dict((k, v) for k, v in fields.iteritems() if k not in shared_skip_keys)
+
+        try:
+            scan_key = (get_template_key(template), frozenset(shared_fields.iteritems()), frozenset(shared_skip_keys))
+            hash(scan_key)
+        except TypeError:
+            # one of the field values isn't hashable so the walk can't be shared:
+            return self._walker.paths_from_template(template, fields, skip_keys, dir_mtimes)
+
+        scan, is_owner = self._claim_scan(scan_key)
+        if is_owner:
+            try:
+                patterns = build_glob_patterns(template, shared_fields, shared_skip_keys,
+                                               skip_missing_optional_keys=True)
+                scan.paths = self._walker.walk(patterns, scan.dir_mtimes)
+            except Exception:
+                # make sure the failed scan isn't shared with any later searches and let any searches
+                # waiting on it know that it failed:
+                scan.exc_info = sys.exc_info()
+                self._release_scan(scan_key, scan)
+                raise
+            finally:
+                scan.done.set()
+        else:
+            # wait for the search that is walking the directories to finish:
+            scan.done.wait()
+            if scan.exc_info is not None:
+                # re-raise with the original traceback so the failure points at the real error:
+                exc_type, exc_value, exc_tb = scan.exc_info
+                raise exc_type, exc_value, exc_tb
+
+        if dir_mtimes is not None:
+            dir_mtimes.update(scan.dir_mtimes)
+        return filter_template_paths(template, scan.paths, fields, skip_keys)
+
+    @Threaded.exclusive
+    def _claim_scan(self, scan_key):
+        """
+        :param scan_key:    The key of the scan to find
+        :returns:           Tuple containing (_Scan, True if the caller should perform the walk)
+        """
+        scan = self._scans.get(scan_key)
+        if scan:
+            return (scan, False)
+        scan = SharedTemplateScan._Scan()
+        self._scans[scan_key] = scan
+        return (scan, True)
+
+    @Threaded.exclusive
+    def _release_scan(self, scan_key, scan):
+        """
+        :param scan_key:    The key of the scan to release
+        :param scan:        The _Scan to release.  This is only removed if it's still the scan for the key
+        """
+        if self._scans.get(scan_key) is scan:
+            del self._scans[scan_key]
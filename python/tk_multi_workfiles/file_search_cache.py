@@ -12,45 +12,94 @@
 Cache used to store and find file search results.
 """
 
+import itertools
+import threading
+
 import sgtk
-from .util import Threaded
+from .util import RWThreaded
 
-class FileSearchCache(Threaded):
+class FileSearchCache(RWThreaded):
     """
-    Implementation of FileSearchCache class
+    Implementation of FileSearchCache class.  The cache is bounded by the total number of file items
+    and the estimated memory used by their thumbnails.  When either budget is exceeded, the least
+    recently used entries are evicted apart from any that are pinned (e.g. the groups currently
+    shown in the model).
+
+    Each entry is an immutable snapshot that is replaced as a whole whenever the files for a work area
+    change.  Readers just look up the latest snapshot without taking any lock and only writers are
+    serialised.  The files and dictionaries returned by the cache are shared and must not be modified.
+    Snapshots hold their own copies of the files added to the cache so that file models can keep
+    updating the items they were given (e.g. with thumbnails) without changing the files other readers
+    hold - models must copy any files they take from the cache before updating them.
+    The number of file items and the estimated thumbnail size are kept as running totals so that
+    checking the budget doesn't have to look at every entry each time files are added.
+
+    A single instance of the cache is shared by all file models in the process so that the files
+    found the last time a dialog was shown can be displayed straight away the next time whilst
+    a new search confirms them.
     """
-    class _CachedFileInfo(object):
-        """
-        Storage for file versions - encapsulates a dictionary if files indexed 
-        by their version
-        """
-        def __init__(self):
-            """
-            Construction
-            """
-            self.versions = {}# version:FileItem() 
 
-    class _CacheEntry(object):
+    # default maximum number of file items to keep in the cache:
+    MAX_ITEMS = 20000
+    # default maximum estimated size in bytes of all thumbnails kept in the cache:
+    MAX_PIXMAP_BYTES = 256 * 1024 * 1024
+
+    class _Snapshot(object):
         """
         A single cache entry - stores the work area the files were found in together with the
-        list of files indexed by the unique file key.
+        files indexed by the unique file key and version.  Snapshots are never modified once
+        they have been constructed.
         """
-        def __init__(self):
+        __slots__ = ("work_area", "is_dirty", "file_versions", "files", "generation")
+
+        def __init__(self, work_area, is_dirty, file_versions, files, generation):
             """
             Construction
+
+            :param work_area:       The work area the files were found in
+            :param is_dirty:        True if the files need to be searched for again
+            :param file_versions:   A dictionary {FileItem.key_id:{version:FileItem}}
+            :param files:           A tuple of all FileItems in the snapshot
+            :param generation:      A number that increases every time a snapshot is built
             """
-            self.work_area = None
-            self.is_dirty = True
-            self.file_info = {}# FileItem.key:_CachedFileInfo()
+            self.work_area = work_area
+            self.is_dirty = is_dirty
+            self.file_versions = file_versions
+            self.files = files
+            self.generation = generation
 
-    def __init__(self):
+    def __init__(self, max_items=None, max_pixmap_bytes=None):
         """
         Construction
+
+        :param max_items:           The maximum number of file items to keep in the cache.  Defaults
+                                    to MAX_ITEMS
+        :param max_pixmap_bytes:    The maximum estimated size in bytes of all thumbnails kept in the
+                                    cache.  Defaults to MAX_PIXMAP_BYTES
         """
-        Threaded.__init__(self)
-        self._cache = {}
+        RWThreaded.__init__(self)
+        # key:_Snapshot - readers look up snapshots without locking so the dictionary is only
+        # ever updated with single, atomic operations:
+        self._snapshots = {}
+        # running totals for all snapshots in the cache - key:estimated thumbnail bytes
+        self._item_count = 0
+        self._pixmap_bytes = {}
+        self._total_pixmap_bytes = 0
+        # key:tick of the last time the snapshot was used.  Readers record usage so this and the
+        # hit and miss counters are guarded by a separate lock rather than the read-write lock:
+        self._last_used = {}
+        self._usage_lock = threading.Lock()
+        self._ticks = itertools.count()
+        self._generations = itertools.count()
+        # owner:set(key)
+        self._pinned_keys = {}
+        self._max_items = max_items or FileSearchCache.MAX_ITEMS
+        self._max_pixmap_bytes = max_pixmap_bytes or FileSearchCache.MAX_PIXMAP_BYTES
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
 
-    @Threaded.exclusive
+    @RWThreaded.writer
     def add(self, work_area, files, is_dirty=None):
         """
         Add the specified files to the cache along with the work area they were found in
@@ -63,55 +112,67 @@ class FileSearchCache(Threaded):
                             is_dirty is None then the previous value will be used or True if there
                             is no previous value.
         """
-        # find the current entry if there is one - this also returns the cache key:
-        key, current_entry = self._find_entry(work_area)
+        # find the current snapshot if there is one - this also returns the cache key:
+        key, current_snapshot = self._find_snapshot(work_area)
         if is_dirty is None:
-            if current_entry:
+            if current_snapshot:
                 # use the current value for the dirty flag:
-                is_dirty = current_entry.is_dirty
+                is_dirty = current_snapshot.is_dirty
             else:
                 # default dirty to True
                 is_dirty = True
 
-        # build the new cache entry from the list of files:
-        new_entry = FileSearchCache._CacheEntry()
-        new_entry.work_area = work_area
-        new_entry.is_dirty = is_dirty
+        # build the new snapshot from copies of the files.  The versions of each copy are the other
+        # copies in the snapshot so the snapshot is self-contained:
+        file_versions = {}
         for file_item in files:
-            new_entry.file_info.setdefault(file_item.key, 
-                                           FileSearchCache._CachedFileInfo()).versions[file_item.version] = file_item
+            file_versions.setdefault(file_item.key_id, {})[file_item.version] = file_item.copy()
+        for versions in file_versions.itervalues():
+            for file_item in versions.itervalues():
+                file_item.versions = versions
+        all_files = tuple([f for versions in file_versions.itervalues() for f in versions.itervalues()])
 
-        # add the new entry to the cache:
-        self._cache[key] = new_entry
+        # and replace the current snapshot with it, updating the running totals:
+        snapshot = FileSearchCache._Snapshot(work_area, is_dirty, file_versions, all_files,
+                                             next(self._generations))
+        if current_snapshot:
+            self._item_count -= len(current_snapshot.files)
+        self._item_count += len(snapshot.files)
+        self._snapshots[key] = snapshot
+        self._update_pixmap_bytes(key)
+        with self._usage_lock:
+            self._last_used[key] = next(self._ticks)
 
-    @Threaded.exclusive
-    def find_file_versions(self, work_area, file_key, clean_only=False):
+        # make sure the cache is still within budget:
+        self._evict()
+
+    def find_file_versions(self, work_area, key_id, clean_only=False):
         """
-        Find all file versions for the specified file key and context.
+        Find all file versions for the specified file key id and context.
 
         :param work_area:       The work area to find the file version for
-        :param file_key:        A unique file key that can be used to locate all versions of a single file
+        :param key_id:          The id of the unique file key (see FileItem.key_id) that can be used to locate
+                                all versions of a single file
         :param clean_only:      If False then dirty cache entries will be included in the returned results.  If
                                 True then they will be omitted. Defaults to False.
-        :returns:               A dictionary {version:FileItem} of all file versions found.
+        :returns:               A dictionary {version:FileItem} of all file versions found.  This is shared
+                                and must not be modified.
         """
-        _, entry = self._find_entry(work_area)
-        if not entry:
+        key, snapshot = self._find_snapshot(work_area)
+        if not snapshot:
             # return None as we don't have a cached result for this context!
+            self._record_use(None)
             return None
 
-        if clean_only and entry.is_dirty:
+        if clean_only and snapshot.is_dirty:
+            self._record_use(None)
             return None
 
-        file_info = entry.file_info.get(file_key)
-        if not file_info:
-            # although we have a cache entry, we don't have any files for the key!
-            return {}
+        self._record_use(key)
 
-        # return a dictionary of version:FileItem entries:
-        return dict([(v, f) for v, f in file_info.versions.iteritems()])
+        # although we may have a snapshot, we may not have any files for the key!
+        return snapshot.file_versions.get(key_id, {})
 
-    @Threaded.exclusive
     def find(self, entity, user=None):
         """
         Find the list of files and work area for the specified entity and user.
@@ -119,20 +180,18 @@ class FileSearchCache(Threaded):
         :param entity:  The entity to return files for
         :param user:    The user to return files for.  If user is None then the user for the current
                         context will be used
-        :returns:       Tuple containing (list(FileItem), WorkArea) or None of an entry isn't found
+        :returns:       Tuple containing (tuple(FileItem), WorkArea) or None of an entry isn't found
         """
         key = self._construct_key(entity, user)
-        entry = self._cache.get(key)
-        if not entry:
+        snapshot = self._snapshots.get(key)
+        if not snapshot:
+            self._record_use(None)
             return None
 
-        files = []
-        for file_info in entry.file_info.values():
-            files.extend([f for f in file_info.versions.values()])
-
-        return (files, entry.work_area)
+        self._record_use(key)
+        return (snapshot.files, snapshot.work_area)
 
-    @Threaded.exclusive
+    @RWThreaded.writer
     def set_dirty(self, entity, user=None, is_dirty=True):
         """
         Mark the cache entry for the specified entity and user as being dirty.
@@ -143,12 +202,9 @@ class FileSearchCache(Threaded):
         :param is_dirty:    True if the entry should be marked as dirty, otherwise False
         """
         key = self._construct_key(entity, user)
-        entry = self._cache.get(key)
-        if not entry:
-            return None
-        entry.is_dirty = is_dirty
+        self._set_snapshot_dirty(key, self._snapshots.get(key), is_dirty)
 
-    @Threaded.exclusive
+    @RWThreaded.writer
     def set_work_area_dirty(self, work_area, dirty=True):
         """
         Mark the cache entry for the specified work area as being dirty.
@@ -156,25 +212,171 @@ class FileSearchCache(Threaded):
         :param work_area:   The work area to update
         :param dirty:       True if the entry should be marked as dirty, otherwise False
         """
-        _, entry = self._find_entry(work_area)
-        if not entry:
-            return
-        entry.is_dirty = dirty
+        key, snapshot = self._find_snapshot(work_area)
+        self._set_snapshot_dirty(key, snapshot, dirty)
+
+    @RWThreaded.writer
+    def set_pinned(self, owner, entity_users):
+        """
+        Set the entries that should never be evicted from the cache, e.g. the entries for the groups
+        currently shown by a file model.  This replaces any entries previously pinned by the same owner.
 
-    @Threaded.exclusive
+        :param owner:           The object (e.g. the file model) that is pinning the entries
+        :param entity_users:    A list of (entity, user) tuples for the entries to pin.  If user is None
+                                then the user for the current context will be used.
+        """
+        pinned_keys = set([self._construct_key(entity, user) for entity, user in entity_users])
+        if pinned_keys:
+            self._pinned_keys[id(owner)] = pinned_keys
+        else:
+            self._pinned_keys.pop(id(owner), None)
+        # entries that were previously pinned may now need to be evicted:
+        self._evict()
+
+    @RWThreaded.writer
     def clear(self):
         """
-        Clear the cache
+        Clear the cache.  The hit, miss and eviction counters are not reset.
+        """
+        with self._usage_lock:
+            self._snapshots = {}
+            self._last_used = {}
+        self._item_count = 0
+        self._pixmap_bytes = {}
+        self._total_pixmap_bytes = 0
+
+    @RWThreaded.reader
+    def get_stats(self):
+        """
+        :returns:   A dictionary containing the number of entries, file items, hits, misses and evictions
+                    together with the estimated size in bytes of the thumbnails in the cache
+        """
+        with self._usage_lock:
+            hits = self._hits
+            misses = self._misses
+        return {"entries":len(self._snapshots),
+                "items":self._item_count,
+                "pixmap_bytes":self._total_pixmap_bytes,
+                "hits":hits,
+                "misses":misses,
+                "evictions":self._evictions}
+
+    def format_stats(self):
+        """
+        :returns:   A string describing the cache usage
+        """
+        stats = self.get_stats()
+        return ("%d entries, %d items, %d KB of thumbnails, %d hits, %d misses, %d evictions"
+                % (stats["entries"], stats["items"], stats["pixmap_bytes"] / 1024,
+                   stats["hits"], stats["misses"], stats["evictions"]))
+
+    def _set_snapshot_dirty(self, key, snapshot, is_dirty):
+        """
+        Replace a snapshot with one that has the dirty flag set.  The files are shared by both snapshots.
+        Note, this must be called with the lock acquired for writing.
+
+        :param key:         The key of the snapshot
+        :param snapshot:    The current _Snapshot or None
+        :param is_dirty:    True if the snapshot should be marked as dirty, otherwise False
+        """
+        if not snapshot or snapshot.is_dirty == is_dirty:
+            return
+        self._snapshots[key] = FileSearchCache._Snapshot(snapshot.work_area, is_dirty, snapshot.file_versions,
+                                                         snapshot.files, next(self._generations))
+
+    def _evict(self):
+        """
+        Evict the least recently used entries that aren't pinned until the cache is within budget.  Note,
+        this must be called with the lock acquired for writing.
+        """
+        if self._within_budget():
+            return
+
+        pinned_keys = set()
+        for owner_keys in self._pinned_keys.values():
+            pinned_keys.update(owner_keys)
+
+        # evict from the least to the most recently used:
+        with self._usage_lock:
+            last_used = dict(self._last_used)
+        for key in sorted(self._snapshots.keys(), key=lambda k: last_used.get(k, -1)):
+            if self._within_budget():
+                break
+            if key in pinned_keys:
+                continue
+            with self._usage_lock:
+                snapshot = self._snapshots.pop(key)
+                self._last_used.pop(key, None)
+            self._item_count -= len(snapshot.files)
+            self._total_pixmap_bytes -= self._pixmap_bytes.pop(key, 0)
+            self._evictions += 1
+
+    def _within_budget(self):
+        """
+        :returns:   True if the running totals are within the item and thumbnail budgets
+        """
+        return self._item_count <= self._max_items and self._total_pixmap_bytes <= self._max_pixmap_bytes
+
+    def _update_pixmap_bytes(self, key):
+        """
+        Update the estimated thumbnail size for a single snapshot in the running totals.  Note, this
+        must be called with the lock acquired for writing.
+
+        :param key: The key of the snapshot to update
         """
-        self._cache = {}
+        snapshot = self._snapshots.get(key)
+        pixmap_bytes = self._get_pixmap_bytes(snapshot) if snapshot else 0
+        self._total_pixmap_bytes += pixmap_bytes - self._pixmap_bytes.get(key, 0)
+        if snapshot:
+            self._pixmap_bytes[key] = pixmap_bytes
+        else:
+            self._pixmap_bytes.pop(key, None)
 
-    def _find_entry(self, work_area):
+    def _record_use(self, key):
         """
-        Find the current entry for the specified work area if there is one
+        Record a hit for a snapshot that was found or a miss.  This is called by readers so the usage is
+        only recorded for snapshots that are still in the cache, otherwise an entry could be added for a
+        snapshot that has just been evicted.
 
-        :param work_area:   The work area to find the cache entry for
-        :returns:           Tuple containing (key, entry) where key is the key into the cache
-                            and entry is the cache entry
+        :param key: The key of the snapshot that was used or None to record a miss
+        """
+        with self._usage_lock:
+            if key is None:
+                self._misses += 1
+            elif key in self._snapshots:
+                self._hits += 1
+                self._last_used[key] = next(self._ticks)
+
+    def _get_pixmap_bytes(self, snapshot):
+        """
+        Estimate the memory used by the thumbnails of the file items in a snapshot.  Thumbnails that
+        are shared by several file items are only counted once.
+
+        :param snapshot:    The _Snapshot to estimate the thumbnail size for
+        :returns:           The estimated size in bytes
+        """
+        pixmaps = {}
+        for file_item in snapshot.files:
+            thumbnail = file_item.thumbnail
+            if thumbnail is not None:
+                pixmaps[id(thumbnail)] = thumbnail
+
+        total_bytes = 0
+        for pixmap in pixmaps.values():
+            try:
+                total_bytes += pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) / 8
+            except AttributeError:
+                # not a pixmap or image so can't estimate the size!
+                continue
+        return total_bytes
+
+    def _find_snapshot(self, work_area):
+        """
+        Find the current snapshot for the specified work area if there is one
+
+        :param work_area:   The work area to find the snapshot for
+        :returns:           Tuple containing (key, snapshot) where key is the key into the cache
+                            and snapshot is the current _Snapshot
         """
         if not work_area or not work_area.context:
             return (None, None)
@@ -182,8 +384,7 @@ class FileSearchCache(Threaded):
         ctx = work_area.context
         key_entity = ctx.task or ctx.step or ctx.entity or ctx.project
         key = self._construct_key(key_entity, ctx.user)
-        entry = self._cache.get(key)
-        return (key, entry)
+        return (key, self._snapshots.get(key))
 
     def _construct_key(self, entity, user):
         """
@@ -207,3 +408,24 @@ class FileSearchCache(Threaded):
         return tuple(key_parts)
 
 
+# single global instance of the file search cache - this is created the first time it's needed rather
+# than when the module is imported so that its limits can be read from the app settings:
+_g_file_search_cache = None
+_g_file_search_cache_lock = threading.Lock()
+
+def get_file_search_cache():
+    """
+    Get the file search cache shared by all file models, creating it if needed.  The limits of the
+    cache are read from the app settings when it's created.
+
+    :returns:   The FileSearchCache instance
+    """
+    global _g_file_search_cache
+    with _g_file_search_cache_lock:
+        if _g_file_search_cache is None:
+            app = sgtk.platform.current_bundle()
+            max_items = app.get_setting("file_search_cache_max_items")
+            max_thumbnail_mb = app.get_setting("file_search_cache_max_thumbnail_mb")
+            max_pixmap_bytes = max_thumbnail_mb * 1024 * 1024 if max_thumbnail_mb else None
+            _g_file_search_cache = FileSearchCache(max_items, max_pixmap_bytes)
+        return _g_file_search_cache
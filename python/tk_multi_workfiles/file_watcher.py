@@ -0,0 +1,430 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Watcher that reports files being created and deleted in a set of directories.
+"""
+
+import os
+import sys
+import errno
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+import sgtk
+from sgtk.platform.qt import QtCore
+
+
+class _InotifyBackend(QtCore.QObject):
+    """
+    Watches directories using the Linux inotify API.  The inotify file descriptor is monitored
+    by a QSocketNotifier so events are read in the main thread without the need for a
+    separate thread.
+    """
+
+    # inotify constants from <sys/inotify.h>
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_DELETE_SELF = 0x00000400
+    _IN_MOVE_SELF = 0x00000800
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_IGNORED = 0x00008000
+    _IN_ONLYDIR = 0x01000000
+    _IN_ISDIR = 0x40000000
+    _IN_NONBLOCK = 0x00000800
+    _IN_CLOEXEC = 0x00080000
+
+    _WATCH_MASK = (_IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO
+                   | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, callback, parent=None):
+        """
+        Construction
+
+        :param callback:    Function called with (directory, name, is_created, is_dir) for every
+                            change.  Called with None for the directory if events were lost.
+        :param parent:      The parent QObject for this instance
+        :raises OSError:    If inotify isn't available
+        """
+        QtCore.QObject.__init__(self, parent)
+        self._callback = callback
+        self._watches = {}# path:watch descriptor
+        self._watch_paths = {}# watch descriptor:path
+
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(_InotifyBackend._IN_NONBLOCK | _InotifyBackend._IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        self._notifier = QtCore.QSocketNotifier(self._fd, QtCore.QSocketNotifier.Read, self)
+        self._notifier.activated.connect(self._on_activated)
+
+    def shut_down(self):
+        """
+        Stop watching all directories and release the inotify file descriptor
+        """
+        if self._fd < 0:
+            return
+        self._notifier.setEnabled(False)
+        self._notifier.activated.disconnect(self._on_activated)
+        os.close(self._fd)
+        self._fd = -1
+        self._watches = {}
+        self._watch_paths = {}
+
+    def set_directories(self, directories):
+        """
+        Set the directories to watch
+
+        :param directories: A set of directory paths
+        """
+        if self._fd < 0:
+            return
+
+        for path in set(self._watches) - directories:
+            wd = self._watches.pop(path)
+            self._watch_paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+        for path in directories - set(self._watches):
+            encoded_path = path.encode(sys.getfilesystemencoding()) if isinstance(path, unicode) else path
+            wd = self._libc.inotify_add_watch(self._fd, encoded_path, _InotifyBackend._WATCH_MASK)
+            if wd < 0:
+                # directory probably doesn't exist (yet) - it will be picked up the next time
+                # the directories are set:
+                continue
+            self._watches[path] = wd
+            self._watch_paths[wd] = path
+
+    def _on_activated(self, fd):
+        """
+        Slot triggered when there are events to read from the inotify file descriptor
+
+        :param fd:  The inotify file descriptor
+        """
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError, e:
+                if e.errno == errno.EINTR:
+                    continue
+                # EAGAIN - no more events to read:
+                break
+            if not data:
+                break
+            self._process_events(data)
+
+    def _process_events(self, data):
+        """
+        Parse a buffer of inotify events and report them through the callback
+
+        :param data:    The raw data read from the inotify file descriptor
+        """
+        header_size = _InotifyBackend._EVENT_HEADER.size
+        offset = 0
+        while offset + header_size <= len(data):
+            wd, mask, _, name_len = _InotifyBackend._EVENT_HEADER.unpack_from(data, offset)
+            offset += header_size
+            name = data[offset:offset + name_len].rstrip("\0")
+            offset += name_len
+
+            if mask & _InotifyBackend._IN_Q_OVERFLOW:
+                # events were lost so we can't trust incremental updates any more:
+                self._callback(None, None, False, False)
+                continue
+
+            directory = self._watch_paths.get(wd)
+            if directory is None:
+                continue
+
+            if mask & (_InotifyBackend._IN_IGNORED | _InotifyBackend._IN_DELETE_SELF
+                       | _InotifyBackend._IN_MOVE_SELF):
+                # the directory itself has gone away:
+                if mask & _InotifyBackend._IN_IGNORED:
+                    del self._watch_paths[wd]
+                    self._watches.pop(directory, None)
+                continue
+
+            is_dir = bool(mask & _InotifyBackend._IN_ISDIR)
+            if mask & (_InotifyBackend._IN_CREATE | _InotifyBackend._IN_MOVED_TO):
+                self._callback(directory, name, True, is_dir)
+            elif mask & (_InotifyBackend._IN_DELETE | _InotifyBackend._IN_MOVED_FROM):
+                self._callback(directory, name, False, is_dir)
+
+
+class _PollingBackend(QtCore.QObject):
+    """
+    Watches directories by periodically checking their modification time and comparing the
+    contents of any that have changed with the previous listing.  All file system access is
+    done in a background thread so that slow file systems (e.g. network shares) don't block
+    the main thread - any changes found are posted back to the main thread with a signal.
+    """
+
+    # Signal emitted from the polling thread with a list of (directory, name, is_created, is_dir)
+    # tuples whenever changes are found:
+    _changes_found = QtCore.Signal(object)
+
+    def __init__(self, callback, interval, parent=None):
+        """
+        Construction
+
+        :param callback:    Function called in the main thread with (directory, name, is_created, is_dir)
+                            for every change.
+        :param interval:    The interval in milliseconds between checks
+        :param parent:      The parent QObject for this instance
+        """
+        QtCore.QObject.__init__(self, parent)
+        self._callback = callback
+        self._interval = interval / 1000.0
+
+        # the directories to watch - shared with the polling thread so guarded by the lock:
+        self._lock = threading.Lock()
+        self._directories = set()
+        self._stopped = False
+        self._wake_event = threading.Event()
+        self._thread = None
+
+        self._changes_found.connect(self._on_changes_found, QtCore.Qt.QueuedConnection)
+
+    def shut_down(self):
+        """
+        Stop watching all directories.  The polling thread is not waited for as it may be blocked
+        on a slow file system - it will exit the next time it checks for changes.
+        """
+        with self._lock:
+            self._stopped = True
+            self._directories = set()
+        self._wake_event.set()
+        self._thread = None
+
+    def set_directories(self, directories):
+        """
+        Set the directories to watch
+
+        :param directories: A set of directory paths
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            new_directories = bool(directories - self._directories)
+            self._directories = set(directories)
+
+        if not self._thread and directories:
+            self._thread = threading.Thread(target=self._run, name="FileWatcherPolling")
+            self._thread.daemon = True
+            self._thread.start()
+        elif new_directories:
+            # wake up the polling thread so that the new directories are listed straight away:
+            self._wake_event.set()
+
+    def _on_changes_found(self, changes):
+        """
+        Slot triggered in the main thread when the polling thread has found changes
+
+        :param changes: A list of (directory, name, is_created, is_dir) tuples
+        """
+        if self._stopped:
+            return
+        for directory, name, is_created, is_dir in changes:
+            self._callback(directory, name, is_created, is_dir)
+
+    def _run(self):
+        """
+        Run the polling loop.  Runs in the polling thread.
+        """
+        # path:(mtime, set(names)) - only accessed by the polling thread:
+        listings = {}
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                directories = set(self._directories)
+
+            changes = []
+            current_listings = {}
+            for path in directories:
+                listing = listings.get(path)
+                if listing is None:
+                    # new directory so just record the current contents:
+                    current_listings[path] = self._list_dir(path)
+                else:
+                    current_listings[path] = self._check_dir(path, listing, changes)
+            listings = current_listings
+
+            if changes:
+                self._changes_found.emit(changes)
+
+            self._wake_event.wait(self._interval)
+            self._wake_event.clear()
+
+    def _check_dir(self, path, listing, changes):
+        """
+        Check a directory for changes since it was last listed.  Runs in the polling thread.
+
+        :param path:        The directory to check
+        :param listing:     Tuple containing (modification time, set of entry names) from the last listing
+        :param changes:     A list that any (directory, name, is_created, is_dir) changes are appended to
+        :returns:           Tuple containing the current (modification time, set of entry names)
+        """
+        mtime, names = listing
+        try:
+            current_mtime = os.stat(path).st_mtime
+        except OSError:
+            current_mtime = None
+        if current_mtime == mtime:
+            return listing
+
+        current_mtime, current_names = self._list_dir(path)
+        for name in current_names - names:
+            changes.append((path, name, True, os.path.isdir(os.path.join(path, name))))
+        for name in names - current_names:
+            # we can't tell if the entry was a directory any more:
+            changes.append((path, name, False, False))
+        return (current_mtime, current_names)
+
+    def _list_dir(self, path):
+        """
+        :param path:    The directory to list
+        :returns:       Tuple containing (modification time, set of entry names)
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+            return (mtime, set(os.listdir(path)))
+        except OSError:
+            return (None, set())
+
+
+class FileWatcher(QtCore.QObject):
+    """
+    Watches a set of directories and reports files that are created or deleted in them.  Changes
+    are batched up and reported together once the directories have been quiet for a short period
+    so that a file being saved only results in a single update.
+
+    On Linux, inotify is used to watch the directories.  On other platforms (or if inotify isn't
+    available) the directories can be polled in a background thread instead but this is only done
+    if polling is allowed as it can be expensive for a large number of directories on a network
+    file system.  Directories are not watched recursively.
+    """
+
+    # interval (ms) between checks when polling directories:
+    POLL_INTERVAL = 3000
+    # time (ms) to wait for further changes before reporting them:
+    SETTLE_INTERVAL = 250
+
+    # Signal emitted when files have been created or deleted in the watched directories
+    files_changed = QtCore.Signal(list, list)# created paths, deleted paths
+    # Signal emitted if changes may have been missed and the directories should be searched again
+    changes_lost = QtCore.Signal()
+
+    def __init__(self, allow_polling=False, parent=None):
+        """
+        Construction
+
+        :param allow_polling:   True if the directories should be polled when inotify isn't available,
+                                otherwise the directories won't be watched at all
+        :param parent:          The parent QObject for this instance
+        """
+        QtCore.QObject.__init__(self, parent)
+        self._app = sgtk.platform.current_bundle()
+
+        self._created = set()
+        self._deleted = set()
+        self._changes_lost = False
+
+        self._settle_timer = QtCore.QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.setInterval(FileWatcher.SETTLE_INTERVAL)
+        self._settle_timer.timeout.connect(self._emit_changes)
+
+        self._backend = None
+        if sys.platform.startswith("linux"):
+            try:
+                self._backend = _InotifyBackend(self._on_change, self)
+            except (OSError, AttributeError), e:
+                self._app.log_debug("Unable to use inotify to watch for file changes: %s" % e)
+        if not self._backend and allow_polling:
+            self._backend = _PollingBackend(self._on_change, FileWatcher.POLL_INTERVAL, self)
+
+    @property
+    def is_watching(self):
+        """
+        :returns:   True if the watcher is able to watch directories, otherwise False
+        """
+        return self._backend is not None
+
+    def shut_down(self):
+        """
+        Stop watching all directories.  This should be called when the watcher is no longer needed.
+        """
+        self._settle_timer.stop()
+        if self._backend:
+            self._backend.shut_down()
+            self._backend = None
+
+    def set_directories(self, directories):
+        """
+        Set the directories to watch.  Any directories currently being watched that aren't in the
+        list will no longer be watched.
+
+        :param directories: A list of directory paths to watch
+        """
+        if self._backend:
+            self._backend.set_directories(set(os.path.normpath(d) for d in directories if d))
+
+    def _on_change(self, directory, name, is_created, is_dir):
+        """
+        Called by the backend for every change detected.
+
+        :param directory:   The directory the change happened in or None if changes were lost
+        :param name:        The name of the entry that changed
+        :param is_created:  True if the entry was created, False if it was deleted
+        :param is_dir:      True if the entry is a directory
+        """
+        if directory is None:
+            self._changes_lost = True
+        elif not is_dir:
+            path = os.path.join(directory, name)
+            if is_created:
+                self._deleted.discard(path)
+                self._created.add(path)
+            else:
+                self._created.discard(path)
+                self._deleted.add(path)
+        else:
+            # directories aren't watched recursively so a new directory might contain files
+            # that we'll never hear about:
+            self._changes_lost = True
+
+        # (re)start the timer so that changes are only reported once things settle down:
+        self._settle_timer.start()
+
+    def _emit_changes(self):
+        """
+        Emit the changes that have been collected since they were last emitted
+        """
+        created = sorted(self._created)
+        deleted = sorted(self._deleted)
+        changes_lost = self._changes_lost
+        self._created = set()
+        self._deleted = set()
+        self._changes_lost = False
+
+        if changes_lost:
+            self.changes_lost.emit()
+        elif created or deleted:
+            self.files_changed.emit(created, deleted)
@@ -17,6 +17,8 @@ from sgtk.platform.qt import QtCore, QtGui
 
 shotgun_data = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_data")
 
+from .publish_fetcher import g_publish_fetcher
+
 class OpenOptionsForm(QtGui.QWidget):
     """
     UI for changing the version of the current work file
@@ -53,6 +55,8 @@ class OpenOptionsForm(QtGui.QWidget):
         self._mode = mode
         self._next_version = next_version
         self._publish_requires_copy = publish_requires_copy
+        self._sg_data_retriever = None
+        self._description_request_id = None
         
         # set up the UI
         from .ui.open_options_form import Ui_OpenOptionsForm
@@ -167,12 +171,10 @@ class OpenOptionsForm(QtGui.QWidget):
         self._ui.publish_frame.setToolTip(pf_tooltip_str)
         self._ui.publish_ro_frame.setToolTip("%s read-only" % pf_tooltip_str)
         
-        publish_details = ("<b>Version v%03d</b>" % self._publish_file.version)
-        publish_details += "<br>" + self._publish_file.format_published_by_details()
-        publish_details += "<br>"
-        publish_details += "<br><b>Description:</b>"
-        publish_details += "<br>" + self._publish_file.format_publish_description()
-        self._ui.publish_details.setText(publish_details)
+        # the description is loaded in the background if needed and the details are updated once
+        # it arrives:
+        self._update_publish_details()
+        self._load_publish_description()
         
         if self._publish_requires_copy:
             self._ui.publish_note.setText("<small>(Note: The published file will be copied to "
@@ -240,6 +242,71 @@ class OpenOptionsForm(QtGui.QWidget):
         finally:
             self._ui.verticalLayout.setEnabled(True)
         
+    def _update_publish_details(self):
+        """
+        Update the details shown for the publish file
+        """
+        publish_details = ("<b>Version v%03d</b>" % self._publish_file.version)
+        publish_details += "<br>" + self._publish_file.format_published_by_details()
+        publish_details += "<br>"
+        publish_details += "<br><b>Description:</b>"
+        publish_details += "<br>" + self._publish_file.format_publish_description()
+        self._ui.publish_details.setText(publish_details)
+
+    def _load_publish_description(self):
+        """
+        Start loading the description for the publish file in the background if it hasn't already
+        been loaded.
+        """
+        publish_ids = self._publish_file.get_unloaded_publish_description_ids()
+        if not publish_ids:
+            return
+
+        self._sg_data_retriever = shotgun_data.ShotgunDataRetriever(self)
+        self._sg_data_retriever.work_completed.connect(self._on_data_retriever_work_completed)
+        self._sg_data_retriever.work_failure.connect(self._on_data_retriever_work_failed)
+        self._sg_data_retriever.start()
+        self._description_request_id = self._sg_data_retriever.execute_method(g_publish_fetcher.get_descriptions,
+                                                                              publish_ids)
+
+    def _on_data_retriever_work_completed(self, uid, request_type, data):
+        """
+        Slot triggered when the data retriever has finished doing some work
+
+        :param uid:             The unique id of the completed request
+        :param request_type:    A string representing the type of request that has been completed
+        :param data:            The result from completing the work
+        """
+        if uid != self._description_request_id:
+            return
+        self._description_request_id = None
+        self._update_publish_details()
+
+    def _on_data_retriever_work_failed(self, uid, error_msg):
+        """
+        Slot triggered when the data retriever fails to do some work
+
+        :param uid:         The unique id of the failed request
+        :param error_msg:   The error message for the failed request
+        """
+        if uid != self._description_request_id:
+            return
+        self._description_request_id = None
+        self._app.log_debug("Failed to fetch the publish description: %s" % error_msg)
+
+    def closeEvent(self, event):
+        """
+        Called when the form is closed - stops any background work that's still running
+
+        :param event:   The close event
+        """
+        if self._sg_data_retriever:
+            self._sg_data_retriever.work_completed.disconnect(self._on_data_retriever_work_completed)
+            self._sg_data_retriever.work_failure.disconnect(self._on_data_retriever_work_failed)
+            self._sg_data_retriever.stop()
+            self._sg_data_retriever = None
+        QtGui.QWidget.closeEvent(self, event)
+
     def _exit(self, exit_code):
         self._exit_code = exit_code
         self.close()
@@ -0,0 +1,170 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Persistent on-disk cache of the publishes found for a set of Shotgun filters.
+"""
+
+import os
+import time
+import calendar
+import threading
+import cPickle
+import sqlite3
+from datetime import datetime
+
+import sgtk
+
+from .util import Threaded
+
+
+class PublishCache(Threaded):
+    """
+    SQLite backed cache of the publishes found for a set of filters, stored in the Toolkit cache
+    location.  Each entry stores the publish data in a compact form (plain dictionaries with all
+    date/times stored as timestamps) together with the latest time any of the publishes were
+    updated so that the publishes can be used straight away and then brought up-to-date by only
+    querying the changes.
+
+    Entries that haven't been updated for MAX_AGE_DAYS are removed and the cache never holds
+    more than MAX_ENTRIES entries.
+    """
+
+    # bump this if the format of the stored data changes:
+    _SCHEMA_VERSION = 1
+
+    # entries that haven't been updated for this many days are removed:
+    MAX_AGE_DAYS = 30
+    # the maximum number of entries to keep in the cache:
+    MAX_ENTRIES = 500
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._app = sgtk.platform.current_bundle()
+        self._db_path = os.path.join(self._app.cache_location, "publish_cache.db")
+        self._connection = None
+        self._disabled = False
+
+    @Threaded.exclusive
+    def load(self, key):
+        """
+        Load the publishes stored in the cache for the specified key
+
+        :param key: A string key that uniquely identifies the filters the publishes were found with
+        :returns:   Tuple containing (list of publish dictionaries, watermark timestamp) or None if there
+                    isn't a valid entry in the cache for the key
+        """
+        connection = self._get_connection()
+        if not connection:
+            return None
+
+        try:
+            row = connection.execute("SELECT publishes, watermark FROM publishes WHERE key = ?",
+                                     (key,)).fetchone()
+            if not row:
+                return None
+            return (cPickle.loads(str(row[0])), row[1])
+        except Exception, e:
+            # the cache is just an optimisation so don't fail if it can't be read:
+            self._app.log_debug("Failed to load publishes from the cache: %s" % e)
+            return None
+
+    @Threaded.exclusive
+    def store(self, key, publishes, watermark):
+        """
+        Store the publishes found for the specified key in the cache and remove any old entries
+
+        :param key:         A string key that uniquely identifies the filters the publishes were found with
+        :param publishes:   A list of publish dictionaries (or PublishRecords) to store
+        :param watermark:   The latest time any of the publishes were updated.  Can be None
+        """
+        connection = self._get_connection()
+        if not connection:
+            return
+
+        try:
+            now = time.time()
+            compact_publishes = [dict((field, self._to_timestamp(value)) for field, value in publish.iteritems())
+                                 for publish in publishes]
+            connection.execute("INSERT OR REPLACE INTO publishes (key, publishes, watermark, updated) "
+                               "VALUES (?, ?, ?, ?)",
+                               (key,
+                                sqlite3.Binary(cPickle.dumps(compact_publishes, cPickle.HIGHEST_PROTOCOL)),
+                                self._to_timestamp(watermark),
+                                now))
+            # prune entries that are too old or that don't fit in the cache:
+            connection.execute("DELETE FROM publishes WHERE updated < ?",
+                               (now - PublishCache.MAX_AGE_DAYS * 24 * 60 * 60,))
+            connection.execute("DELETE FROM publishes WHERE key NOT IN "
+                               "(SELECT key FROM publishes ORDER BY updated DESC LIMIT ?)",
+                               (PublishCache.MAX_ENTRIES,))
+            connection.commit()
+        except Exception, e:
+            self._app.log_debug("Failed to store publishes in the cache: %s" % e)
+
+    def _to_timestamp(self, value):
+        """
+        :param value:   A field value
+        :returns:       The value converted to a unix timestamp if it's a datetime, otherwise the value
+        """
+        if isinstance(value, datetime):
+            if value.tzinfo:
+                return calendar.timegm(value.utctimetuple())
+            return time.mktime(value.timetuple())
+        return value
+
+    def _get_connection(self):
+        """
+        Get the connection to the cache database, creating the database if needed.  Note, this
+        must be called with the lock acquired.
+
+        :returns:   A sqlite3 connection or None if the cache isn't available
+        """
+        if self._connection or self._disabled:
+            return self._connection
+
+        try:
+            cache_dir = os.path.dirname(self._db_path)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            connection = sqlite3.connect(self._db_path, check_same_thread=False)
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != PublishCache._SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS publishes")
+                connection.execute("PRAGMA user_version = %d" % PublishCache._SCHEMA_VERSION)
+            connection.execute("CREATE TABLE IF NOT EXISTS publishes "
+                               "(key TEXT PRIMARY KEY, publishes BLOB, watermark REAL, updated REAL)")
+            connection.commit()
+            self._connection = connection
+        except Exception, e:
+            self._app.log_debug("Publish cache '%s' is unavailable: %s" % (self._db_path, e))
+            self._disabled = True
+
+        return self._connection
+
+# single global instance of the publish cache - this is created the first time it's needed rather
+# than when the module is imported as it requires the current app:
+_g_publish_cache = None
+_g_publish_cache_lock = threading.Lock()
+
+def get_publish_cache():
+    """
+    Get the publish cache shared by all publish fetchers, creating it if needed.
+
+    :returns:   The PublishCache instance
+    """
+    global _g_publish_cache
+    with _g_publish_cache_lock:
+        if _g_publish_cache is None:
+            _g_publish_cache = PublishCache()
+        return _g_publish_cache
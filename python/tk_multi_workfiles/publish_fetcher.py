@@ -0,0 +1,372 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Fetches publishes from Shotgun a page at a time.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import sgtk
+from tank_vendor.shotgun_api3 import sg_timezone
+
+from .util import Threaded
+from .publish_record import PublishRecord
+from .publish_cache import get_publish_cache
+
+
+class PublishFetcher(Threaded):
+    """
+    Queries publishes from Shotgun in pages, only requesting the fields needed to list the files.
+    Fields that are only needed to show details about a single file (e.g. the description) are
+    fetched on demand and cached.  Failures to fetch descriptions are also cached for a short time
+    so that they aren't queried again every time they are needed.
+
+    The fetcher can also keep the publishes found for a set of filters in sync with Shotgun.  Once
+    the publishes have been found, subsequent syncs only query the publishes that have been created
+    or updated since the latest update seen (the watermark) and check that none have been removed.
+    Synced publishes are also stored in the on-disk publish cache so that they can be loaded and
+    brought up-to-date in the same way the next time the app is run.
+    """
+
+    # fields needed to list the publishes:
+    LIST_FIELDS = ["id", "version_number", "image", "created_at", "created_by", "name", "path", "task"]
+
+    # fields needed to keep the publishes in sync:
+    SYNC_FIELDS = LIST_FIELDS + ["updated_at"]
+
+    # number of publishes to request from Shotgun at a time:
+    PAGE_SIZE = 500
+
+    # publishes updated this close to the watermark are requested again in case more than one
+    # publish was updated at the same time:
+    WATERMARK_OVERLAP = timedelta(seconds=1)
+
+    # maximum number of sets of filters to keep publishes in sync for before they are reset:
+    MAX_SYNCED_FILTERS = 200
+
+    # maximum number of descriptions to keep in the cache before it's reset:
+    MAX_DESCRIPTIONS = 10000
+
+    # time (seconds) to wait before trying to fetch descriptions again after a failure:
+    DESCRIPTION_RETRY_INTERVAL = 60
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._descriptions = {}
+        # publish id:time of the last failure to fetch the description
+        self._description_failures = {}
+        # filters key:(dict {publish id:PublishRecord}, watermark)
+        self._synced = {}
+
+    def iter_pages(self, filters, fields=None, page_size=None):
+        """
+        Generator that queries the publishes matching the filters one page at a time.
+
+        :param filters:     The Shotgun filters to find the publishes with
+        :param fields:      The list of fields to return for each publish.  Defaults to LIST_FIELDS
+        :param page_size:   The number of publishes to return in each page.  Defaults to PAGE_SIZE
+        :returns:           A generator yielding a list of Shotgun entity dictionaries for each page
+        """
+        app = sgtk.platform.current_bundle()
+        published_file_type = sgtk.util.get_published_file_entity_type(app.sgtk)
+        fields = fields or PublishFetcher.LIST_FIELDS
+        page_size = page_size or PublishFetcher.PAGE_SIZE
+
+        page = 1
+        while True:
+            # order by id so that the pages are stable:
+            sg_publishes = app.shotgun.find(published_file_type, filters, fields,
+                                            order=[{"field_name":"id", "direction":"asc"}],
+                                            limit=page_size, page=page)
+            if sg_publishes:
+                yield sg_publishes
+            if len(sg_publishes) < page_size:
+                break
+            page += 1
+
+    def find(self, filters, fields=None):
+        """
+        Find all publishes matching the filters, requesting them a page at a time.
+
+        :param filters: The Shotgun filters to find the publishes with
+        :param fields:  The list of fields to return for each publish.  Defaults to LIST_FIELDS
+        :returns:       A list of Shotgun entity dictionaries
+        """
+        sg_publishes = []
+        for page in self.iter_pages(filters, fields):
+            sg_publishes.extend(page)
+        return sg_publishes
+
+    def get_descriptions(self, sg, publish_ids):
+        """
+        Get the descriptions for a list of publishes.  Any descriptions that haven't been fetched
+        before are queried from Shotgun with a single query.  The Shotgun connection is the first
+        argument so that this can be run by the ShotgunDataRetriever (see execute_method).
+
+        :param sg:          The Shotgun connection to query the descriptions with
+        :param publish_ids: A list of publish ids to get the descriptions for
+        :returns:           A dictionary {publish id:description}
+        """
+        publish_ids = set([publish_id for publish_id in publish_ids if publish_id])
+        descriptions, missing_ids = self._find_descriptions(publish_ids)
+        if not missing_ids:
+            return descriptions
+
+        app = sgtk.platform.current_bundle()
+        published_file_type = sgtk.util.get_published_file_entity_type(app.sgtk)
+        fetched_descriptions = dict([(publish_id, None) for publish_id in missing_ids])
+        try:
+            sg_publishes = sg.find(published_file_type, [["id", "in", list(missing_ids)]], ["description"])
+        except Exception, e:
+            app.log_debug("Failed to query publish descriptions: %s" % e)
+            self._add_description_failures(missing_ids)
+            return descriptions
+        for sg_publish in sg_publishes:
+            fetched_descriptions[sg_publish["id"]] = sg_publish.get("description")
+
+        self._add_descriptions(fetched_descriptions)
+        descriptions.update(fetched_descriptions)
+        return descriptions
+
+    @Threaded.exclusive
+    def get_cached_description(self, publish_id):
+        """
+        Get the description for a publish if it has already been fetched.  This doesn't query Shotgun.
+
+        :param publish_id:  The id of the publish to get the description for
+        :returns:           Tuple containing (True if the description has been fetched or recently failed
+                            to be fetched, the description or None)
+        """
+        if publish_id in self._descriptions:
+            return (True, self._descriptions[publish_id])
+        failed_at = self._description_failures.get(publish_id)
+        if failed_at is not None and time.time() - failed_at < PublishFetcher.DESCRIPTION_RETRY_INTERVAL:
+            return (True, None)
+        return (False, None)
+
+    def load_cached(self, filters):
+        """
+        Get the publishes from the last time the publishes for the filters were synced, loading them
+        from the on-disk publish cache if they haven't been synced since the app was started.  This
+        doesn't query Shotgun.
+
+        :param filters: The Shotgun filters the publishes were found with
+        :returns:       A list of PublishRecord instances or None if the publishes for the filters
+                        haven't been synced
+        """
+        entry = self._load_synced_entry(self._get_filters_key(filters))
+        if not entry:
+            return None
+        return entry[0].values()
+
+    def sync(self, filters, page_found_cb=None):
+        """
+        Bring the publishes for the filters up-to-date with Shotgun.  If they have been synced before
+        then only publishes that have changed since the last sync are queried.
+
+        :param filters:         The Shotgun filters to find the publishes with
+        :param page_found_cb:   Optional function called with the list of PublishRecord instances in each
+                                page as it's found when all publishes for the filters have to be found.
+                                This isn't called when only the changes since the last sync are queried
+        :returns:               Tuple containing (list of PublishRecord instances for all publishes that match
+                                the filters, True if the publishes changed since the last sync)
+        """
+        filters_key = self._get_filters_key(filters)
+        entry = self._load_synced_entry(filters_key)
+
+        if not entry or not entry[1]:
+            # find all publishes, passing each page on as it's found so that the first publishes can be
+            # used without waiting for all of them:
+            publishes = {}
+            for page in self.iter_pages(filters, PublishFetcher.SYNC_FIELDS):
+                records = [PublishRecord(sg_publish) for sg_publish in page]
+                for record in records:
+                    publishes[record["id"]] = record
+                if page_found_cb:
+                    page_found_cb(records)
+            watermark = self._get_watermark(publishes.values(), None)
+            self._set_synced_entry(filters_key, publishes, watermark)
+            get_publish_cache().store(repr(filters_key), publishes.values(), watermark)
+            return (publishes.values(), True)
+
+        publishes, watermark = dict(entry[0]), entry[1]
+        changed = False
+
+        # find any publishes created or updated since the watermark:
+        since = watermark - PublishFetcher.WATERMARK_OVERLAP
+        delta_filters = list(filters) + [{"filter_operator":"any",
+                                          "filters":[["updated_at", "greater_than", since],
+                                                     ["created_at", "greater_than", since]]}]
+        for sg_publish in self.find(delta_filters, PublishFetcher.SYNC_FIELDS):
+            record = PublishRecord(sg_publish)
+            previous = publishes.get(record["id"])
+            if (previous is None
+                or self._to_datetime(previous.get("updated_at")) != self._to_datetime(record.get("updated_at"))):
+                changed = True
+            publishes[record["id"]] = record
+
+        # check that no publishes have been removed, e.g. retired or moved to a different
+        # entity.  Counting them is cheap and only if the count differs are the ids queried:
+        if self._count(filters) != len(publishes):
+            current_ids = set([sg_publish["id"] for sg_publish in self.find(filters, ["id"])])
+            removed_ids = set(publishes.keys()) - current_ids
+            for publish_id in removed_ids:
+                del publishes[publish_id]
+            missing_ids = current_ids - set(publishes.keys())
+            if missing_ids:
+                for sg_publish in self.find([["id", "in", list(missing_ids)]], PublishFetcher.SYNC_FIELDS):
+                    publishes[sg_publish["id"]] = PublishRecord(sg_publish)
+            changed = changed or bool(removed_ids or missing_ids)
+
+        watermark = self._get_watermark(publishes.values(), watermark)
+        self._set_synced_entry(filters_key, publishes, watermark)
+        if changed or watermark != entry[1]:
+            get_publish_cache().store(repr(filters_key), publishes.values(), watermark)
+        return (publishes.values(), changed)
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Clear the cached descriptions and synced publishes
+        """
+        self._descriptions = {}
+        self._description_failures = {}
+        self._synced = {}
+
+    def _count(self, filters):
+        """
+        :param filters: The Shotgun filters to count the publishes for
+        :returns:       The number of publishes that match the filters
+        """
+        app = sgtk.platform.current_bundle()
+        published_file_type = sgtk.util.get_published_file_entity_type(app.sgtk)
+        result = app.shotgun.summarize(published_file_type, filters, [{"field":"id", "type":"count"}])
+        return result["summaries"]["id"]
+
+    def _get_watermark(self, publishes, watermark):
+        """
+        :param publishes:   A list of PublishRecord instances
+        :param watermark:   The current watermark or None
+        :returns:           The latest time any of the publishes were updated or the current watermark if
+                            that is later
+        """
+        for publish in publishes:
+            updated_at = self._to_datetime(publish.get("updated_at"))
+            if updated_at and (not watermark or updated_at > watermark):
+                watermark = updated_at
+        return watermark
+
+    def _to_datetime(self, value):
+        """
+        :param value:   A date/time value from Shotgun.  Publishes loaded from the publish cache store
+                        date/times as timestamps.
+        :returns:       The value as a datetime
+        """
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, sg_timezone.LocalTimezone())
+        return value
+
+    def _get_filters_key(self, filters):
+        """
+        :param filters: A list of Shotgun filters
+        :returns:       A hashable key for the filters
+        """
+        def make_hashable(value):
+            if isinstance(value, dict):
+                return tuple(sorted([(k, make_hashable(v)) for k, v in value.iteritems()]))
+            elif isinstance(value, (list, tuple)):
+                return tuple([make_hashable(v) for v in value])
+            return value
+        return make_hashable(filters)
+
+    def _load_synced_entry(self, filters_key):
+        """
+        :param filters_key: The key of the filters to get the synced publishes for
+        :returns:           Tuple containing ({publish id:PublishRecord}, watermark) or None.  If the
+                            publishes haven't been synced yet then they are loaded from the publish cache
+        """
+        entry = self._get_synced_entry(filters_key)
+        if entry:
+            return entry
+
+        cached = get_publish_cache().load(repr(filters_key))
+        if not cached:
+            return None
+        cached_publishes, watermark = cached
+        publishes = dict([(sg_publish["id"], PublishRecord(sg_publish)) for sg_publish in cached_publishes])
+        watermark = self._to_datetime(watermark)
+        self._set_synced_entry(filters_key, publishes, watermark)
+        return (publishes, watermark)
+
+    @Threaded.exclusive
+    def _get_synced_entry(self, filters_key):
+        """
+        :param filters_key: The key of the filters to get the synced publishes for
+        :returns:           Tuple containing ({publish id:PublishRecord}, watermark) or None
+        """
+        return self._synced.get(filters_key)
+
+    @Threaded.exclusive
+    def _set_synced_entry(self, filters_key, publishes, watermark):
+        """
+        :param filters_key: The key of the filters to set the synced publishes for
+        :param publishes:   A dictionary {publish id:PublishRecord}
+        :param watermark:   The latest time any of the publishes were updated
+        """
+        if filters_key not in self._synced and len(self._synced) >= PublishFetcher.MAX_SYNCED_FILTERS:
+            self._synced = {}
+        self._synced[filters_key] = (publishes, watermark)
+
+    @Threaded.exclusive
+    def _find_descriptions(self, publish_ids):
+        """
+        :param publish_ids: A set of publish ids to find the cached descriptions for
+        :returns:           Tuple containing ({publish id:description} for all cached descriptions,
+                            set of publish ids that aren't in the cache)
+        """
+        descriptions = {}
+        missing_ids = set()
+        for publish_id in publish_ids:
+            if publish_id in self._descriptions:
+                descriptions[publish_id] = self._descriptions[publish_id]
+            else:
+                missing_ids.add(publish_id)
+        return (descriptions, missing_ids)
+
+    @Threaded.exclusive
+    def _add_descriptions(self, descriptions):
+        """
+        :param descriptions:    A dictionary {publish id:description} to add to the cache
+        """
+        if len(self._descriptions) + len(descriptions) > PublishFetcher.MAX_DESCRIPTIONS:
+            self._descriptions = {}
+        self._descriptions.update(descriptions)
+        for publish_id in descriptions:
+            self._description_failures.pop(publish_id, None)
+
+    @Threaded.exclusive
+    def _add_description_failures(self, publish_ids):
+        """
+        :param publish_ids: The ids of the publishes whose descriptions failed to be fetched
+        """
+        if len(self._description_failures) + len(publish_ids) > PublishFetcher.MAX_DESCRIPTIONS:
+            self._description_failures = {}
+        failed_at = time.time()
+        for publish_id in publish_ids:
+            self._description_failures[publish_id] = failed_at
+
+
+# single global instance of the publish fetcher
+g_publish_fetcher = PublishFetcher()
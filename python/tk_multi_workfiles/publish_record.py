@@ -0,0 +1,87 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Immutable records used to share publish data between searches, users and tasks.
+"""
+
+from collections import Mapping
+
+
+class PublishRecord(Mapping):
+    """
+    Read-only view of the Shotgun data for a single publish.  Records are never modified so they
+    can be shared between all the users and background tasks of a search without being copied.
+    Fields that need to be changed are overridden in a new record that shares the original data.
+
+    Note, records are only shallowly immutable - the nested values (e.g. the task, created_by and
+    path dictionaries) are shared with the Shotgun data and every copy of the record so they must
+    be treated as read-only too.
+    """
+    __slots__ = ("_sg_data", "_overrides")
+
+    def __init__(self, sg_data, overrides=None):
+        """
+        Construction
+
+        :param sg_data:     The Shotgun entity dictionary for the publish.  The dictionary is copied
+                            so later changes to its fields won't affect the record but the nested
+                            values aren't.
+        :param overrides:   Optional dictionary of field values that override those in sg_data
+        """
+        self._sg_data = dict(sg_data)
+        self._overrides = overrides or {}
+
+    def replace(self, **fields):
+        """
+        Build a new record with the specified fields replaced.  The new record shares the
+        data of this record.
+
+        :param **fields:    The field values to replace
+        :returns:           A new PublishRecord instance
+        """
+        overrides = dict(self._overrides)
+        overrides.update(fields)
+        record = PublishRecord.__new__(PublishRecord)
+        record._sg_data = self._sg_data
+        record._overrides = overrides
+        return record
+
+    def __getitem__(self, key):
+        """
+        :param key:     The name of the field to return
+        :returns:       The value of the field
+        :raises KeyError: If the field doesn't exist
+        """
+        if key in self._overrides:
+            return self._overrides[key]
+        return self._sg_data[key]
+
+    def __iter__(self):
+        """
+        :returns:   An iterator over all field names in the record
+        """
+        for key in self._sg_data:
+            yield key
+        for key in self._overrides:
+            if key not in self._sg_data:
+                yield key
+
+    def __len__(self):
+        """
+        :returns:   The number of fields in the record
+        """
+        return len(self._sg_data) + len([k for k in self._overrides if k not in self._sg_data])
+
+    def __repr__(self):
+        """
+        :returns:   A string representation of the record
+        """
+        return "<PublishRecord %r>" % dict(self.iteritems())
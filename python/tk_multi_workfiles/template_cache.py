@@ -0,0 +1,209 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Memo layer for the template operations used when finding files.
+"""
+
+from collections import OrderedDict
+
+from sgtk import TankError
+
+from .util import Threaded, get_context_key, get_template_key
+
+
+class TemplateCache(Threaded):
+    """
+    Bounded, least-recently-used cache of the results of template operations (get_fields, validate,
+    apply_fields and Context.as_template_fields).  Results are keyed by the template (its name, root,
+    definition and key definitions) together with the path or fields so that they can be shared across
+    searches, refreshes and forms.
+    """
+
+    class _Failure(object):
+        """
+        Stored in place of a result when the template operation raised a TankError
+        """
+        def __init__(self, error):
+            """
+            Construction
+
+            :param error:   The TankError raised by the operation
+            """
+            self.message = str(error)
+
+    # maximum number of results to keep in the cache:
+    MAX_ENTRIES = 50000
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._entries = OrderedDict()
+        self._hits = {}
+        self._misses = {}
+
+    def get_fields(self, template, path):
+        """
+        Memoized version of template.get_fields(path)
+
+        :param template:    The template to extract the fields with
+        :param path:        The path to extract the fields from
+        :returns:           A new dictionary containing the fields extracted from the path
+        :raises TankError:  If the path doesn't match the template
+        """
+        key = ("get_fields", get_template_key(template), path)
+        found, result = self._lookup(key)
+        if not found:
+            try:
+                result = template.get_fields(path)
+            except TankError, e:
+                result = TemplateCache._Failure(e)
+            self._store(key, result)
+        return dict(self._check_result(result))
+
+    def validate(self, template, path):
+        """
+        Memoized version of template.validate(path)
+
+        :param template:    The template to validate the path against
+        :param path:        The path to validate
+        :returns:           True if the path matches the template, otherwise False
+        """
+        key = ("validate", get_template_key(template), path)
+        found, result = self._lookup(key)
+        if not found:
+            result = template.validate(path)
+            self._store(key, result)
+        return result
+
+    def apply_fields(self, template, fields):
+        """
+        Memoized version of template.apply_fields(fields)
+
+        :param template:    The template to apply the fields to
+        :param fields:      A dictionary of fields to apply
+        :returns:           The path built from the template and fields
+        :raises TankError:  If the fields can't be applied to the template
+        """
+        try:
+            key = ("apply_fields", get_template_key(template), frozenset(fields.iteritems()))
+            hash(key)
+        except TypeError:
+            # one of the field values isn't hashable so just apply the fields directly:
+            return template.apply_fields(fields)
+
+        found, result = self._lookup(key)
+        if not found:
+            try:
+                result = template.apply_fields(fields)
+            except TankError, e:
+                result = TemplateCache._Failure(e)
+            self._store(key, result)
+        return self._check_result(result)
+
+    def context_fields(self, context, template, validate=False):
+        """
+        Memoized version of context.as_template_fields(template, validate).  Only complete results
+        are cached - if the context fields can't all be resolved (typically because folders haven't
+        been created yet) then as_template_fields() either fails or, without validation, leaves out
+        the fields it couldn't resolve and the result is returned without being cached.  Because the
+        result depends on the folders that have been created, the cache should also be cleared
+        whenever the file system structure is created or synchronized.
+
+        :param context:     The context to get the template fields for
+        :param template:    The template to get the fields for
+        :param validate:    True if the fields should be validated
+        :returns:           A new dictionary containing the fields for the context
+        :raises TankError:  If validate is True and the fields couldn't be resolved
+        """
+        key = ("context_fields", get_template_key(template), get_context_key(context))
+        found, result = self._lookup(key)
+        if not found:
+            # the fields are always validated so that a partial result is never cached.  A validated
+            # result is the same as an unvalidated one when all the fields could be resolved:
+            try:
+                result = context.as_template_fields(template, validate=True)
+            except TankError:
+                if validate:
+                    raise
+                return context.as_template_fields(template, validate=False)
+            self._store(key, result)
+        return dict(result)
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Clear the cache.  The hit and miss counters are not reset.
+        """
+        self._entries = OrderedDict()
+
+    @Threaded.exclusive
+    def get_stats(self):
+        """
+        :returns:   A dictionary {operation:(hits, misses)} for all operations that have been
+                    performed through the cache
+        """
+        operations = set(self._hits.keys()) | set(self._misses.keys())
+        return dict([(op, (self._hits.get(op, 0), self._misses.get(op, 0))) for op in operations])
+
+    def format_stats(self):
+        """
+        :returns:   A string describing the hit rate for each operation
+        """
+        stats = []
+        for op, (hits, misses) in sorted(self.get_stats().iteritems()):
+            total = hits + misses
+            stats.append("%s: %d/%d hits (%d%%)" % (op, hits, total, (100 * hits / total) if total else 0))
+        return ", ".join(stats)
+
+    @Threaded.exclusive
+    def _lookup(self, key):
+        """
+        Look up a result in the cache, marking it as most recently used if found
+
+        :param key: The cache key to look up
+        :returns:   Tuple containing (found, result)
+        """
+        op = key[0]
+        if key not in self._entries:
+            self._misses[op] = self._misses.get(op, 0) + 1
+            return (False, None)
+        self._hits[op] = self._hits.get(op, 0) + 1
+        result = self._entries.pop(key)
+        self._entries[key] = result
+        return (True, result)
+
+    @Threaded.exclusive
+    def _store(self, key, result):
+        """
+        Store a result in the cache, discarding the least recently used results if the cache is full
+
+        :param key:     The cache key to store the result with
+        :param result:  The result to store
+        """
+        self._entries[key] = result
+        while len(self._entries) > TemplateCache.MAX_ENTRIES:
+            self._entries.popitem(last=False)
+
+    def _check_result(self, result):
+        """
+        :param result:      A result from the cache
+        :returns:           The result if it wasn't a failure
+        :raises TankError:  If the result was a failure
+        """
+        if isinstance(result, TemplateCache._Failure):
+            raise TankError(result.message)
+        return result
+
+
+# single global instance of the template cache
+g_template_cache = TemplateCache()
@@ -0,0 +1,344 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Patterns precomputed from templates that are used when processing found files.
+"""
+
+import os
+import re
+import threading
+import weakref
+
+from sgtk import TankError
+
+from .template_cache import g_template_cache
+from .file_scanner import build_glob_patterns
+
+
+class VersionlessNameFormatter(object):
+    """
+    Builds the 'versionless' name for a file from the fields extracted from its path.  The file name
+    part of the template definition is parsed once when the formatter is constructed so that building
+    a name is just a matter of formatting the fields.  Formatting doesn't modify any state so it's safe
+    to use from multiple threads at the same time.
+    """
+
+    # delimiters that are stripped from around the version when it's removed from the name:
+    _DELIMITERS = "_-. "
+
+    # placeholder used in place of the version when formatting the name:
+    _VERSION_MARKER = "\0"
+
+    # regex that splits a definition into literal text, {keys} and optional [sections]:
+    _TOKEN_RE = re.compile(r"(\{[^\}]+\}|\[|\])")
+
+    # template:VersionlessNameFormatter - weakly keyed so formatters are released along with
+    # the templates they were built for:
+    _formatters = weakref.WeakKeyDictionary()
+    _formatters_lock = threading.Lock()
+
+    @staticmethod
+    def get(template):
+        """
+        Get the formatter for the specified template.  Formatters are shared so this is the preferred
+        way to get a formatter.
+
+        :param template:    The template to get the formatter for
+        :returns:           A VersionlessNameFormatter instance
+        """
+        # note, WeakKeyDictionary isn't thread-safe so all access is done with the lock acquired:
+        with VersionlessNameFormatter._formatters_lock:
+            formatter = VersionlessNameFormatter._formatters.get(template)
+            if not formatter:
+                formatter = VersionlessNameFormatter(template)
+                VersionlessNameFormatter._formatters[template] = formatter
+        return formatter
+
+    def __init__(self, template):
+        """
+        Construction
+
+        :param template:    The template the formatter will build names for
+        """
+        # only hold a weak reference to the template so that it can be released from the registry:
+        self._template_ref = weakref.ref(template)
+
+        file_name_definition = os.path.basename(template.definition)
+        template_name, _ = os.path.splitext(file_name_definition)
+        self._version_in_name = "{version}" in template_name
+        self._tokens = None
+        self._version_key = None
+        if self._version_in_name:
+            self._version_key = template.keys["version"]
+            try:
+                self._tokens = self._parse(file_name_definition, template)
+            except ValueError:
+                # definition couldn't be parsed so names will be built by applying the fields instead
+                self._tokens = None
+
+    def get_name(self, path, fields):
+        """
+        Get the name to be used for the file - if possible this will return a 'versionless' name.
+
+        :param path:    The path of the file
+        :param fields:  The fields extracted from the path using the template
+        :returns:       The name for the file
+        """
+        if fields.get("name"):
+            # well, that was easy!
+            return fields["name"]
+
+        # extract the file name from the path:
+        name, _ = os.path.splitext(os.path.basename(path))
+        if not self._version_in_name:
+            return name
+
+        # build the file name with a marker in place of the version:
+        marked_name = None
+        if self._tokens is not None:
+            try:
+                marked_name = self._format(self._tokens, fields)
+            except (KeyError, TankError):
+                marked_name = None
+        if marked_name is not None:
+            marked_name, _ = os.path.splitext(marked_name)
+        if not marked_name or VersionlessNameFormatter._VERSION_MARKER not in marked_name:
+            return self._get_name_from_applied_fields(name, fields)
+
+        return self._remove_version(marked_name, VersionlessNameFormatter._VERSION_MARKER)
+
+    def _remove_version(self, name, version_str):
+        """
+        Remove the version from a file name
+
+        :param name:        The file name (without extension) containing the version string
+        :param version_str: The string that represents the version in the name
+        :returns:           The name with the version removed
+        """
+        delims_str = VersionlessNameFormatter._DELIMITERS
+        v_pos = name.find(version_str)
+        # remove any preceeding 'v'
+        pre_v_str = name[:v_pos].rstrip("v")
+        post_v_str = name[v_pos + len(version_str):]
+
+        if (pre_v_str and post_v_str
+            and pre_v_str[-1] in delims_str
+            and post_v_str[0] in delims_str):
+            # only want one delimiter - strip the second one:
+            post_v_str = post_v_str.lstrip(delims_str)
+
+        versionless_name = pre_v_str + post_v_str
+        versionless_name = versionless_name.strip(delims_str)
+        if versionless_name:
+            # great - lets use this!
+            return versionless_name
+
+        # likely that version is only thing in the name so instead, replace the
+        # version with #'s:
+        zero_version_str = self._version_key.str_from_value(0)
+        return name.replace(version_str, "#" * len(zero_version_str))
+
+    def _get_name_from_applied_fields(self, name, fields):
+        """
+        Fall back for building the name by applying the fields to the template with a dummy version
+        that can be found in the resulting name.
+
+        :param name:    The file name (without extension) extracted from the path
+        :param fields:  The fields extracted from the path using the template
+        :returns:       The name for the file
+        """
+        # find a dummy version whose string representation doesn't exist in the name string
+        dummy_version = 9876
+        while True:
+            test_str = self._version_key.str_from_value(dummy_version)
+            if test_str not in name:
+                break
+            dummy_version += 1
+
+        # now use this dummy version and rebuild the path
+        fields = dict(fields)
+        fields["version"] = dummy_version
+        path = self._template_ref().apply_fields(fields)
+        name, _ = os.path.splitext(os.path.basename(path))
+        return self._remove_version(name, self._version_key.str_from_value(dummy_version))
+
+    def _parse(self, definition, template):
+        """
+        Parse a template definition into a list of tokens.
+
+        :param definition:  The definition to parse
+        :param template:    The template the definition belongs to
+        :returns:           A list of tokens.  Each token is a tuple of ("text", str), ("key", TemplateKey)
+                            or ("optional", list of tokens)
+        :raises ValueError: If the definition contains unbalanced optional sections
+        """
+        stack = [[]]
+        for part in VersionlessNameFormatter._TOKEN_RE.split(definition):
+            if not part:
+                continue
+            if part == "[":
+                stack.append([])
+            elif part == "]":
+                if len(stack) < 2:
+                    raise ValueError("Unbalanced optional section in '%s'" % definition)
+                optional_tokens = stack.pop()
+                stack[-1].append(("optional", optional_tokens))
+            elif part.startswith("{"):
+                key_name = part[1:-1]
+                if key_name == "version":
+                    stack[-1].append(("version", None))
+                else:
+                    stack[-1].append(("key", template.keys[key_name]))
+            else:
+                stack[-1].append(("text", part))
+        if len(stack) != 1:
+            raise ValueError("Unbalanced optional section in '%s'" % definition)
+        return stack[0]
+
+    def _format(self, tokens, fields):
+        """
+        Format a list of tokens using the specified fields.
+
+        :param tokens:      The list of tokens to format
+        :param fields:      The fields to format the tokens with
+        :returns:           The formatted string with the version marker in place of the version
+        :raises KeyError:   If a required key is missing from the fields
+        """
+        formatted = []
+        for token_type, value in tokens:
+            if token_type == "text":
+                formatted.append(value)
+            elif token_type == "version":
+                formatted.append(VersionlessNameFormatter._VERSION_MARKER)
+            elif token_type == "key":
+                field_value = fields.get(value.name)
+                if field_value is None:
+                    if value.default is None:
+                        raise KeyError(value.name)
+                    field_value = value.default
+                formatted.append(value.str_from_value(field_value))
+            else:
+                # optional sections are only included if all of their keys have values:
+                try:
+                    formatted.append(self._format_optional(value, fields))
+                except KeyError:
+                    pass
+        return "".join(formatted)
+
+    def _format_optional(self, tokens, fields):
+        """
+        Format the tokens in an optional section.  All keys in the section must have a value for the
+        section to be included.
+
+        :param tokens:      The list of tokens in the optional section
+        :param fields:      The fields to format the tokens with
+        :returns:           The formatted string
+        :raises KeyError:   If any key in the section is missing from the fields
+        """
+        for token_type, value in tokens:
+            if token_type == "key" and fields.get(value.name) is None:
+                raise KeyError(value.name)
+            if token_type == "version" and fields.get("version") is None:
+                raise KeyError("version")
+        return self._format(tokens, fields)
+
+
+class TemplatePathMatcher(object):
+    """
+    Matches paths against a template, rejecting paths that can't possibly match (e.g. publishes from
+    other applications that live in unrelated directories) by checking the static text that every
+    matching path must start and end with before the template is used to extract the fields.  Fields
+    are extracted through the template cache so any later lookup of the fields for a matching path is
+    a cache hit.
+    """
+
+    # template:TemplatePathMatcher - weakly keyed so matchers are released along with the
+    # templates they were built for:
+    _matchers = weakref.WeakKeyDictionary()
+    _matchers_lock = threading.Lock()
+
+    @staticmethod
+    def get(template):
+        """
+        Get the matcher for the specified template.  Matchers are shared so this is the preferred
+        way to get a matcher.
+
+        :param template:    The template to get the matcher for
+        :returns:           A TemplatePathMatcher instance
+        """
+        # note, WeakKeyDictionary isn't thread-safe so all access is done with the lock acquired:
+        with TemplatePathMatcher._matchers_lock:
+            matcher = TemplatePathMatcher._matchers.get(template)
+            if not matcher:
+                matcher = TemplatePathMatcher(template)
+                TemplatePathMatcher._matchers[template] = matcher
+        return matcher
+
+    def __init__(self, template):
+        """
+        Construction
+
+        :param template:    The template the matcher will match paths against
+        """
+        # only hold a weak reference to the template so that it can be released from the registry:
+        self._template_ref = weakref.ref(template)
+
+        # find the static text before the first and after the last wildcard of the glob pattern
+        # for each combination of optional keys:
+        prefixes = set()
+        suffixes = set()
+        try:
+            patterns = build_glob_patterns(template, {}, template.keys.keys(), skip_missing_optional_keys=True)
+        except TankError:
+            patterns = set()
+        for pattern in patterns:
+            pattern = os.path.normcase(os.path.normpath(pattern))
+            magic_positions = [pos for pos in [pattern.find(c) for c in "*?["] if pos != -1]
+            if not magic_positions:
+                prefixes.add(pattern)
+                suffixes.add(pattern)
+                continue
+            prefixes.add(pattern[:min(magic_positions)])
+            last_magic_pos = max([pattern.rfind(c) for c in "*?]"])
+            suffixes.add(pattern[last_magic_pos + 1:])
+
+        # an empty prefix or suffix matches everything so there is no point in checking it:
+        self._prefixes = tuple(prefixes) if prefixes and "" not in prefixes else None
+        self._suffixes = tuple(suffixes) if suffixes and "" not in suffixes else None
+
+    def could_match(self, path):
+        """
+        Quick check to see if a path could match the template without extracting any fields.
+
+        :param path:    The path to check
+        :returns:       False if the path definitely doesn't match the template, otherwise True
+        """
+        path = os.path.normcase(path)
+        if self._prefixes and not path.startswith(self._prefixes):
+            return False
+        if self._suffixes and not path.endswith(self._suffixes):
+            return False
+        return True
+
+    def get_fields(self, path):
+        """
+        Get the fields for a path if it matches the template.
+
+        :param path:    The path to get the fields for
+        :returns:       A dictionary of the fields extracted from the path or None if the path doesn't
+                        match the template
+        """
+        if not self.could_match(path):
+            return None
+        try:
+            return g_template_cache.get_fields(self._template_ref(), path)
+        except TankError:
+            return None
@@ -13,6 +13,7 @@ Implementation of the user cache storing Shotgun user information
 """
 import os
 import sys
+import threading
 import sgtk
 
 from .util import Threaded
@@ -31,6 +32,10 @@ class UserCache(Threaded):
 
         self._user_details_by_login = {}
         self._user_details_by_id = {}
+        # login:threading.Event for logins currently being looked up in Shotgun
+        self._pending_logins = {}
+        # file owner uid:login name
+        self._login_by_uid = {}
 
         self._sg_fields = ["id", "type", "email", "login", "name", "image"]
 
@@ -48,7 +53,7 @@ class UserCache(Threaded):
         :param user_id: The entity id of the user whose details should be returned
         :returns:       A Shotgun entity dictionary for the user if found, otherwise {}
         """
-        return self.get_user_details_for_ids([user_id]).get(id)
+        return self.get_user_details_for_ids([user_id]).get(user_id)
 
     def get_user_details_for_ids(self, ids):
         """
@@ -77,10 +82,14 @@ class UserCache(Threaded):
         if users_to_fetch:
             # get user details from shotgun:
             sg_users = []
+            query_succeeded = False
             try:
                 sg_users = self._app.shotgun.find("HumanUser", [["id", "in"] + list(users_to_fetch)], self._sg_fields)
-            except:
-                sg_users = []
+                query_succeeded = True
+            except Exception, e:
+                # this isn't critical so just log as debug
+                self._app.log_debug("Failed to retrieve Shotgun users for ids %s: %s"
+                                    % (", ".join([str(user_id) for user_id in sorted(users_to_fetch)]), e))
 
             # add found users to look-ups:
             users_found = set()
@@ -93,22 +102,26 @@ class UserCache(Threaded):
 
                 user_details[user_id] = sg_user
 
-            # and fill in any blanks so we don't bother searching again:
+            # and fill in any blanks so we don't bother searching again.  If the query failed then
+            # the users will be looked for again next time:
             for user_id in users_to_fetch:
                 if user_id not in users_found:
-                    # store empty dictionary to differentiate from 'None'
-                    self._cache_user(None, user_id, {})
+                    if query_succeeded:
+                        # store empty dictionary to differentiate from 'None'
+                        self._cache_user(None, user_id, {})
                     user_details[user_id] = {}
 
         return user_details
 
-    def get_file_last_modified_user(self, path):
+    def get_file_last_modified_user(self, path, stat_result=None):
         """
         Get the user details of the last person to modify the specified file.  Note, this currently
         doesn't work on Windows as Windows doesn't provide this information as standard
 
-        :param path:    The path to find the last modified user for
-        :returns:       A  Shotgun entity dictionary for the HumanUser that last modified the path
+        :param path:        The path to find the last modified user for
+        :param stat_result: The result of os.stat() for the path if it's already available.  If
+                            this is None then the path will be stat'd.
+        :returns:           A  Shotgun entity dictionary for the HumanUser that last modified the path
         """
 
         login_name = None
@@ -117,8 +130,8 @@ class UserCache(Threaded):
             pass
         else:
             try:
-                from pwd import getpwuid
-                login_name = getpwuid(os.stat(path).st_uid).pw_name
+                stat_result = stat_result or os.stat(path)
+                login_name = self._get_login_for_uid(stat_result.st_uid)
             except:
                 pass
 
@@ -128,6 +141,72 @@ class UserCache(Threaded):
 
         return None
 
+    def cache_file_owners(self, stat_results):
+        """
+        Look up the Shotgun users for the owners of a set of files in one go so that subsequent calls
+        to get_file_last_modified_user() for the files don't need to query Shotgun.
+
+        :param stat_results:    A list of os.stat() results for the files.  Any None entries are ignored.
+        """
+        if sys.platform == "win32":
+            # file owners aren't supported on Windows (see get_file_last_modified_user)
+            return
+
+        logins = set()
+        for stat_result in stat_results:
+            if not stat_result:
+                continue
+            login_name = self._get_login_for_uid(stat_result.st_uid)
+            if login_name:
+                logins.add(login_name)
+        self.get_user_details_for_logins(logins)
+
+    def get_user_details_for_logins(self, logins):
+        """
+        Get the user details for all users represented by the list of supplied logins.  Logins that haven't
+        been looked up before are found using a single Shotgun query.  If another thread is already looking
+        up a login then this will wait for that to complete rather than querying Shotgun again.
+
+        :param logins:  The logins of the users whose details should be returned
+        :returns:       A dictionary of login->Shotgun entity dictionary containing one entry
+                        for each user requested.  An empty dictionary will be returned for users
+                        that couldn't be found!
+        """
+        user_details, logins_to_fetch, pending_lookups = self._claim_logins(logins)
+
+        if logins_to_fetch:
+            try:
+                sg_users = []
+                query_succeeded = False
+                try:
+                    sg_users = self._app.shotgun.find("HumanUser", [["login", "in", list(logins_to_fetch)]],
+                                                      self._sg_fields)
+                    query_succeeded = True
+                except Exception, e:
+                    # this isn't critical so just log as debug
+                    self._app.log_debug("Failed to retrieve Shotgun users for logins %s: %s"
+                                        % (", ".join(sorted(logins_to_fetch)), e))
+
+                sg_users_by_login = dict([(sg_user.get("login"), sg_user) for sg_user in sg_users])
+                for login in logins_to_fetch:
+                    # cache the sg user so we don't have to look for it again.  Store an empty
+                    # dictionary for users that weren't found to differentiate from 'None' but
+                    # only if the query succeeded so that they are looked for again next time:
+                    sg_user = sg_users_by_login.get(login) or {}
+                    if sg_user or query_succeeded:
+                        self._cache_user(login, sg_user.get("id"), sg_user)
+                    user_details[login] = sg_user
+            finally:
+                # let any other threads waiting for these logins continue:
+                self._release_logins(logins_to_fetch)
+
+        # collect the users that were being looked up by other threads:
+        for login, lookup_done in pending_lookups.iteritems():
+            lookup_done.wait()
+            user_details[login] = self._get_user_for_login(login) or {}
+
+        return user_details
+
     def _get_user_details_for_login(self, login_name):
         """
         Get the shotgun HumanUser entry for the specified login name
@@ -135,22 +214,64 @@ class UserCache(Threaded):
         :param login_name:  The login name of the user to find
         :returns:           A Shotgun entity dictionary for the HumanUser entity found
         """
-        # first look to see if we've already found the user:
-        sg_user = self._get_user_for_login(login_name)
-        if not sg_user:
-            # have to do a Shotgun lookup:
+        return self.get_user_details_for_logins([login_name]).get(login_name)
+
+    def _get_login_for_uid(self, uid):
+        """
+        Get the login name for the specified file owner uid.  Login names are remembered so that
+        each uid is only looked up once.
+
+        :param uid: The uid to find the login name for
+        :returns:   The login name for the uid or None if it couldn't be found
+        """
+        login_name = self._login_by_uid.get(uid)
+        if login_name is None:
             try:
-                sg_user = self._app.shotgun.find_one("HumanUser", [["login", "is", login_name]], self._sg_fields)
-                # handle sg_user being None
-                sg_user = sg_user or {}
-            except Exception, e:
-                # this isn't critical so just log as debug
-                self._app.log_debug("Failed to retrieve Shotgun user for login '%s': %s" % (login_name, e))
+                from pwd import getpwuid
+                login_name = getpwuid(uid).pw_name
+            except:
+                login_name = ""
+            # note, dictionary assignment is atomic so the lock isn't needed here:
+            self._login_by_uid[uid] = login_name
+        return login_name or None
 
-            # cache the sg user so we don't have to look for it again
-            self._cache_user(login_name, sg_user.get("id"), sg_user)
+    @Threaded.exclusive
+    def _claim_logins(self, logins):
+        """
+        Thread-safe mechanism to find the cached details for a list of logins and claim any that
+        need looking up in Shotgun.  Claimed logins must be released by calling _release_logins().
+
+        :param logins:  The logins to find the users for
+        :returns:       Tuple containing (login->details for cached users, set of logins claimed
+                        by this thread, login->threading.Event for logins being looked up by other
+                        threads)
+        """
+        user_details = {}
+        logins_to_fetch = set()
+        pending_lookups = {}
+        for login in set(logins):
+            details = self._user_details_by_login.get(login)
+            if details is not None:
+                user_details[login] = details
+            elif login in self._pending_logins:
+                pending_lookups[login] = self._pending_logins[login]
+            else:
+                self._pending_logins[login] = threading.Event()
+                logins_to_fetch.add(login)
+        return (user_details, logins_to_fetch, pending_lookups)
 
-        return sg_user
+    @Threaded.exclusive
+    def _release_logins(self, logins):
+        """
+        Thread-safe mechanism to release logins claimed by _claim_logins() once they have been
+        looked up.
+
+        :param logins:  The logins to release
+        """
+        for login in logins:
+            lookup_done = self._pending_logins.pop(login, None)
+            if lookup_done:
+                lookup_done.set()
 
     @Threaded.exclusive
     def _get_user_for_id(self, user_id):
@@ -12,6 +12,7 @@
 Various utility methods used by the app code
 """
 import threading
+import weakref
 
 import sgtk
 from sgtk.platform.qt import QtCore, QtGui
@@ -59,6 +60,134 @@ class Threaded(object):
 
         return wrapper
 
+
+class ReadWriteLock(object):
+    """
+    Lock that allows any number of readers to hold it at the same time but gives writers exclusive
+    access.  Waiting writers are given preference over new readers so that a steady stream of
+    readers can't starve them.
+    """
+    def __init__(self):
+        """
+        Construction
+        """
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writing = False
+
+    def acquire_read(self):
+        """
+        Acquire the lock for reading, blocking whilst a writer holds or is waiting for the lock
+        """
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        """
+        Release the lock after reading
+        """
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        """
+        Acquire the lock for writing, blocking until all readers and any other writer have released it
+        """
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                while self._writing or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+
+    def release_write(self):
+        """
+        Release the lock after writing
+        """
+        with self._condition:
+            self._writing = False
+            self._condition.notify_all()
+
+
+class RWThreaded(object):
+    """
+    Equivalent of the Threaded base class that contains a ReadWriteLock member together with
+    'reader' and 'writer' function decorators.  Methods decorated with 'reader' can run at the same
+    time as each other whilst methods decorated with 'writer' have exclusive access.
+    """
+    def __init__(self):
+        """
+        Construction
+        """
+        self._rw_lock = ReadWriteLock()
+
+    @staticmethod
+    def reader(func):
+        """
+        Static method intended to be used as a function decorator in derived classes for methods
+        that only read shared state:
+
+            @RWThreaded.reader
+            def my_method(self, ...):
+                ...
+
+        :param func:    Function to decorate/wrap
+        :returns:       Wrapper function that executes the function with the lock acquired for reading
+        """
+        def wrapper(self, *args, **kwargs):
+            """
+            Internal wrapper method that executes the function with the specified arguments
+            with the lock acquired for reading
+
+            :param *args:       The function parameters
+            :param **kwargs:    The function named parameters
+            :returns:           The result of the function call
+            """
+            self._rw_lock.acquire_read()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self._rw_lock.release_read()
+
+        return wrapper
+
+    @staticmethod
+    def writer(func):
+        """
+        Static method intended to be used as a function decorator in derived classes for methods
+        that modify shared state:
+
+            @RWThreaded.writer
+            def my_method(self, ...):
+                ...
+
+        :param func:    Function to decorate/wrap
+        :returns:       Wrapper function that executes the function with the lock acquired for writing
+        """
+        def wrapper(self, *args, **kwargs):
+            """
+            Internal wrapper method that executes the function with the specified arguments
+            with the lock acquired for writing
+
+            :param *args:       The function parameters
+            :param **kwargs:    The function named parameters
+            :returns:           The result of the function call
+            """
+            self._rw_lock.acquire_write()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self._rw_lock.release_write()
+
+        return wrapper
+
 def value_to_str(value):
     """
     Safely convert the value to a string - handles QtCore.QString if usign PyQt
@@ -261,3 +390,58 @@ def get_template_user_keys(template):
         if key.shotgun_entity_type == "HumanUser":
             user_keys.add(key.name)
     return user_keys
+
+def get_context_key(context):
+    """
+    Builds a hashable key that identifies a context by the entities it contains.
+
+    :param context: The context to build a key for.  Can be None.
+    :returns:       A tuple of (type, id) pairs for the entities in the context.
+    """
+    if not context:
+        return None
+
+    def entity_key(entity):
+        return (entity.get("type"), entity.get("id")) if entity else None
+
+    return (entity_key(context.project),
+            entity_key(context.entity),
+            entity_key(context.step),
+            entity_key(context.task),
+            entity_key(context.user),
+            tuple([entity_key(e) for e in context.additional_entities or []]))
+
+# the template key attributes that affect how fields are extracted from or applied to paths:
+_TEMPLATE_KEY_ATTRS = ("default", "choices", "exclusions", "length", "format_spec", "strict_matching",
+                       "filter_by", "subset", "subset_format", "shotgun_entity_type", "shotgun_field_name",
+                       "is_abstract")
+
+# template:key built by get_template_key().  Note, WeakKeyDictionary isn't thread-safe so all access
+# is done with the lock acquired:
+_g_template_keys = weakref.WeakKeyDictionary()
+_g_template_keys_lock = threading.Lock()
+
+def get_template_key(template):
+    """
+    Builds a hashable key that identifies a template.  The definition alone isn't enough as templates
+    with the same definition may belong to different storage roots or use keys that are defined
+    differently (e.g. a different format for the version).  The key is built once for each template.
+
+    :param template:    The template to build a key for.
+    :returns:           A tuple of (name, root path, definition, key definitions) for the template.
+    """
+    with _g_template_keys_lock:
+        template_key = _g_template_keys.get(template)
+    if template_key is not None:
+        return template_key
+
+    key_definitions = []
+    for name, key in sorted(template.keys.iteritems()):
+        key_definitions.append((name, type(key).__name__)
+                               + tuple([repr(getattr(key, attr, None)) for attr in _TEMPLATE_KEY_ATTRS]))
+    template_key = (template.name, getattr(template, "root_path", None), template.definition,
+                    tuple(key_definitions))
+
+    with _g_template_keys_lock:
+        _g_template_keys[template] = template_key
+    return template_key
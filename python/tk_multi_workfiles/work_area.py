@@ -13,11 +13,15 @@ Environment and context abstraction.
 """
 
 import copy
+from collections import OrderedDict
+
 import sgtk
 from sgtk import TankError
 
 from .user_cache import g_user_cache
-from .util import Threaded, get_template_user_keys
+from .file_item import FileKeyBuilder
+from .context_cache import g_context_cache
+from .util import Threaded, get_template_user_keys, get_context_key
 
 
 class WorkArea(object):
@@ -31,39 +35,49 @@ class WorkArea(object):
 
     class _SettingsCache(Threaded):
         """
-        Cache of settings per context.
+        Bounded, least-recently-used cache of the settings and templates resolved for the app.  All
+        contexts that pick the same environment share the same settings, so entries are keyed by the
+        environment together with the engine and app instance rather than by context.  The cache is
+        shared by all work areas so the settings are only resolved once per environment for the
+        lifetime of the app, not for every task or dialog.
         """
 
+        # maximum number of entries to keep in the cache:
+        MAX_ENTRIES = 1000
+
         def __init__(self):
             """
             Constructor.
             """
             Threaded.__init__(self)
-            self._cache = []
+            self._entries = OrderedDict()
 
         @Threaded.exclusive
-        def get(self, context):
+        def get(self, key):
             """
-            Retrieve the cached settings for a given context.
+            Retrieve a cached entry, marking it as the most recently used.
 
-            :param context: The context for which we desire settings.
+            :param key: The hashable key of the entry.
 
-            :returns: The settings dictionary or None
+            :returns: Tuple containing (found, value)
             """
-            for ctx, settings in self._cache:
-                if ctx == context:
-                    return settings
-            return None
+            if key not in self._entries:
+                return (False, None)
+            value = self._entries.pop(key)
+            self._entries[key] = value
+            return (True, value)
 
         @Threaded.exclusive
-        def add(self, context, settings):
+        def add(self, key, value):
             """
-            Cache settings for a given context.
+            Cache an entry, discarding the least recently used entries if the cache is full.
 
-            :param context: Context for which these settings need to be cached.
-            :param settings: Settings to cache.
+            :param key: The hashable key of the entry.
+            :param value: The value to cache.
             """
-            self._cache.append((context, copy.deepcopy(settings)))
+            self._entries[key] = value
+            while len(self._entries) > WorkArea._SettingsCache.MAX_ENTRIES:
+                self._entries.popitem(last=False)
 
     _settings_cache = _SettingsCache()
 
@@ -271,6 +285,18 @@ class WorkArea(object):
         self._work_template_contains_user = self.work_template and bool(get_template_user_keys(self.work_template))
         self._publish_template_contains_user = self.publish_template and bool(get_template_user_keys(self.publish_template))
 
+    def get_file_key_builder(self, template=None):
+        """
+        Get the builder used to construct file keys for files in this work area.
+
+        :param template:    The template the file fields were extracted with.  If None then the
+                            work template is used.
+        :returns:           A FileKeyBuilder instance that ignores the version compare ignore fields
+                            for this work area.  Builders are shared (see FileKeyBuilder.get()) so this
+                            always reflects the current settings.
+        """
+        return FileKeyBuilder.get(template or self.work_template, self.version_compare_ignore_fields)
+
     def get_missing_templates(self):
         """
         Asserts that all the templates are configured.
@@ -322,7 +348,14 @@ class WorkArea(object):
                 resolved_settings[key] = app.get_setting(key)
 
         else:
-            # need to look for settings in a different context/environment
+            # need to look for settings in a different context/environment.  Resolved settings
+            # are shared by all contexts that use the same environment:
+            cache_key = ("resolved_settings", self._get_settings_key(app, context),
+                         tuple(templates_to_find), tuple(settings_to_find))
+            found, cached_settings = WorkArea._settings_cache.get(cache_key)
+            if found:
+                return self._copy_resolved_settings(cached_settings)
+
             settings = self._get_raw_app_settings_for_context(app, context)
             if settings:
                 # get templates:
@@ -333,8 +366,49 @@ class WorkArea(object):
                 for key in settings_to_find:
                     resolved_settings[key] = app.get_setting_from(settings, key)
 
+            WorkArea._settings_cache.add(cache_key, self._copy_resolved_settings(resolved_settings))
+
         return resolved_settings
 
+    def _copy_resolved_settings(self, resolved_settings):
+        """
+        Copy resolved settings so that the cached settings can't be modified.  Templates are shared
+        rather than copied.
+
+        :param resolved_settings: A dictionary of resolved settings and templates.
+
+        :returns: A copy of the dictionary.
+        """
+        return dict((key, copy.deepcopy(value) if isinstance(value, (list, dict)) else value)
+                    for key, value in resolved_settings.iteritems())
+
+    def _get_settings_key(self, app, context):
+        """
+        Get the key used to cache the settings for a context.  This identifies the environment the
+        settings are found in for the context together with the engine and app instance.  The
+        environment picked for each context is also cached.
+
+        :param app: Application instance
+        :param context: Context to get the key for.
+
+        :returns: A hashable key.
+        """
+        context_key = ("environment", get_context_key(context))
+        found, env_key = WorkArea._settings_cache.get(context_key)
+        if not found:
+            try:
+                # this is the same hook used by sgtk.platform.find_app_settings() to pick the
+                # environment for the context:
+                env_name = app.sgtk.execute_core_hook("pick_environment", context=context)
+                env_key = (app.sgtk.pipeline_configuration.get_path(), env_name)
+            except Exception, e:
+                # fall back to keying the settings by the context:
+                app.log_debug("Failed to pick the environment for context %s: %s" % (context, e))
+                env_key = context_key
+            WorkArea._settings_cache.add(context_key, env_key)
+
+        return (env_key, app.engine.instance_name, app.instance_name)
+
     def _get_raw_app_settings_for_context(self, app, context):
         """
         Find settings for the app in the specified context
@@ -351,9 +425,10 @@ class WorkArea(object):
             return
 
         # first look in the cache:
-        app_settings = WorkArea._settings_cache.get(context)
+        cache_key = ("raw_settings", self._get_settings_key(app, context))
+        found, app_settings = WorkArea._settings_cache.get(cache_key)
 
-        if app_settings is None:
+        if not found:
             try:
                 # find settings for all instances of app in the environment picked for the given context:
                 app_settings = sgtk.platform.find_app_settings(
@@ -361,7 +436,7 @@ class WorkArea(object):
                 )
             finally:
                 # Ignore any errors while looking for the settings
-                WorkArea._settings_cache.add(context, app_settings or {})
+                WorkArea._settings_cache.add(cache_key, copy.deepcopy(app_settings or {}))
 
         # No settings found, do nothing.
         if not app_settings:
@@ -453,14 +528,12 @@ class WorkArea(object):
         app = sgtk.platform.current_bundle()
         paths = app.sgtk.paths_from_template(search_template, ctx_fields, user_keys)
 
-        # split out users from the list of paths:
+        # split out users from the list of paths.  To find the user, we have to construct a context
+        # from the path and then inspect the user from this:
         user_ids = set()
-        for path in paths:
-            # to find the user, we have to construct a context
-            # from the path and then inspect the user from this
-            path_ctx = app.sgtk.context_from_path(path)
-            user = path_ctx.user
-            if user: 
+        for path_ctx in g_context_cache.resolve_directories(paths).values():
+            user = path_ctx.user if path_ctx else None
+            if user:
                 user_ids.add(user["id"])
 
         # look these up in the user cache:
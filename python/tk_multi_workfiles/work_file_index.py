@@ -0,0 +1,182 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Persistent on-disk index of the work files found for a work area.
+"""
+
+import os
+import time
+import threading
+import cPickle
+import sqlite3
+
+import sgtk
+
+from .util import Threaded, get_template_key
+
+
+class WorkFileIndex(Threaded):
+    """
+    SQLite backed index of processed work files stored in the Toolkit cache location.  Each entry
+    is keyed by the work template, context fields, user and file settings it was found for and
+    stores the modification time of every directory that was looked at together with the
+    modification time of every file that was found.  This allows the index to be used straight
+    away and then revalidated by only checking the directories and re-using the details of any
+    files that haven't changed.
+
+    Entries that haven't been updated for MAX_AGE_DAYS are removed and the index never holds
+    more than MAX_ENTRIES entries.
+    """
+
+    # bump this if the format of the stored data changes:
+    _SCHEMA_VERSION = 2
+
+    # entries that haven't been updated for this many days are removed:
+    MAX_AGE_DAYS = 30
+    # the maximum number of entries to keep in the index:
+    MAX_ENTRIES = 500
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._app = sgtk.platform.current_bundle()
+        self._db_path = os.path.join(self._app.cache_location, "work_file_index.db")
+        self._connection = None
+        self._disabled = False
+
+    @staticmethod
+    def make_key(work_template, context_fields, user, valid_file_extensions, version_compare_ignore_fields):
+        """
+        Build the index key for a work area.
+
+        :param work_template:                   The work template the files were found with
+        :param context_fields:                  The fields resolved from the work area context for the work
+                                                template
+        :param user:                            The Shotgun user dictionary the files were found for.  Can
+                                                be None
+        :param valid_file_extensions:           The list of file extensions the work files were filtered by
+        :param version_compare_ignore_fields:   The list of fields ignored when the file keys were built
+        :returns:                               A string key that uniquely identifies the work area in the
+                                                index
+        """
+        key_parts = (get_template_key(work_template),
+                     tuple(sorted(context_fields.iteritems())),
+                     user["id"] if user else None,
+                     tuple(sorted(valid_file_extensions or [])),
+                     tuple(sorted(version_compare_ignore_fields or [])))
+        return repr(key_parts)
+
+    @Threaded.exclusive
+    def load(self, key):
+        """
+        Load the work files stored in the index for the specified key
+
+        :param key: The index key as returned by make_key()
+        :returns:   Tuple containing (work items, directory modification times, file modification times)
+                    or None if there isn't a valid entry in the index for the key
+        """
+        connection = self._get_connection()
+        if not connection:
+            return None
+
+        try:
+            row = connection.execute("SELECT work_items, directories, files FROM work_files WHERE key = ?",
+                                     (key,)).fetchone()
+            if not row:
+                return None
+            return (cPickle.loads(str(row[0])), cPickle.loads(str(row[1])), cPickle.loads(str(row[2])))
+        except Exception, e:
+            # the index is just an optimisation so don't fail if it can't be read:
+            self._app.log_debug("Failed to load work files from the index: %s" % e)
+            return None
+
+    @Threaded.exclusive
+    def store(self, key, work_items, dir_mtimes, file_mtimes):
+        """
+        Store the work files found for the specified key in the index and remove any old entries
+
+        :param key:         The index key as returned by make_key()
+        :param work_items:  The dictionary of processed work items to store
+        :param dir_mtimes:  A dictionary {path:mtime} of all directories that were looked at when the
+                            work files were found
+        :param file_mtimes: A dictionary {path:mtime} of all files that were found, including any that
+                            were filtered out by the filter_work_files hook
+        """
+        connection = self._get_connection()
+        if not connection:
+            return
+
+        try:
+            now = time.time()
+            connection.execute("INSERT OR REPLACE INTO work_files (key, work_items, directories, files, updated) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               (key,
+                                sqlite3.Binary(cPickle.dumps(work_items, cPickle.HIGHEST_PROTOCOL)),
+                                sqlite3.Binary(cPickle.dumps(dir_mtimes, cPickle.HIGHEST_PROTOCOL)),
+                                sqlite3.Binary(cPickle.dumps(file_mtimes, cPickle.HIGHEST_PROTOCOL)),
+                                now))
+            # prune entries that are too old or that don't fit in the index:
+            connection.execute("DELETE FROM work_files WHERE updated < ?",
+                               (now - WorkFileIndex.MAX_AGE_DAYS * 24 * 60 * 60,))
+            connection.execute("DELETE FROM work_files WHERE key NOT IN "
+                               "(SELECT key FROM work_files ORDER BY updated DESC LIMIT ?)",
+                               (WorkFileIndex.MAX_ENTRIES,))
+            connection.commit()
+        except Exception, e:
+            self._app.log_debug("Failed to store work files in the index: %s" % e)
+
+    def _get_connection(self):
+        """
+        Get the connection to the index database, creating the database if needed.  Note, this
+        must be called with the lock acquired.
+
+        :returns:   A sqlite3 connection or None if the index isn't available
+        """
+        if self._connection or self._disabled:
+            return self._connection
+
+        try:
+            cache_dir = os.path.dirname(self._db_path)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            connection = sqlite3.connect(self._db_path, check_same_thread=False)
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != WorkFileIndex._SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS work_files")
+                connection.execute("PRAGMA user_version = %d" % WorkFileIndex._SCHEMA_VERSION)
+            connection.execute("CREATE TABLE IF NOT EXISTS work_files "
+                               "(key TEXT PRIMARY KEY, work_items BLOB, directories BLOB, files BLOB, updated REAL)")
+            connection.commit()
+            self._connection = connection
+        except Exception, e:
+            self._app.log_debug("Work file index '%s' is unavailable: %s" % (self._db_path, e))
+            self._disabled = True
+
+        return self._connection
+
+# single global instance of the work file index - this is created the first time it's needed rather
+# than when the module is imported as it requires the current app:
+_g_work_file_index = None
+_g_work_file_index_lock = threading.Lock()
+
+def get_work_file_index():
+    """
+    Get the work file index shared by all file finders, creating it if needed.
+
+    :returns:   The WorkFileIndex instance
+    """
+    global _g_work_file_index
+    with _g_work_file_index_lock:
+        if _g_work_file_index is None:
+            _g_work_file_index = WorkFileIndex()
+        return _g_work_file_index
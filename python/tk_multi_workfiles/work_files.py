@@ -15,6 +15,8 @@ import sgtk
 from sgtk.platform.qt import QtCore
 
 from .util import report_non_destroyed_qobjects
+from .template_cache import g_template_cache
+from .context_cache import g_context_cache
 
 
 def dbg_info(func):
@@ -77,6 +79,9 @@ class WorkFiles(object):
         app.log_debug("Synchronizing remote path cache...")
         app.sgtk.synchronize_filesystem_structure()
         app.log_debug("Path cache up to date!")
+        # contexts and the template fields resolved from them may have changed:
+        g_template_cache.clear()
+        g_context_cache.clear()
 
         # If the user wants to debug the dialog, show it modally and wrap it
         # with memory leak-detection code.